@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Precompute day-of-year x summary interval climatology aggregates.
+
+For every ending day-of-year and every summary interval, aggregate the daily
+climatology over the interval's days: a sum for total precipitation and a mean for
+SWE and soil moisture. The window for day-of-year d and interval n is the n
+consecutive climatology days ending on d, wrapping from day 1 back to day 366.
+"""
+
+import argparse
+import logging
+import sys
+
+import numpy as np
+import xarray as xr
+
+from config import INTERVALS, climo_file_for_var, interval_climo_file_for_var
+from era5_land_variable_registry import VARIABLE_REGISTRY
+from file_helpers import NETCDF_ENGINE, setup_logging
+from interval_aggregates import WindowAggregator
+
+# how each climatology is aggregated over a summary interval by the pipeline
+INTERVAL_CLIMO_AGGREGATION = {
+    "tp": "sum",
+    "swe": "mean",
+    "swvl": "mean",
+}
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--var",
+        type=str,
+        required=True,
+        choices=sorted(INTERVAL_CLIMO_AGGREGATION),
+        help="Variable name for which to construct the interval climatology.",
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="Overwrite output file if it already exists.",
+    )
+    return parser.parse_args()
+
+
+def short_name_for_var(variable_key: str) -> str:
+    if variable_key == "swvl":
+        return "swvl"
+    return VARIABLE_REGISTRY[variable_key]["short_name"]
+
+
+def construct_interval_climatology(
+    clim_da: xr.DataArray, intervals: list[int], how: str
+) -> xr.DataArray:
+    """Return the climatology aggregated over every (ending day-of-year, interval) pair."""
+    n_days = clim_da.sizes["time"]
+    if max(intervals) > n_days:
+        raise ValueError(
+            f"Interval {max(intervals)} is longer than the {n_days}-day climatology"
+        )
+    agg = WindowAggregator(clim_da, dim="time")
+
+    end_doys = np.arange(1, n_days + 1)
+    stop = xr.DataArray(end_doys, dims="dayofyear", coords={"dayofyear": end_doys})
+
+    per_interval = []
+    for interval in intervals:
+        logging.info(f"Aggregating ({how}) {interval}-day windows...")
+        start = (stop - interval) % n_days
+        if how == "sum":
+            da = agg.span_sum(start, stop)
+        else:
+            da = agg.span_mean(start, stop)
+        per_interval.append(da.astype("float32"))
+
+    interval_clim = xr.concat(per_interval, dim="interval").assign_coords(
+        interval=intervals
+    )
+    interval_clim.name = clim_da.name
+    interval_clim.attrs["long_name"] = (
+        f"Climatological {how} over the summary interval ending on each day of year"
+    )
+    interval_clim.attrs["aggregation"] = how
+    interval_clim["dayofyear"].attrs["long_name"] = "ending day of year"
+    interval_clim["interval"].attrs["long_name"] = "summary interval"
+    interval_clim["interval"].attrs["units"] = "days"
+    return interval_clim.transpose("interval", "dayofyear", ...)
+
+
+def main() -> int:
+    """Run the interval climatology construction."""
+    args = parse_args()
+    variable_key = args.var
+    short_name = short_name_for_var(variable_key)
+
+    setup_logging()
+
+    climo_file = climo_file_for_var(variable_key)
+    out_path = interval_climo_file_for_var(variable_key)
+    logging.info(f"Resolved input file: {climo_file}")
+    logging.info(f"Resolved output file: {out_path}")
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    if out_path.exists():
+        if not args.overwrite:
+            logging.info(f"Output already exists: {out_path}")
+            return 0
+        out_path.unlink()
+
+    if not climo_file.is_file():
+        raise FileNotFoundError(f"Climatology file not found: {climo_file}")
+
+    with xr.open_dataset(climo_file, engine=NETCDF_ENGINE) as ds:
+        if short_name not in ds.data_vars:
+            raise ValueError(
+                f"Did not find expected data variable in {climo_file}, "
+                f"found {list(ds.data_vars)}"
+            )
+        # the position along `time` is the day of year, whatever the stored labels
+        clim_da = ds[short_name].assign_coords(time=np.arange(ds.sizes["time"]) + 1)
+        interval_clim = construct_interval_climatology(
+            clim_da, INTERVALS, INTERVAL_CLIMO_AGGREGATION[variable_key]
+        )
+
+    out_ds = interval_clim.to_dataset()
+    out_ds.attrs["source"] = f"Aggregated from {climo_file.name}"
+
+    # one chunk per (interval, day of year) grid: the pipeline reads a single day
+    out_ds.to_netcdf(
+        out_path,
+        engine=NETCDF_ENGINE,
+        encoding={
+            short_name: {
+                "dtype": "float32",
+                "chunksizes": (1, 1, *interval_clim.shape[2:]),
+            }
+        },
+    )
+    logging.info(f"Wrote {out_path}")
+    logging.info("Done.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Compare chunk layouts of the Zarr cube of drought indices.
+
+Synthetic indices (every indicator and interval, spatially smooth and rounded to
+0.1, with ocean cells NaN) on a `--grid` of cells are written to a cube of
+`--dates` reference dates in each layout, with `indices_cube.write_to_cube`, then
+one more date is appended, reporting:
+
+    append s    time to append the indices of one reference date, as a daily run
+    rewrite s   time to rewrite an existing date, as a rerun
+    map ms      time to read one indicator and interval on one date, as a map
+    series ms   time to read one indicator at one cell, all intervals and dates
+    MB          size of the store
+
+Layouts are "reference_date x interval x latitude x longitude" chunk lengths;
+spatial lengths are split evenly over the grid as in the cube.
+
+Run from the repository root:
+
+    python -m benchmarks.benchmark_indices_cube --dates 48 --layouts 16x7x64x128 1x1x256x512
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from benchmarks.synthetic_era5_land import ocean_mask, synthetic_grid
+from config import INTERVALS
+from index_engine import INDEX_NAMES
+from indices_cube import CUBE_CHUNKS, CUBE_DIMS, open_cube, write_to_cube
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--grid",
+        default="211x511",
+        help="Grid as LATITUDESxLONGITUDES; the default is DL_BBOX at 0.1°.",
+    )
+    parser.add_argument(
+        "--dates", type=int, default=48, help="Reference dates in the cube."
+    )
+    parser.add_argument(
+        "--layouts",
+        nargs="+",
+        default=[
+            "x".join(str(CUBE_CHUNKS[dim]) for dim in CUBE_DIMS),
+            "1x1x256x512",
+            "16x1x64x64",
+            "8x7x64x128",
+            "32x7x64x128",
+            "64x1x32x32",
+        ],
+        help="Chunk layouts to compare; the first is the cube's default.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of timed reads; the fastest is reported.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def synthetic_indices(dates, latitude, longitude, ocean, rng) -> xr.Dataset:
+    shape = (len(dates), len(INTERVALS), len(latitude), len(longitude))
+    data = {}
+    for name in INDEX_NAMES:
+        # spatially smooth fields of 10 x 10 cell blocks plus noise, like real maps
+        coarse = rng.normal(0, 1, (*shape[:2], shape[2] // 10 + 1, shape[3] // 10 + 1))
+        blocks = coarse.repeat(10, axis=2).repeat(10, axis=3)[
+            ..., : shape[2], : shape[3]
+        ]
+        values = (blocks + rng.normal(0, 0.1, shape)).round(1).astype("float32")
+        values[..., ocean] = np.nan
+        data[name] = (CUBE_DIMS, values)
+    return xr.Dataset(
+        data,
+        coords={
+            "reference_date": dates,
+            "interval": INTERVALS,
+            "latitude": latitude,
+            "longitude": longitude,
+        },
+    )
+
+
+def best_time(func, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def store_mb(path: Path) -> float:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file()) / 1e6
+
+
+def main() -> int:
+    args = parse_args()
+    rng = np.random.default_rng(args.seed)
+    n_lat, n_lon = (int(n) for n in args.grid.split("x"))
+    latitude, longitude = synthetic_grid(n_lat, n_lon)
+    ocean = ocean_mask((n_lat, n_lon), 0.4, rng)
+    dates = pd.date_range("2025-01-01", periods=args.dates + 1)
+    indices = synthetic_indices(dates, latitude, longitude, ocean, rng)
+    history, last = indices.isel(reference_date=slice(0, -1)), indices.isel(
+        reference_date=slice(-1, None)
+    )
+    cell = {"latitude": latitude[n_lat // 2], "longitude": longitude[n_lon // 2]}
+
+    print(f"{n_lat}x{n_lon} grid, {args.dates} reference dates\n")
+    print(
+        f"{'layout':<16}{'append s':>10}{'rewrite s':>11}{'map ms':>9}"
+        f"{'series ms':>11}{'MB':>8}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for layout in args.layouts:
+            chunks = dict(zip(CUBE_DIMS, (int(n) for n in layout.split("x"))))
+            path = Path(tmp).joinpath(f"{layout}.zarr")
+            write_to_cube(history, path, chunks)
+
+            start = time.perf_counter()
+            write_to_cube(last, path)
+            append_s = time.perf_counter() - start
+            start = time.perf_counter()
+            write_to_cube(last, path)
+            rewrite_s = time.perf_counter() - start
+
+            with open_cube(path) as cube:
+                map_s = best_time(
+                    lambda: cube["spi"].isel(reference_date=-1, interval=2).load(),
+                    args.repeat,
+                )
+                series_s = best_time(
+                    lambda: cube["spi"].sel(**cell).load(), args.repeat
+                )
+            print(
+                f"{layout:<16}{append_s:>10.2f}{rewrite_s:>11.2f}"
+                f"{map_s * 1000:>9.0f}{series_s * 1000:>11.0f}{store_mb(path):>8.0f}"
+            )
+            shutil.rmtree(path)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,132 @@
+"""Compare the output encodings of the drought index files by size and speed.
+
+Each input file (by default, the dated drought_indices_<n>day_* files in
+INDICES_DIR) is rewritten with every scheme in `output_encoding.OUTPUT_ENCODINGS`
+into a temporary directory, then read back the way the plotting scripts do: the
+whole map of every index, and the padded window of each regional subset. Times
+are the best of `--repeat` runs; sizes are totals over the input files.
+
+Run from the repository root:
+
+    python -m benchmarks.benchmark_output_encoding
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+from config import INDICES_DIR
+from data_viz.region_subset import REGIONS, slice_indices
+from file_helpers import NETCDF_ENGINE
+from output_encoding import OUTPUT_ENCODINGS, output_encoding
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--input",
+        type=Path,
+        nargs="+",
+        default=None,
+        help="Index files to rewrite. Defaults to the dated files in INDICES_DIR.",
+    )
+    parser.add_argument(
+        "--schemes",
+        nargs="+",
+        choices=list(OUTPUT_ENCODINGS),
+        default=list(OUTPUT_ENCODINGS),
+        help="Encodings to compare.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of timed repetitions; the fastest is reported.",
+    )
+    return parser.parse_args()
+
+
+def best_time(func, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def read_full(path: Path) -> None:
+    with xr.open_dataset(path, engine=NETCDF_ENGINE) as ds:
+        ds.load()
+
+
+def read_regions(path: Path) -> None:
+    with xr.open_dataset(path, engine=NETCDF_ENGINE) as ds:
+        for region in REGIONS.values():
+            try:
+                lat_sl, lon_sl = slice_indices(
+                    ds["latitude"].values, ds["longitude"].values, region
+                )
+            except ValueError:
+                continue
+            ds.isel(latitude=lat_sl, longitude=lon_sl).load()
+
+
+def max_decode_error(source: xr.Dataset, path: Path) -> float:
+    """Largest absolute difference between the source and the decoded values."""
+    with xr.open_dataset(path, engine=NETCDF_ENGINE) as ds:
+        errors = [
+            np.nanmax(np.abs(ds[name].values - source[name].values), initial=0)
+            for name in source.data_vars
+        ]
+    return float(max(errors))
+
+
+def main() -> int:
+    args = parse_args()
+    inputs = args.input or sorted(INDICES_DIR.glob("drought_indices_*day_*.nc"))
+    if not inputs:
+        raise FileNotFoundError(f"No drought_indices_*day_*.nc files in {INDICES_DIR}")
+    sources = [xr.load_dataset(path, engine=NETCDF_ENGINE) for path in inputs]
+    print(f"{len(inputs)} input files, {args.repeat} repetitions\n")
+
+    header = (
+        f"{'scheme':<14}{'size MB':>10}{'ratio':>8}{'write s':>10}"
+        f"{'full read s':>13}{'region read s':>15}{'max error':>12}"
+    )
+    print(header)
+    print("-" * len(header))
+    baseline_size = None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for scheme in args.schemes:
+            paths = [Path(tmp_dir).joinpath(f"{scheme}_{path.name}") for path in inputs]
+
+            def write():
+                for source, path in zip(sources, paths):
+                    source.to_netcdf(
+                        path,
+                        engine=NETCDF_ENGINE,
+                        encoding=output_encoding(source, scheme),
+                    )
+
+            write_s = best_time(write, args.repeat)
+            full_s = best_time(lambda: [read_full(p) for p in paths], args.repeat)
+            region_s = best_time(lambda: [read_regions(p) for p in paths], args.repeat)
+            size = sum(path.stat().st_size for path in paths)
+            baseline_size = baseline_size or size
+            error = max(
+                max_decode_error(source, path) for source, path in zip(sources, paths)
+            )
+            print(
+                f"{scheme:<14}{size / 1e6:>10.2f}{size / baseline_size:>8.2f}"
+                f"{write_s:>10.3f}{full_s:>13.3f}{region_s:>15.3f}{error:>12.2e}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
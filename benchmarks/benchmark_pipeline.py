@@ -0,0 +1,129 @@
+"""Time and memory-profile the stages of pipeline_run.py on synthetic data.
+
+For each grid size, synthetic recent downloads and baseline data are written with
+`benchmarks.synthetic_era5_land`, then pipeline_run.py is run on that data (no
+saved running window state) and the stages of its run report are collected, see
+`run_metrics`. Every stage reports its wall-clock and CPU time, the peak resident
+memory of the process while it ran and the bytes it read and wrote. Grid sizes are
+given as LATITUDESxLONGITUDES; 211x511 is the full DL_BBOX. Use `--output` to keep
+the results as JSON for comparing runs over time.
+
+Run from the repository root:
+
+    python -m benchmarks.benchmark_pipeline --grids 50x100 100x250 211x511
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic_era5_land import write_synthetic_inputs
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--grids",
+        nargs="+",
+        default=["50x100", "100x250", "211x511"],
+        help="Grid sizes as LATITUDESxLONGITUDES.",
+    )
+    parser.add_argument(
+        "--analysis-date",
+        default="2025-03-10",
+        help="Last day of the synthetic recent record.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Value of pipeline_run.py --workers for the index computation.",
+    )
+    parser.add_argument(
+        "--workdir",
+        type=Path,
+        default=None,
+        help="Directory for the synthetic data; a temporary directory by default.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="Write the results to this JSON file.",
+    )
+    return parser.parse_args()
+
+
+def benchmark_grid(
+    grid: tuple[int, int], analysis_date: str, workers: int, workdir: Path
+) -> dict:
+    """Generate synthetic data for one grid size and profile a pipeline run on it."""
+    data_dir = workdir.joinpath(f"grid_{grid[0]}x{grid[1]}")
+    shutil.rmtree(data_dir, ignore_errors=True)
+    started = time.perf_counter()
+    environment = write_synthetic_inputs(data_dir, grid, analysis_date)
+    generated = time.perf_counter() - started
+
+    subprocess.run(
+        [sys.executable, "pipeline_run.py", "--workers", str(workers)],
+        env={**os.environ, **environment},
+        check=True,
+    )
+    (report_path,) = Path(environment["DROUGHT_INDICES_DIR"]).glob(
+        "run_report_pipeline_run_*.json"
+    )
+    stages = json.loads(report_path.read_text())["stages"]
+    return {
+        "grid": list(grid),
+        "cells": grid[0] * grid[1],
+        "analysis_date": analysis_date,
+        "workers": workers,
+        "generate_s": generated,
+        "stages": stages,
+    }
+
+
+def print_results(results: list[dict]) -> None:
+    print(
+        f"{'grid':>10} {'stage':<32} {'wall s':>9} {'cpu s':>9} {'peak RSS MB':>12} "
+        f"{'read MB':>9} {'written MB':>11}"
+    )
+    for result in results:
+        grid = "x".join(str(n) for n in result["grid"])
+        for stage in result["stages"]:
+            read_mb = (stage["bytes_read"] or 0) / 1e6
+            written_mb = (stage["bytes_written"] or 0) / 1e6
+            print(
+                f"{grid:>10} {stage['stage']:<32} {stage['wall_s']:>9.2f} "
+                f"{stage['cpu_s']:>9.2f} {stage['peak_rss_mb']:>12.0f} "
+                f"{read_mb:>9.1f} {written_mb:>11.1f}"
+            )
+        total = sum(stage["wall_s"] for stage in result["stages"])
+        print(f"{grid:>10} {'total':<32} {total:>9.2f}")
+
+
+def main() -> int:
+    args = parse_args()
+    grids = [tuple(int(n) for n in grid.split("x")) for grid in args.grids]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        workdir = args.workdir or Path(tmp_dir)
+        results = [
+            benchmark_grid(grid, args.analysis_date, args.workers, workdir)
+            for grid in grids
+        ]
+
+    print_results(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=1))
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,164 @@
+"""Compare exact and fused-kernel evaluation of SPI and SPEI.
+
+Random SPI (gamma) and SPEI (fisk) parameters are drawn for `--cells` cells and
+every summary interval, in the ranges of the synthetic baseline data, with 30-day
+window sums drawn from the fitted distributions (about a tenth of the SPI sums
+are exactly zero). Each rounded index is then evaluated from the window means with
+`index_engine.standardized_index` and from the window sums with the fused Numba
+kernel of `fused_kernels` (if Numba is installed), reporting:
+
+    eval s        time to evaluate the index
+    peak MB       peak memory allocated while evaluating, as traced by tracemalloc
+    max error     largest absolute difference to the exact index
+    rounded diff  share of cells whose index differs from the exact index
+
+Times are the best of `--repeat` runs; the fused kernel is compiled before timing.
+
+Run from the repository root:
+
+    python -m benchmarks.benchmark_standardized_index --cells 20000
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import xarray as xr
+
+from config import INTERVALS, SPEI_DIST, SPI_DIST
+from fused_kernels import fused_standardized_index, numba_available
+from index_engine import PROBABILITY_CEILING, PROBABILITY_FLOOR, standardized_index
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--cells",
+        type=int,
+        default=20000,
+        help="Number of grid cells; DL_BBOX has about 60000 land cells.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of timed repetitions; the fastest is reported.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def best_time(func, repeat: int):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def peak_mb(func) -> float:
+    """Peak memory in MB allocated by one call of `func`."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def synthetic_inputs(n_cells: int, rng) -> dict[str, tuple]:
+    """SPI and SPEI inputs: name -> (dist, params, window sums, counts, zero correction)."""
+    shape = (len(INTERVALS), n_cells)
+    dims = ("interval", "cell")
+    coords = {"interval": INTERVALS}
+    counts = xr.DataArray(np.full(shape, 30, dtype="int32"), dims=dims, coords=coords)
+
+    def params(names, values):
+        return xr.DataArray(
+            np.stack(values).astype("float32"),
+            dims=("dparams", *dims),
+            coords={"dparams": names, **coords},
+        )
+
+    a = rng.uniform(0.8, 3.0, shape)
+    scale = rng.uniform(0.0005, 0.003, shape)
+    tp = rng.gamma(a, scale) * (rng.random(shape) > 0.1)
+    c = rng.uniform(3.0, 8.0, shape)
+    loc = rng.uniform(-0.02, -0.005, shape)
+    wb_scale = rng.uniform(0.003, 0.02, shape)
+    # fisk deviates by inversion of its CDF
+    u = rng.random(shape)
+    wb = loc + wb_scale * (u / (1 - u)) ** (1 / c)
+    return {
+        "spi": (
+            SPI_DIST,
+            params(["a", "loc", "scale"], [a, np.zeros(shape), scale]),
+            xr.DataArray(30 * tp, dims=dims, coords=coords),
+            counts,
+            True,
+        ),
+        "spei": (
+            SPEI_DIST,
+            params(["c", "loc", "scale"], [c, loc, wb_scale]),
+            xr.DataArray(30 * wb, dims=dims, coords=coords),
+            counts,
+            False,
+        ),
+    }
+
+
+def main() -> int:
+    args = parse_args()
+    rng = np.random.default_rng(args.seed)
+    inputs = synthetic_inputs(args.cells, rng)
+    print(
+        f"{args.cells} cells x {len(INTERVALS)} intervals, "
+        f"{args.repeat} repetitions\n"
+    )
+    print(
+        f"{'index':<6}{'mode':<8}{'eval s':>10}{'peak MB':>10}"
+        f"{'max error':>11}{'rounded diff':>14}"
+    )
+    for name, (dist, params, sums, counts, zero_correction) in inputs.items():
+        means = (sums / counts).astype("float32")
+
+        def exact_index():
+            return standardized_index(means, params, dist, zero_correction).round(1)
+
+        exact_s, exact = best_time(exact_index, args.repeat)
+        valid = exact.notnull()
+
+        def report(mode, eval_s, peak, index):
+            error = float(np.nanmax(np.abs(index.values - exact.values)))
+            differ = float((index != exact).where(valid).mean())
+            print(
+                f"{name:<6}{mode:<8}{eval_s:>10.3f}{peak:>10.1f}"
+                f"{error:>11.4f}{differ:>14.2%}"
+            )
+
+        report("exact", exact_s, peak_mb(exact_index), exact)
+
+        if numba_available():
+
+            def fused_index():
+                return fused_standardized_index(
+                    sums,
+                    counts,
+                    params,
+                    dist,
+                    zero_correction,
+                    PROBABILITY_FLOOR,
+                    PROBABILITY_CEILING,
+                )
+
+            fused_index()
+            fused_s, fused = best_time(fused_index, args.repeat)
+            report("fused", fused_s, peak_mb(fused_index), fused)
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
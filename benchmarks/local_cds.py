@@ -0,0 +1,227 @@
+"""Offline stand-in for the Climate Data Store API client.
+
+`LocalCdsClient.retrieve` accepts the dataset names and request dicts that
+`download_helpers` passes to `cdsapi.Client.retrieve`, and writes synthetic files
+of the shape the CDS returns: GRIB daily accumulations from "reanalysis-era5-land"
+and NetCDF daily means from "derived-era5-land-daily-statistics", on the 0.1° grid
+of the request's `area`. Every retrieval first waits in a simulated queue, then
+for the transfer time of the written file at a simulated bandwidth, and can fail
+at random, so download orchestration (concurrency, retries, incremental
+downloads) can be exercised and benchmarked offline.
+
+Like the CDS, requested days after the latest available day are left out of GRIB
+downloads but fail daily statistics requests, and impossible dates such as
+February 30 are skipped. The values of a day are the same in every request, so
+repeated downloads of a day are identical.
+
+Running this module runs the downloads of pipeline_download.py against it, with
+its settings read from the environment by `LocalCdsClient.from_environment`:
+
+    LOCAL_CDS_QUEUE_SECONDS=2 LOCAL_CDS_BANDWIDTH_MBPS=10 LOCAL_CDS_GRID=50x100 \\
+        python -m benchmarks.local_cds
+"""
+
+import datetime
+import itertools
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_era5_land import (
+    GRID_STEP_DEG,
+    daily_fields,
+    ocean_mask,
+    synthetic_grid,
+    write_daily_means,
+    write_grib_accumulations,
+)
+from era5_land_variable_registry import VARIABLE_REGISTRY
+from file_helpers import setup_logging
+from pipeline_download import download_all
+
+HOURLY_DATASET = "reanalysis-era5-land"
+DAILY_STATISTICS_DATASET = "derived-era5-land-daily-statistics"
+# ERA5-Land daily updates reach the CDS about 5 days after real time
+AVAILABILITY_LAG_DAYS = 5
+
+
+def _as_list(value) -> list[str]:
+    return [value] if isinstance(value, str) else list(value)
+
+
+class LocalCdsClient:
+    """Write synthetic ERA5-Land downloads with simulated latency, bandwidth and failures.
+
+    Args:
+        queue_seconds: time each request waits before its file is produced.
+        bandwidth_mbps: transfer rate in MB/s; None transfers instantly.
+        failure_rate: probability that a request fails after queueing.
+        grid: (latitudes, longitudes) of the output grid, from the north-west
+            corner of the request area; None uses the whole area.
+        available_until: latest available day; by default `AVAILABILITY_LAG_DAYS`
+            before today.
+        ocean_fraction: fraction of the grid without data.
+        seed: seed of the synthetic values and of the simulated failures.
+    """
+
+    def __init__(
+        self,
+        queue_seconds: float = 0.0,
+        bandwidth_mbps: float | None = None,
+        failure_rate: float = 0.0,
+        grid: tuple[int, int] | None = None,
+        available_until=None,
+        ocean_fraction: float = 0.4,
+        seed: int = 0,
+    ):
+        self.queue_seconds = queue_seconds
+        self.bandwidth_mbps = bandwidth_mbps
+        self.failure_rate = failure_rate
+        self.grid = grid
+        self.available_until = pd.Timestamp(
+            available_until
+            or datetime.date.today() - datetime.timedelta(days=AVAILABILITY_LAG_DAYS)
+        )
+        self.ocean_fraction = ocean_fraction
+        self.seed = seed
+        # requests may be retrieved from several threads
+        self._failures = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_environment(cls) -> "LocalCdsClient":
+        """A client configured by LOCAL_CDS_QUEUE_SECONDS, LOCAL_CDS_BANDWIDTH_MBPS,
+        LOCAL_CDS_FAILURE_RATE, LOCAL_CDS_GRID (LATITUDESxLONGITUDES),
+        LOCAL_CDS_AVAILABLE_UNTIL (YYYY-MM-DD) and LOCAL_CDS_SEED."""
+        bandwidth = os.getenv("LOCAL_CDS_BANDWIDTH_MBPS")
+        grid = os.getenv("LOCAL_CDS_GRID")
+        return cls(
+            queue_seconds=float(os.getenv("LOCAL_CDS_QUEUE_SECONDS") or 0),
+            bandwidth_mbps=float(bandwidth) if bandwidth else None,
+            failure_rate=float(os.getenv("LOCAL_CDS_FAILURE_RATE") or 0),
+            grid=tuple(int(n) for n in grid.split("x")) if grid else None,
+            available_until=os.getenv("LOCAL_CDS_AVAILABLE_UNTIL"),
+            seed=int(os.getenv("LOCAL_CDS_SEED") or 0),
+        )
+
+    def _grid(self, area: list) -> tuple[np.ndarray, np.ndarray]:
+        north, west, south, east = area
+        shape = self.grid or (
+            round((north - south) / GRID_STEP_DEG) + 1,
+            round((east - west) / GRID_STEP_DEG) + 1,
+        )
+        return synthetic_grid(*shape, north, west)
+
+    @staticmethod
+    def _dates(request: dict) -> pd.DatetimeIndex:
+        dates = []
+        for year, month, day in itertools.product(
+            _as_list(request["year"]),
+            _as_list(request["month"]),
+            _as_list(request["day"]),
+        ):
+            try:
+                dates.append(
+                    pd.Timestamp(year=int(year), month=int(month), day=int(day))
+                )
+            except ValueError:
+                # the CDS skips days that do not exist, e.g. February 30
+                continue
+        return pd.DatetimeIndex(sorted(dates))
+
+    def _values(
+        self, short_name: str, dates: pd.DatetimeIndex, ocean: np.ndarray
+    ) -> np.ndarray:
+        """Synthetic values of each day, drawn from a generator seeded by the day."""
+        return np.stack(
+            [
+                daily_fields(
+                    pd.DatetimeIndex([date]),
+                    ocean,
+                    np.random.default_rng([self.seed, date.year, date.month, date.day]),
+                )[short_name][0]
+                for date in dates
+            ]
+        )
+
+    def retrieve(self, name: str, request: dict, target) -> Path:
+        """Write the synthetic result of a CDS request to `target`, like `cdsapi.Client.retrieve`."""
+        started = time.perf_counter()
+        matches = [
+            meta
+            for meta in VARIABLE_REGISTRY.values()
+            if meta["cds_variable"] == request["variable"]
+        ]
+        if not matches:
+            raise ValueError(f"Unknown ERA5-Land variable {request['variable']}")
+        meta = matches[0]
+        dates = self._dates(request)
+        unavailable = dates > self.available_until
+        if name == HOURLY_DATASET:
+            dates = dates[~unavailable]
+        elif name == DAILY_STATISTICS_DATASET:
+            if unavailable.any():
+                raise RuntimeError(
+                    f"Request for {name} includes days after "
+                    f"{self.available_until.date()} that are not yet available"
+                )
+        else:
+            raise ValueError(f"Unknown dataset {name}")
+        if dates.empty:
+            raise RuntimeError(f"Request for {name} matches no available data")
+
+        time.sleep(self.queue_seconds)
+        with self._lock:
+            failed = self._failures.random() < self.failure_rate
+        if failed:
+            raise RuntimeError(f"Simulated failure of a {name} request")
+
+        produced = time.perf_counter()
+        latitude, longitude = self._grid(request["area"])
+        ocean = ocean_mask(
+            (len(latitude), len(longitude)),
+            self.ocean_fraction,
+            np.random.default_rng(self.seed),
+        )
+        values = self._values(meta["short_name"], dates, ocean)
+        target = Path(target)
+        if name == HOURLY_DATASET:
+            write_grib_accumulations(
+                target, meta["short_name"], values, dates, latitude, longitude
+            )
+        else:
+            write_daily_means(
+                target,
+                meta["short_name"],
+                values,
+                dates,
+                latitude,
+                longitude,
+                meta["long_name"],
+            )
+
+        size = target.stat().st_size
+        if self.bandwidth_mbps:
+            transfer = size / (self.bandwidth_mbps * 1e6)
+            time.sleep(max(0.0, transfer - (time.perf_counter() - produced)))
+        logging.info(
+            f"Local CDS retrieved {request['variable']} from {name}: {len(dates)} days, "
+            f"{size / 1e6:.1f} MB in {time.perf_counter() - started:.2f} s"
+        )
+        return target
+
+
+def main() -> int:
+    setup_logging()
+    download_all(LocalCdsClient.from_environment())
+    logging.info("Local CDS download completed.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
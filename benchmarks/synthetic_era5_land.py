@@ -0,0 +1,431 @@
+"""Write synthetic ERA5-Land inputs for running the pipeline offline.
+
+Generates everything `pipeline_run.py` reads, on a regular 0.1° grid of any size
+starting at the north-west corner of `DL_BBOX`:
+
+    <out>/recent_data/<recent_dir>/<prefix>{previous_year,current_year,current_month}<suffix>
+        the downloads of every VARIABLE_REGISTRY variable, in the layout of
+        pipeline_download.py: GRIB daily accumulations for tp and pev, NetCDF
+        daily means for swe, swvl1 and swvl2
+    <out>/baseline_data/era5_land_{tp,swe,swvl}_climo_1981_2020.nc
+    <out>/baseline_data/era5_land_{tp,swe,swvl}_interval_climo_1981_2020.nc
+    <out>/baseline_data/{spi_gamma,spei_fisk}_parameters.nc
+
+The record runs from January 1 of the year before `--analysis-date` through that
+date, as pipeline_download.py fetches it. Values are random but plausible in
+magnitude, seasonality and dry-day frequency, with a smooth ocean mask where every
+variable is missing. Point the pipeline at the output with the environment
+variables DROUGHT_RECENT_DATA_ROOT, DROUGHT_CLIM_DIR (and DROUGHT_INDICES_DIR,
+DROUGHT_RECENT_ARCHIVE_DIR for its outputs); `pipeline_environment` returns them.
+
+Run from the repository root:
+
+    python -m benchmarks.synthetic_era5_land --out /tmp/synthetic --grid 211 511
+"""
+
+import argparse
+import logging
+from pathlib import Path
+
+import dask.array
+import eccodes
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from baseline_data_generation_scripts.create_interval_climo import (
+    INTERVAL_CLIMO_AGGREGATION,
+    construct_interval_climatology,
+)
+from config import DL_BBOX, INTERVALS, SPEI_DIST, SPI_DIST
+from era5_land_variable_registry import VARIABLE_REGISTRY
+from file_helpers import NETCDF_ENGINE, setup_logging
+
+GRID_STEP_DEG = 0.1
+# GRIB1 parameter ids of the ERA5-Land accumulations downloaded as GRIB
+GRIB_PARAM_IDS = {"tp": 228, "pev": 228251}
+GRIB_MISSING_VALUE = 9999.0
+# days of year are stored for the 366 days of a leap year
+N_DAYS_OF_YEAR = 366
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--out", type=Path, required=True, help="Output directory.")
+    parser.add_argument(
+        "--grid",
+        type=int,
+        nargs=2,
+        metavar=("LATITUDES", "LONGITUDES"),
+        default=(211, 511),
+        help="Grid size; the default is the full DL_BBOX.",
+    )
+    parser.add_argument(
+        "--analysis-date",
+        default="2025-03-10",
+        help="Last day of the recent record, which starts on January 1 of the prior year.",
+    )
+    parser.add_argument(
+        "--ocean-fraction",
+        type=float,
+        default=0.4,
+        help="Fraction of the grid without data.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def _grid_keys(
+    n_latitude: int,
+    n_longitude: int,
+    north: float = DL_BBOX[0],
+    west: float = DL_BBOX[1],
+) -> dict:
+    """GRIB keys of a 0.1° grid from a north-west corner, by default that of DL_BBOX."""
+    return {
+        "Ni": n_longitude,
+        "Nj": n_latitude,
+        "latitudeOfFirstGridPointInDegrees": float(north),
+        "latitudeOfLastGridPointInDegrees": round(
+            north - GRID_STEP_DEG * (n_latitude - 1), 1
+        ),
+        "longitudeOfFirstGridPointInDegrees": float(west),
+        "longitudeOfLastGridPointInDegrees": round(
+            west + GRID_STEP_DEG * (n_longitude - 1), 1
+        ),
+        "iDirectionIncrementInDegrees": GRID_STEP_DEG,
+        "jDirectionIncrementInDegrees": GRID_STEP_DEG,
+    }
+
+
+def _grib_message(grid_keys: dict):
+    gid = eccodes.codes_grib_new_from_samples("regular_ll_sfc_grib1")
+    for key, value in grid_keys.items():
+        if isinstance(value, float):
+            eccodes.codes_set_double(gid, key, value)
+        else:
+            eccodes.codes_set_long(gid, key, value)
+    return gid
+
+
+def synthetic_grid(
+    n_latitude: int,
+    n_longitude: int,
+    north: float = DL_BBOX[0],
+    west: float = DL_BBOX[1],
+) -> tuple[np.ndarray, np.ndarray]:
+    """Descending latitudes and ascending longitudes from a north-west corner.
+
+    The corner is that of DL_BBOX by default. The coordinates are those decoded
+    from the GRIB files, so that the GRIB and NetCDF downloads align exactly, as
+    the real downloads do.
+    """
+    gid = _grib_message(_grid_keys(n_latitude, n_longitude, north, west))
+    try:
+        return (
+            eccodes.codes_get_array(gid, "distinctLatitudes"),
+            eccodes.codes_get_array(gid, "distinctLongitudes"),
+        )
+    finally:
+        eccodes.codes_release(gid)
+
+
+def ocean_mask(shape: tuple[int, int], fraction: float, rng) -> np.ndarray:
+    """Smooth random mask covering `fraction` of the grid."""
+    coarse = rng.random((max(2, shape[0] // 20), max(2, shape[1] // 20)))
+    rows = np.linspace(0, coarse.shape[0] - 1, shape[0])
+    cols = np.linspace(0, coarse.shape[1] - 1, shape[1])
+    # bilinear upsampling of the coarse field
+    r0 = np.minimum(rows.astype(int), coarse.shape[0] - 2)
+    c0 = np.minimum(cols.astype(int), coarse.shape[1] - 2)
+    dr, dc = (rows - r0)[:, None], (cols - c0)[None, :]
+    field = (
+        coarse[np.ix_(r0, c0)] * (1 - dr) * (1 - dc)
+        + coarse[np.ix_(r0 + 1, c0)] * dr * (1 - dc)
+        + coarse[np.ix_(r0, c0 + 1)] * (1 - dr) * dc
+        + coarse[np.ix_(r0 + 1, c0 + 1)] * dr * dc
+    )
+    if fraction <= 0:
+        return np.zeros(shape, bool)
+    return field <= np.quantile(field, fraction)
+
+
+def _seasonal(day_of_year: np.ndarray) -> np.ndarray:
+    """1 in mid-winter, -1 in mid-summer."""
+    return np.cos(2 * np.pi * (day_of_year - 15) / 365.25)
+
+
+def daily_fields(
+    dates: pd.DatetimeIndex, ocean: np.ndarray, rng
+) -> dict[str, np.ndarray]:
+    """Random daily tp, pev (m) and sd, swvl1, swvl2 (m, m3/m3) on the grid."""
+    shape = (len(dates), *ocean.shape)
+    season = _seasonal(dates.dayofyear.values)[:, None, None]
+    # about half of the days are dry; wet-day totals are right-skewed
+    tp = rng.gamma(0.7, 0.004, shape) * (rng.random(shape) > 0.5)
+    pev = -rng.gamma(2.0, 0.0008 * (1.2 - season), shape)
+    # snow in winter, none in summer, more towards the north
+    north = np.linspace(1.0, 0.3, ocean.shape[0])[None, :, None]
+    sd = np.clip(0.15 * season * north + rng.normal(0, 0.02, shape), 0, None)
+    swvl1 = np.clip(0.3 - 0.08 * season + rng.normal(0, 0.03, shape), 0.05, 0.6)
+    swvl2 = np.clip(swvl1 + rng.normal(0.02, 0.01, shape), 0.05, 0.6)
+    fields = {"tp": tp, "pev": pev, "sd": sd, "swvl1": swvl1, "swvl2": swvl2}
+    for values in fields.values():
+        values[:, ocean] = np.nan
+    return {name: values.astype("float32") for name, values in fields.items()}
+
+
+def climatology_fields(ocean: np.ndarray, rng) -> dict[str, np.ndarray]:
+    """Smooth day-of-year climatologies matching the expected values of `daily_fields`."""
+    season = _seasonal(np.arange(1, N_DAYS_OF_YEAR + 1))[:, None, None]
+    north = np.linspace(1.0, 0.3, ocean.shape[0])[None, :, None]
+    wetness = 0.8 + 0.4 * rng.random((1, *ocean.shape))
+    shape = (N_DAYS_OF_YEAR, *ocean.shape)
+    fields = {
+        "tp": 0.0014 * wetness * np.ones(shape),
+        "swe": np.clip(0.15 * season * north, 0, None) * np.ones(shape),
+        "swvl": (0.315 - 0.08 * season) * np.ones(shape),
+    }
+    for values in fields.values():
+        values[:, ocean] = np.nan
+    return {name: values.astype("float32") for name, values in fields.items()}
+
+
+def write_grib_accumulations(
+    path: Path,
+    variable: str,
+    values: np.ndarray,
+    dates: pd.DatetimeIndex,
+    latitude: np.ndarray,
+    longitude: np.ndarray,
+) -> None:
+    """Write daily accumulations as GRIB1 messages valid at 00 UTC of each date.
+
+    Like the CDS downloads, each message is the 24-hour accumulation starting at
+    00 UTC of the previous day, which cfgrib decodes to a `valid_time` of the date.
+    cfgrib's own GRIB writer is experimental, so the messages are encoded with
+    eccodes directly.
+    """
+    grid_keys = _grid_keys(
+        len(latitude), len(longitude), float(latitude[0]), float(longitude[0])
+    )
+    with open(path, "wb") as grib_file:
+        for date, day in zip(dates, values):
+            gid = _grib_message(grid_keys)
+            try:
+                start = date - pd.Timedelta(days=1)
+                eccodes.codes_set_long(gid, "paramId", GRIB_PARAM_IDS[variable])
+                eccodes.codes_set_long(gid, "dataDate", int(start.strftime("%Y%m%d")))
+                eccodes.codes_set_long(gid, "dataTime", 0)
+                eccodes.codes_set_string(gid, "stepType", "accum")
+                eccodes.codes_set_long(gid, "startStep", 0)
+                eccodes.codes_set_long(gid, "endStep", 24)
+                eccodes.codes_set_long(gid, "bitmapPresent", 1)
+                eccodes.codes_set_double(gid, "missingValue", GRIB_MISSING_VALUE)
+                eccodes.codes_set_values(
+                    gid, np.nan_to_num(day, nan=GRIB_MISSING_VALUE).ravel()
+                )
+                eccodes.codes_write(gid, grib_file)
+            finally:
+                eccodes.codes_release(gid)
+
+
+def write_daily_means(
+    path: Path,
+    name: str,
+    values: np.ndarray,
+    dates: pd.DatetimeIndex,
+    latitude: np.ndarray,
+    longitude: np.ndarray,
+    long_name: str,
+) -> None:
+    """Write daily means as NetCDF, in the layout of the CDS daily statistics."""
+    da = xr.DataArray(
+        values,
+        dims=("valid_time", "latitude", "longitude"),
+        coords={"valid_time": dates, "latitude": latitude, "longitude": longitude},
+        name=name,
+        attrs={"long_name": long_name},
+    )
+    da.to_netcdf(path, engine=NETCDF_ENGINE)
+
+
+def record_periods(analysis_date) -> dict[str, pd.DatetimeIndex]:
+    """Dates of each recent download file, as fetched by pipeline_download.py."""
+    analysis_date = pd.Timestamp(analysis_date)
+    year_start = pd.Timestamp(year=analysis_date.year, month=1, day=1)
+    month_start = analysis_date.replace(day=1)
+    periods = {
+        "previous_year": pd.date_range(
+            year_start - pd.DateOffset(years=1),
+            year_start - pd.Timedelta(days=1),
+            freq="D",
+        ),
+        "current_month": pd.date_range(month_start, analysis_date, freq="D"),
+    }
+    if analysis_date.month != 1:
+        periods["current_year"] = pd.date_range(
+            year_start, month_start - pd.Timedelta(days=1), freq="D"
+        )
+    return periods
+
+
+def write_recent_data(
+    recent_root: Path,
+    analysis_date,
+    latitude: np.ndarray,
+    longitude: np.ndarray,
+    ocean: np.ndarray,
+    rng,
+) -> None:
+    """Write the recent downloads of every VARIABLE_REGISTRY variable."""
+    for period, dates in record_periods(analysis_date).items():
+        fields = daily_fields(dates, ocean, rng)
+        for variable_key, meta in VARIABLE_REGISTRY.items():
+            out_dir = recent_root.joinpath(meta["recent_dir"])
+            out_dir.mkdir(parents=True, exist_ok=True)
+            out_path = out_dir.joinpath(f"{meta['prefix']}{period}{meta['suffix']}")
+            name = meta["short_name"]
+            if meta["suffix"] == ".grib":
+                write_grib_accumulations(
+                    out_path, name, fields[name], dates, latitude, longitude
+                )
+                continue
+            write_daily_means(
+                out_path,
+                name,
+                fields[name],
+                dates,
+                latitude,
+                longitude,
+                meta["long_name"],
+            )
+        logging.info(f"Wrote {len(dates)} days of recent data for {period}")
+
+
+def write_baseline_data(
+    clim_dir: Path,
+    latitude: np.ndarray,
+    longitude: np.ndarray,
+    ocean: np.ndarray,
+    rng,
+    seed: int,
+) -> None:
+    """Write the day-of-year and interval climatologies and the SPI/SPEI parameters."""
+    clim_dir.mkdir(parents=True, exist_ok=True)
+    days = np.arange(1, N_DAYS_OF_YEAR + 1)
+    for variable_key, values in climatology_fields(ocean, rng).items():
+        name = "sd" if variable_key == "swe" else variable_key
+        clim = xr.DataArray(
+            values.astype("float32"),
+            dims=("time", "latitude", "longitude"),
+            coords={"time": days, "latitude": latitude, "longitude": longitude},
+            name=name,
+        )
+        clim.to_netcdf(
+            clim_dir.joinpath(f"era5_land_{variable_key}_climo_1981_2020.nc"),
+            engine=NETCDF_ENGINE,
+        )
+        interval_clim = construct_interval_climatology(
+            clim, INTERVALS, INTERVAL_CLIMO_AGGREGATION[variable_key]
+        )
+        interval_clim.to_netcdf(
+            clim_dir.joinpath(f"era5_land_{variable_key}_interval_climo_1981_2020.nc"),
+            engine=NETCDF_ENGINE,
+        )
+    logging.info(f"Wrote climatologies to {clim_dir}")
+
+    # distribution parameters are the largest baseline files by far; they are
+    # generated and written chunk by chunk
+    shape = (len(INTERVALS), N_DAYS_OF_YEAR, len(latitude), len(longitude))
+    chunks = (1, 32, *shape[2:])
+    random = dask.array.random.default_rng(seed)
+    land = xr.DataArray(~ocean, dims=("latitude", "longitude"))
+    parameters = {
+        (f"spi_{SPI_DIST}_parameters.nc", SPI_DIST): {
+            "a": random.uniform(0.8, 3.0, shape, chunks=chunks),
+            "loc": dask.array.zeros(shape, chunks=chunks),
+            "scale": random.uniform(0.0005, 0.003, shape, chunks=chunks),
+        },
+        (f"spei_{SPEI_DIST}_parameters.nc", SPEI_DIST): {
+            "c": random.uniform(3.0, 8.0, shape, chunks=chunks),
+            "loc": random.uniform(-0.02, -0.005, shape, chunks=chunks),
+            "scale": random.uniform(0.003, 0.02, shape, chunks=chunks),
+        },
+    }
+    for (filename, distribution), values in parameters.items():
+        params = xr.DataArray(
+            dask.array.stack(list(values.values())).astype("float32"),
+            dims=("dparams", "interval", "dayofyear", "latitude", "longitude"),
+            coords={
+                "dparams": list(values),
+                "interval": INTERVALS,
+                "dayofyear": days,
+                "latitude": latitude,
+                "longitude": longitude,
+            },
+            name="params",
+            attrs={"scipy_dist": distribution},
+        )
+        params = params.where(land).transpose("interval", "dparams", ...)
+        params.to_dataset().to_netcdf(clim_dir.joinpath(filename), engine=NETCDF_ENGINE)
+        logging.info(f"Wrote {distribution} parameters to {clim_dir}")
+
+
+def write_synthetic_inputs(
+    out_dir: Path,
+    grid: tuple[int, int] = (211, 511),
+    analysis_date="2025-03-10",
+    ocean_fraction: float = 0.4,
+    seed: int = 0,
+) -> dict[str, str]:
+    """Write synthetic recent and baseline data under `out_dir`.
+
+    Returns:
+        Environment variables pointing the pipeline at the synthetic data, see
+        `pipeline_environment`.
+    """
+    out_dir = Path(out_dir)
+    rng = np.random.default_rng(seed)
+    latitude, longitude = synthetic_grid(*grid)
+    ocean = ocean_mask(tuple(grid), ocean_fraction, rng)
+    environment = pipeline_environment(out_dir)
+    write_recent_data(
+        Path(environment["DROUGHT_RECENT_DATA_ROOT"]),
+        analysis_date,
+        latitude,
+        longitude,
+        ocean,
+        rng,
+    )
+    write_baseline_data(
+        Path(environment["DROUGHT_CLIM_DIR"]), latitude, longitude, ocean, rng, seed
+    )
+    return environment
+
+
+def pipeline_environment(out_dir: Path) -> dict[str, str]:
+    """Environment variables running the pipeline on the synthetic data in `out_dir`."""
+    out_dir = Path(out_dir)
+    return {
+        "DROUGHT_RECENT_DATA_ROOT": str(out_dir.joinpath("recent_data")),
+        "DROUGHT_BASELINE_ROOT": str(out_dir.joinpath("baseline_data")),
+        "DROUGHT_CLIM_DIR": str(out_dir.joinpath("baseline_data")),
+        "DROUGHT_RECENT_ARCHIVE_DIR": str(out_dir.joinpath("recent_archive")),
+        "DROUGHT_INDICES_DIR": str(out_dir.joinpath("drought_outputs")),
+    }
+
+
+def main() -> int:
+    args = parse_args()
+    setup_logging()
+    environment = write_synthetic_inputs(
+        args.out, args.grid, args.analysis_date, args.ocean_fraction, args.seed
+    )
+    print("Run the pipeline on the synthetic data with:")
+    print(" ".join(f"{name}={value}" for name, value in environment.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,78 @@
+"""Sizing and scheduling of the chunked (out-of-core) execution mode.
+
+In chunked mode the recent cube and the baseline reference data are split into
+spatial chunks spanning every day, every index is built as a lazy dask graph, and
+the graph is computed on a threaded scheduler with a fixed number of workers. The
+peak memory is then roughly the number of workers times the memory needed for one
+chunk, so `spatial_chunks` sizes the chunks from a memory limit. Every grid cell
+is computed exactly as in eager mode, so the outputs are identical.
+"""
+
+import math
+from contextlib import contextmanager
+
+import dask
+from dask.utils import format_bytes, parse_bytes
+
+# bytes held per grid cell and day of the recent cube while one chunk is processed:
+# the float32 inputs and water budget, their float64 prefix sums and int32 counts,
+# and the temporaries made while building them, with a safety factor
+BYTES_PER_CELL_DAY = 256
+# bytes held per grid cell and day of the downloads while a block of days is
+# archived: the four variables, in float64 as merged, and the temporaries of the
+# digests and the float32 encoding, with a safety factor
+ARCHIVE_BYTES_PER_CELL_DAY = 128
+
+
+def spatial_chunks(
+    n_days: int,
+    n_latitude: int,
+    n_longitude: int,
+    memory_limit: int | str,
+    workers: int = 1,
+) -> dict[str, int]:
+    """Latitude/longitude chunk sizes keeping `workers` chunks within `memory_limit`.
+
+    Args:
+        n_days: days along `valid_time` of the recent cube.
+        n_latitude, n_longitude: size of the grid.
+        memory_limit: total memory budget, in bytes or as a string like "8GB".
+        workers: number of chunks processed at once.
+    """
+    limit = parse_bytes(memory_limit) if isinstance(memory_limit, str) else memory_limit
+    cells = limit // (max(workers, 1) * n_days * BYTES_PER_CELL_DAY)
+    if cells < 1:
+        raise ValueError(
+            f"A memory limit of {format_bytes(limit)} cannot hold even one grid cell "
+            f"of {n_days} days for each of {workers} workers"
+        )
+    if cells >= n_latitude * n_longitude:
+        return {"latitude": n_latitude, "longitude": n_longitude}
+    if cells >= n_longitude:
+        # bands of whole rows, which read contiguously
+        return {"latitude": int(cells // n_longitude), "longitude": n_longitude}
+    side = math.isqrt(cells)
+    return {"latitude": min(n_latitude, side), "longitude": int(cells // side)}
+
+
+def time_block_days(n_latitude: int, n_longitude: int, memory_limit: int | str) -> int:
+    """Number of days of the downloads that can be loaded at once within `memory_limit`.
+
+    The downloads are archived in blocks of this many days, so that each block is
+    read from the download files in one pass rather than day by day.
+    """
+    limit = parse_bytes(memory_limit) if isinstance(memory_limit, str) else memory_limit
+    days = limit // (n_latitude * n_longitude * ARCHIVE_BYTES_PER_CELL_DAY)
+    if days < 1:
+        raise ValueError(
+            f"A memory limit of {format_bytes(limit)} cannot hold even one day "
+            f"of the {n_latitude} x {n_longitude} downloads"
+        )
+    return int(days)
+
+
+@contextmanager
+def dask_scheduler(workers: int = 1):
+    """Compute dask graphs in this context on a pool of `workers` threads."""
+    with dask.config.set(scheduler="threads", num_workers=max(workers, 1)):
+        yield
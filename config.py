@@ -17,18 +17,44 @@ CLIM_DIR = Path(os.getenv("DROUGHT_CLIM_DIR") or BASELINE_DATA_ROOT)
 CLIM_DIR.mkdir(exist_ok=True, parents=True)
 
 # Destination to which the pipeline data is downloaded
-RECENT_DATA_ROOT = REPO_ROOT.joinpath("recent_data")
+RECENT_DATA_ROOT = Path(
+    os.getenv("DROUGHT_RECENT_DATA_ROOT") or REPO_ROOT.joinpath("recent_data")
+)
 RECENT_DATA_ROOT.mkdir(exist_ok=True, parents=True)
 
+# rolling archive of the recent daily data, one file per day, updated by each pipeline run
+RECENT_ARCHIVE_DIR = Path(
+    os.getenv("DROUGHT_RECENT_ARCHIVE_DIR") or REPO_ROOT.joinpath("recent_archive")
+)
+
 # results directory for all drought indices for all summary intervals
-INDICES_DIR = REPO_ROOT.joinpath("drought_outputs")
-INDICES_DIR.mkdir(exist_ok=True)
+INDICES_DIR = Path(
+    os.getenv("DROUGHT_INDICES_DIR") or REPO_ROOT.joinpath("drought_outputs")
+)
+INDICES_DIR.mkdir(exist_ok=True, parents=True)
+
+# Zarr cube of all published indices along reference_date, appended by each pipeline run
+INDICES_CUBE_PATH = Path(
+    os.getenv("DROUGHT_INDICES_CUBE") or INDICES_DIR.joinpath("drought_indices.zarr")
+)
+
+# polygon layers (*.geojson) over which zonal statistics of the indices are computed
+ZONES_DIR = Path(os.getenv("DROUGHT_ZONES_DIR") or REPO_ROOT.joinpath("zones"))
+
+# results directory for the historical (1981-2020) daily hindcast of all indices
+HINDCAST_DIR = Path(
+    os.getenv("DROUGHT_HINDCAST_DIR") or REPO_ROOT.joinpath("hindcast_outputs")
+)
 
 # lag between current date and first date of ERA5-Land data fetched by the CDS API
 # daily updates are available within ~5 days of real time, so 5 is likely the minimum
 DATA_LAG_TIME_DAYS = int(os.getenv("DATA_LAG_TIME_DAYS") or 6)
 # the summary intervals for which to compute the drought indicators
 INTERVALS = [7, 14, 30, 60, 90, 180, 365]
+# days kept in the recent archive: the longest interval plus a margin for daily series
+RECENT_ARCHIVE_RETENTION_DAYS = max(INTERVALS) + int(
+    os.getenv("RECENT_ARCHIVE_MARGIN_DAYS") or 60
+)
 # the geographic bounding box of the area of interest
 DL_BBOX = [72, -180, 51, -129]
 
@@ -61,6 +87,12 @@ def climo_file_for_var(varname: str) -> Path:
     return BASELINE_DATA_ROOT.joinpath(f"era5_land_{varname}_climo_1981_2020.nc")
 
 
+def interval_climo_file_for_var(varname: str) -> Path:
+    return BASELINE_DATA_ROOT.joinpath(
+        f"era5_land_{varname}_interval_climo_1981_2020.nc"
+    )
+
+
 def statistical_rv_partial_dir_for_index(index: str) -> Path:
     _require_supported_index(index)
     if index == "spi":
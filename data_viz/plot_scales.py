@@ -20,6 +20,9 @@ SPI_SPEI_USDM_BOUNDS = (
     4.0,
 )
 
+# category of each bin of SPI_SPEI_USDM_BOUNDS, driest first
+SPI_SPEI_USDM_CATEGORIES = ("D4", "D3", "D2", "D1", "D0", "Normal", "Moist")
+
 SPI_SPEI_USDM_COLORS = (
     "#730000",  # D4 (≤ -2.00)
     "#e60000",  # D3
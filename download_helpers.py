@@ -1,10 +1,16 @@
 import datetime
 import logging
 import os
+from typing import Protocol
 
 import cdsapi
 
-from config import BASELINE_DATA_ROOT, DATA_LAG_TIME_DAYS, DL_BBOX, RECENT_DATA_ROOT
+from config import (
+    BASELINE_DATA_ROOT,
+    DATA_LAG_TIME_DAYS,
+    DL_BBOX,
+    RECENT_DATA_ROOT,
+)
 from era5_land_variable_registry import VARIABLE_REGISTRY
 
 _PREBAKED_DAILY_ENDPOINT = "derived-era5-land-daily-statistics"
@@ -156,6 +162,22 @@ def api_credentials_check():
     assert ".cdsapirc" in os.listdir(os.environ["HOME"]), cds_api_prompt
 
 
+class CdsClient(Protocol):
+    """The part of `cdsapi.Client` used by the download functions."""
+
+    def retrieve(self, name: str, request: dict, target): ...
+
+
+def cds_client() -> CdsClient:
+    """Client of the Climate Data Store API, which needs credentials.
+
+    The download functions take any `CdsClient`; harnesses pass their own, e.g.
+    the offline stand-in of `benchmarks/local_cds.py`.
+    """
+    api_credentials_check()
+    return cdsapi.Client()
+
+
 def get_analysis_date():
     """Create a date-of-analysis for which the prior 365 days will have their data fetched.
     We use this lagged date because data is not available in real-time.
@@ -172,8 +194,12 @@ def download_era5_land_climatology(
     variable_key: str,
     start_year: int = 1981,
     end_year: int = 2021,
+    client: CdsClient | None = None,
 ) -> None:
-    """Download ERA5-Land for one variable over [start_year, end_year]."""
+    """Download ERA5-Land for one variable over [start_year, end_year].
+
+    `client` defaults to the one selected by `cds_client`.
+    """
     variable_meta = VARIABLE_REGISTRY[variable_key]
     cds_variable = variable_meta["cds_variable"]
     prefix = variable_meta["prefix"]
@@ -184,8 +210,7 @@ def download_era5_land_climatology(
     download_dir = BASELINE_DATA_ROOT / dst_dir
     download_dir.mkdir(parents=True, exist_ok=True)
 
-    api_credentials_check()
-    client = cdsapi.Client()
+    client = client or cds_client()
 
     for year in range(start_year, end_year + 1):
         logging.info(
@@ -208,9 +233,17 @@ def download_era5_land_climatology(
 
 
 def download_recurring_era5_land_pipeline(
-    variable_key: str, time_chunk_tag: str, year: int, months: list, days: list
+    variable_key: str,
+    time_chunk_tag: str,
+    year: int,
+    months: list,
+    days: list,
+    client: CdsClient | None = None,
 ):
-    """Download ERA5-Land for Computing the Drought Inidicators."""
+    """Download ERA5-Land for Computing the Drought Inidicators.
+
+    `client` defaults to the one selected by `cds_client`.
+    """
     variable_meta = VARIABLE_REGISTRY[variable_key]
     cds_variable = variable_meta["cds_variable"]
     prefix = variable_meta["prefix"]
@@ -221,8 +254,7 @@ def download_recurring_era5_land_pipeline(
     download_dir = RECENT_DATA_ROOT / dst_dir
     download_dir.mkdir(parents=True, exist_ok=True)
 
-    api_credentials_check()
-    client = cdsapi.Client()
+    client = client or cds_client()
     logging.info(
         "Downloading %s (%s) for %s to %s",
         variable_key,
@@ -3,6 +3,8 @@
 import logging
 from pathlib import Path
 
+import h5py
+import numpy as np
 import xarray as xr
 
 from era5_land_variable_registry import VARIABLE_REGISTRY
@@ -12,13 +14,42 @@ NETCDF_ENGINE = "h5netcdf"
 
 def setup_logging() -> None:
     """Configure logging."""
+    # replaces the default handler that xclim's import installs by logging early
     logging.basicConfig(
         level=logging.INFO,
         format="%(asctime)s | %(levelname)s | %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S",
+        force=True,
     )
 
 
+def memory_mapped(path: Path, da: xr.DataArray) -> xr.DataArray:
+    """`da`, a variable opened from the NetCDF-4 file `path`, backed by a memory map.
+
+    Only variables stored contiguously and uncompressed, exactly as decoded (no
+    scale, offset or non-NaN fill value), can be mapped; others are returned as is.
+    """
+    encoding = da.encoding
+    fill_value = encoding.get("_FillValue")
+    if (
+        "scale_factor" in encoding
+        or "add_offset" in encoding
+        or (fill_value is not None and not np.isnan(fill_value))
+    ):
+        return da
+    with h5py.File(path, "r") as h5_file:
+        dataset = h5_file.get(da.name)
+        if dataset is None or dataset.shape != da.shape or dataset.dtype != da.dtype:
+            return da
+        # chunked (and so compressed) datasets have no single offset
+        offset = dataset.id.get_offset() if dataset.chunks is None else None
+        if offset is None:
+            return da
+        dtype = dataset.dtype
+    mapped = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=da.shape)
+    return da.copy(data=mapped)
+
+
 def year_from_input_filename(name: str, *, prefix: str, suffix: str) -> int:
     if not (name.startswith(prefix) and name.endswith(suffix)):
         raise ValueError(f"Expected filename like {prefix}1993{suffix}, got {name!r}")
@@ -0,0 +1,78 @@
+"""Helpers for matching data to the latitude/longitude grid of the recent data."""
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+# coordinates closer than this (degrees) are the same ERA5-Land (0.1°) grid cell
+GRID_TOLERANCE_DEG = 1e-4
+
+
+def _grid_positions(source: np.ndarray, target: np.ndarray, name: str):
+    """Positions along `source` of the `target` coordinate values, as a slice where possible."""
+    positions = pd.Index(source).get_indexer(
+        target, method="nearest", tolerance=GRID_TOLERANCE_DEG
+    )
+    if (positions < 0).any():
+        raise ValueError(
+            f"{(positions < 0).sum()} of {len(target)} {name} values are not on the "
+            f"source grid ({source.min()} to {source.max()})"
+        )
+    # contiguous runs index lazily-opened files much faster as slices
+    if len(positions) > 1 and np.all(np.diff(positions) == 1):
+        return slice(int(positions[0]), int(positions[-1]) + 1)
+    return positions
+
+
+def match_grid(
+    obj: xr.DataArray | xr.Dataset,
+    latitude: xr.DataArray,
+    longitude: xr.DataArray,
+) -> xr.DataArray | xr.Dataset:
+    """Subset `obj` to the given latitude/longitude cells and adopt their coordinates.
+
+    Cells are matched to the nearest source coordinate within `GRID_TOLERANCE_DEG`,
+    so grids written with slightly different floating point coordinates line up
+    exactly afterwards. Raises ``ValueError`` if a requested cell is not on the
+    source grid. Selection is lazy for lazily-opened files.
+    """
+    lat_positions = _grid_positions(obj["latitude"].values, latitude.values, "latitude")
+    lon_positions = _grid_positions(
+        obj["longitude"].values, longitude.values, "longitude"
+    )
+    return obj.isel(latitude=lat_positions, longitude=lon_positions).assign_coords(
+        latitude=latitude, longitude=longitude
+    )
+
+
+def bbox_region(
+    latitude: np.ndarray,
+    longitude: np.ndarray,
+    lat_min: float,
+    lat_max: float,
+    lon_min: float,
+    lon_max: float,
+) -> dict[str, slice]:
+    """Positional `latitude`/`longitude` slices of the cells centered in a box.
+
+    Longitudes are in the grid's -180 to 180 convention. Raises ``ValueError`` if
+    the box holds no cell centers.
+    """
+    region = {}
+    for name, values, low, high in (
+        ("latitude", np.asarray(latitude), lat_min, lat_max),
+        ("longitude", np.asarray(longitude), lon_min, lon_max),
+    ):
+        if low > high:
+            raise ValueError(f"The {name} bounds {low}, {high} are reversed")
+        inside = np.flatnonzero(
+            (values >= low - GRID_TOLERANCE_DEG) & (values <= high + GRID_TOLERANCE_DEG)
+        )
+        if not len(inside):
+            raise ValueError(
+                f"No {name} of the grid ({values.min()} to {values.max()}) is "
+                f"between {low} and {high}"
+            )
+        # coordinates are monotonic, so the cells inside are contiguous
+        region[name] = slice(int(inside[0]), int(inside[-1]) + 1)
+    return region
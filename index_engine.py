@@ -0,0 +1,752 @@
+"""Reusable engine computing the drought indices from a cube of recent daily data.
+
+The engine holds the recent cube, the opened baseline reference files and the
+indices computed so far, so that several reference dates (backfills, services,
+batch runs) can be computed in one process without reopening the baseline data.
+
+Example:
+    with IndexEngine(cube) as engine:
+        indices = engine.compute()
+        write_interval_files(indices, INDICES_DIR)
+"""
+
+import logging
+import threading
+import time
+from functools import partial
+from pathlib import Path
+
+import dask
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from chunked_execution import dask_scheduler
+from config import (
+    CLIM_DIR,
+    INTERVALS,
+    SPEI_DIST,
+    SPI_DIST,
+)
+from distribution_kernels import cdf, norm_ppf
+from file_helpers import NETCDF_ENGINE, memory_mapped
+from fused_kernels import (
+    FUSED_DISTRIBUTIONS,
+    fused_standardized_index,
+    numba_available,
+)
+from grid_helpers import match_grid
+from interval_aggregates import WindowAggregator
+from land_mask import load_land_mask
+from output_encoding import DEFAULT_OUTPUT_ENCODING, output_encoding
+from running_windows import RunningWindowState, window_variable
+from stage_scheduler import StageTiming, run_stages
+
+# all indices, in the order in which they are computed and written
+INDEX_NAMES = ("tp", "pntp", "swe", "pnswe", "spi", "spei", "smd")
+
+INDEX_TITLES = {
+    "tp": "total precipitation",
+    "pntp": "total precipitation % of normal",
+    "swe": "SWE",
+    "pnswe": "SWE % of normal",
+    "spi": "SPI",
+    "spei": "SPEI",
+    "smd": "SMD",
+}
+
+# indices computed from the (rounded) results of other indices
+INDEX_DEPENDENCIES = {
+    "pntp": ("tp",),
+    "pnswe": ("swe",),
+}
+
+# baseline reference data: key -> (file name under the climatology directory, variable)
+BASELINE_FILES = {
+    "tp_clim": ("era5_land_tp_interval_climo_1981_2020.nc", "tp"),
+    "swe_clim": ("era5_land_swe_interval_climo_1981_2020.nc", "sd"),
+    "swvl_clim": ("era5_land_swvl_interval_climo_1981_2020.nc", "swvl"),
+    "spi_params": (f"spi_{SPI_DIST}_parameters.nc", "params"),
+    "spei_params": (f"spei_{SPEI_DIST}_parameters.nc", "params"),
+}
+
+# value of an index outside the land mask, where every input is missing: a sum over
+# no valid days is zero, every other index is undefined
+MASKED_FILL_VALUES = {"tp": 0.0}
+# the only variable attributes of the outputs; others, e.g. those of a running
+# window state saved from a cube with download metadata, are dropped
+INDEX_ATTRS = ("units", "calibration_period")
+
+# probabilities are clipped to [PROBABILITY_FLOOR, PROBABILITY_CEILING] before the
+# normal PPF, see `standardized_index`
+PROBABILITY_FLOOR = np.float32(1e-6)
+PROBABILITY_CEILING = np.float32(1.0 - PROBABILITY_FLOOR)
+
+
+def standardized_index(
+    values_i: xr.DataArray,
+    params: xr.DataArray,
+    scipy_dist: str,
+    apply_zero_precipitation_correction: bool = False,
+):
+    """Compute a standardized index from pre-fit statistical distribution parameters.
+
+    `values_i` holds the means of the input variable over each summary interval
+    ending on the reference date, stacked along an `interval` dimension, and `params`
+    the distribution parameters for the reference day-of-year and those intervals.
+    The CDF, zero-precipitation correction and normal PPF are each evaluated once
+    for all intervals together.
+    """
+    if apply_zero_precipitation_correction:
+        # For SPI, where the input variable is precipitation.
+        # Many valid observations could be exactly 0
+        # And positive precipitation amounts are continuous and likely right-skewed
+        #
+        # A gamma distribution is only defined for positive values, so we should not
+        # pass exact-zero precipitation values into the gamma CDF. Instead, evaluate
+        # the fitted distribution only where the interval precipitation is > 0.
+        positive_values_only = values_i.where(values_i > 0)
+
+        probability_from_positive_distribution = cdf(
+            params,
+            positive_values_only,
+            scipy_dist,
+        )
+
+        # Track where the original interval value was exactly zero.
+        #
+        # This is SPI-specific bookkeeping. A zero precipitation amount is a valid
+        # climate observation, not missing data, but it cannot be evaluated directly
+        # by a gamma distribution. We therefore treat zero values separately from
+        # positive values.
+        #
+        # Keep missing input values as NaN so that true missing data still propagates
+        # through the calculation.
+        observed_zero_precipitation = xr.where(
+            values_i.notnull(),
+            (values_i == 0).astype("float32"),
+            np.nan,
+        )
+
+        # Combine the zero-precipitation handling with the positive-value CDF.
+        #
+        # For positive precipitation values:
+        #   observed_zero_precipitation = 0
+        #   probability = probability_from_positive_distribution
+        #
+        # For zero precipitation values:
+        #   observed_zero_precipitation = 1
+        #   probability is handled by the zero-value branch
+        #
+        # This branch should NOT be used for SPEI, because SPEI is based on water
+        # balance rather than precipitation. Water balance can legitimately be
+        # negative, so applying `values_i > 0` would incorrectly mask valid dry
+        # conditions and create artificial no-data values.
+        probability = (
+            observed_zero_precipitation
+            + (1 - observed_zero_precipitation) * probability_from_positive_distribution
+        )
+    else:
+        # This branch is intended for non-zero-inflated standardized indices,
+        # especially SPEI.
+        #
+        # SPEI is based on climatic water balance, not precipitation:
+        #
+        #     water_balance = precipitation - PET
+        #
+        # In this pipeline, because `pev` is usually negative, that is computed as:
+        #
+        #     water_balance = tp + pev
+        #
+        # Unlike precipitation, water balance can legitimately be negative.
+        # Negative values are not missing data; they represent dry water-balance
+        # conditions where evaporative demand exceeds precipitation supply.
+        #
+        # Therefore, do NOT apply `values_i.where(values_i > 0)` here.
+        # That positive-value mask is appropriate for gamma-based SPI, but it
+        # would incorrectly remove valid negative SPEI inputs and create
+        # artificial terrestrial no-data values.
+        probability = cdf(
+            params,
+            values_i,
+            scipy_dist,
+        )
+
+    # Convert cumulative probabilities to standardized normal scores.
+    #
+    # The final SPI/SPEI value is produced by applying the inverse CDF, or PPF,
+    # of the standard normal distribution to the fitted-distribution probability.
+    #
+    # However, norm.ppf(0) is -inf and norm.ppf(1) is +inf. Exact 0 or 1
+    # probabilities can occur because of numerical precision, extreme fitted
+    # tails, or values outside the effective range of the fitted distribution.
+    #
+    # Clipping keeps the standardized index finite while only affecting the most
+    # extreme tail values.
+    probability_floor = PROBABILITY_FLOOR
+    probability_ceiling = PROBABILITY_CEILING
+
+    bounded_probability = probability.clip(
+        min=probability_floor,
+        max=probability_ceiling,
+    )
+
+    # Transform probability to a standardized index value with the percent point
+    # function of the standard normal distribution (mean 0, standard deviation 1).
+    #
+    # Negative values indicate drier-than-normal conditions.
+    # Positive values indicate wetter-than-normal conditions.
+    #
+    # For SPI, the input probability came from the precipitation distribution.
+    # For SPEI, the input probability came from the water-balance distribution.
+    standardized_index = norm_ppf(bounded_probability)
+
+    # The standardized index is unitless by construction.
+    standardized_index.attrs["units"] = ""
+    standardized_index.attrs["calibration_period"] = "1981-2020"
+
+    # The parameter selection preserves the scalar `dayofyear` coordinate.
+    # Once the computation is complete, it is no longer useful for the final map.
+    standardized_index = standardized_index.drop_vars(
+        "dayofyear",
+        errors="ignore",
+    )
+
+    return standardized_index
+
+
+def resolve_indices(indices) -> list[str]:
+    """Return the requested indices plus their dependencies, in computation order."""
+    unknown = set(indices) - set(INDEX_NAMES)
+    if unknown:
+        raise ValueError(
+            f"Unsupported indices {sorted(unknown)}; expected some of {INDEX_NAMES}"
+        )
+    required = set(indices)
+    for name in indices:
+        required.update(INDEX_DEPENDENCIES.get(name, ()))
+    return [name for name in INDEX_NAMES if name in required]
+
+
+class IndexEngine:
+    """Compute drought indices for reference dates covered by a recent daily cube.
+
+    Args:
+        cube: daily `tp`, `pev`, `sd` and `swvl` along `valid_time`. Every summary
+            interval must fit between the start of the cube and the reference date.
+        clim_dir: directory holding the baseline reference data.
+        workers: number of indices computed concurrently; only `pntp` and `pnswe`
+            wait for another index, see `INDEX_DEPENDENCIES`.
+        window_state: running window sums ending on a reference date of the cube.
+            Indices for that date are computed from it instead of from prefix sums
+            over the cube, which then only needs to hold the reference date.
+        chunks: latitude/longitude chunk sizes for the chunked execution mode, see
+            `chunked_execution`. The cube and baseline data are split into these
+            spatial chunks and each batch of indices is computed as one dask graph
+            on `workers` threads. None computes eagerly.
+        land_only: compute on the land cells of the cube only, see `land_mask`.
+            They are gathered into one `cell` dimension and the results are
+            scattered back onto the full grid, filled with `MASKED_FILL_VALUES`.
+        fused: compute SPI and SPEI with the fused Numba kernels of
+            `fused_kernels`, straight from the window sums without intermediate
+            arrays. Needs Numba and the gamma and fisk distributions.
+        mmap_baseline: back the baseline variables stored contiguously and
+            uncompressed by read-only memory maps, see `file_helpers.memory_mapped`,
+            so a long-lived engine reads them through the page cache. Chunked or
+            compressed variables are read lazily as usual.
+    """
+
+    def __init__(
+        self,
+        cube: xr.Dataset,
+        clim_dir: Path = CLIM_DIR,
+        workers: int = 1,
+        window_state: RunningWindowState | None = None,
+        chunks: dict[str, int] | None = None,
+        land_only: bool = True,
+        fused: bool = False,
+        mmap_baseline: bool = False,
+    ):
+        if fused and not numba_available():
+            raise ImportError(
+                "The fused SPI/SPEI kernels need Numba; install the `fused` extra, "
+                "e.g. `uv sync --extra fused`"
+            )
+        unsupported = {SPI_DIST, SPEI_DIST} - set(FUSED_DISTRIBUTIONS)
+        if fused and unsupported:
+            raise ValueError(
+                f"The fused kernels do not support the {sorted(unsupported)} "
+                f"distributions; expected some of {sorted(FUSED_DISTRIBUTIONS)}"
+            )
+        self.fused = fused
+        self.chunks = chunks
+        self.mmap_baseline = mmap_baseline
+        if chunks:
+            cube = cube.chunk({"valid_time": -1, **chunks})
+        self.clim_dir = Path(clim_dir)
+        self.latitude = cube["latitude"]
+        self.longitude = cube["longitude"]
+        # positions of the land cells along `cell`, or None to compute on the full grid
+        self.cells: dict[str, xr.DataArray] | None = None
+        if land_only:
+            land = match_grid(
+                load_land_mask(self.clim_dir, BASELINE_FILES),
+                self.latitude,
+                self.longitude,
+            )
+            lat_positions, lon_positions = np.nonzero(land.values)
+            self.cells = {
+                "latitude": xr.DataArray(lat_positions, dims="cell"),
+                "longitude": xr.DataArray(lon_positions, dims="cell"),
+            }
+            cube = self.gather(cube)
+        self.cube = cube
+        self.workers = workers
+        self.window_state = window_state
+        self.times = pd.DatetimeIndex(cube["valid_time"].values)
+        # computed indices: reference date -> index name -> stacked intervals
+        self.results: dict[pd.Timestamp, dict[str, xr.DataArray]] = {}
+        # wall-clock time of every index computed so far, in computation order
+        self.timings: list[StageTiming] = []
+        self._baseline_datasets: dict[str, xr.Dataset] = {}
+        self._baseline: dict[str, xr.DataArray] = {}
+        self._aggregators: dict[str, WindowAggregator] = {}
+        # guards the lazily-filled caches above when indices run on several threads
+        self._lock = threading.Lock()
+        self._aggregator_locks: dict[str, threading.Lock] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        """Close the opened baseline files."""
+        for ds in self._baseline_datasets.values():
+            ds.close()
+        self._baseline_datasets.clear()
+        self._baseline.clear()
+
+    def baseline(self, key: str) -> xr.DataArray:
+        """Return one baseline reference variable on the cube's grid, opening its file on first use.
+
+        The variable stays lazy; only the cells of the cube are ever read from it.
+        """
+        with self._lock:
+            if key not in self._baseline:
+                filename, varname = BASELINE_FILES[key]
+                path = self.clim_dir.joinpath(filename)
+                self._baseline_datasets[key] = xr.open_dataset(path)
+                variable = self._baseline_datasets[key][varname]
+                if self.mmap_baseline:
+                    variable = memory_mapped(path, variable)
+                baseline = match_grid(variable, self.latitude, self.longitude)
+                if self.chunks:
+                    baseline = baseline.chunk(self.chunks)
+                self._baseline[key] = baseline
+            return self._baseline[key]
+
+    def gather(self, obj: xr.DataArray | xr.Dataset) -> xr.DataArray | xr.Dataset:
+        """Select the land cells of a full-grid object along a `cell` dimension."""
+        if self.cells is None:
+            return obj
+        return obj.isel(self.cells)
+
+    def scatter(self, da: xr.DataArray, fill_value=np.nan) -> xr.DataArray:
+        """Place the `cell` values of `da` back on the full grid, filling other cells."""
+        if self.cells is None:
+            return da
+        dims = [dim for dim in da.dims if dim != "cell"]
+        values = np.full(
+            [da.sizes[dim] for dim in dims] + [self.latitude.size, self.longitude.size],
+            fill_value,
+            dtype=da.dtype,
+        )
+        values[..., self.cells["latitude"].values, self.cells["longitude"].values] = (
+            da.transpose(*dims, "cell").values
+        )
+        coords = {
+            name: coord for name, coord in da.coords.items() if "cell" not in coord.dims
+        }
+        return xr.DataArray(
+            values,
+            dims=dims + ["latitude", "longitude"],
+            coords={**coords, "latitude": self.latitude, "longitude": self.longitude},
+            name=da.name,
+            attrs=da.attrs,
+        )
+
+    def _scatter_indices(self, arrays: list[xr.DataArray]) -> list[xr.DataArray]:
+        return [
+            self.scatter(da, MASKED_FILL_VALUES.get(da.name, np.nan)) for da in arrays
+        ]
+
+    def aggregator(self, variable_key: str) -> WindowAggregator:
+        """Return the prefix-sum aggregator for one cube variable, or `wb` for the water budget."""
+        with self._lock:
+            lock = self._aggregator_locks.setdefault(variable_key, threading.Lock())
+        # one lock per variable: a second index needing it waits for the prefix sums
+        # instead of repeating them, while other variables are built concurrently
+        with lock:
+            if variable_key not in self._aggregators:
+                if (self.times[1:] - self.times[:-1] != pd.Timedelta(days=1)).any():
+                    raise ValueError(
+                        "Summary intervals not covered by the running window state "
+                        "need a cube of consecutive days"
+                    )
+                self._aggregators[variable_key] = WindowAggregator(
+                    window_variable(self.cube, variable_key), dim="valid_time"
+                )
+            return self._aggregators[variable_key]
+
+    def _from_window_state(self, end, intervals) -> bool:
+        return (
+            self.window_state is not None
+            and not isinstance(end, xr.DataArray)
+            and self.window_state.covers(self.times[end], intervals)
+        )
+
+    def window_totals(
+        self, variable_key: str, intervals, end
+    ) -> tuple[xr.DataArray, xr.DataArray]:
+        """Double-precision trailing-window sums and valid-day counts ending at position `end`."""
+        if self._from_window_state(end, intervals):
+            totals = self.gather(self.window_state.totals.sel(interval=list(intervals)))
+            return totals[f"{variable_key}_sum"], totals[f"{variable_key}_count"]
+        return self.aggregator(variable_key).interval_totals(intervals, end)
+
+    def window_sums(self, variable_key: str, intervals, end) -> xr.DataArray:
+        """Trailing-window sums of a variable ending at position `end`, per interval."""
+        if self._from_window_state(end, intervals):
+            dtype = self.cube["tp" if variable_key == "wb" else variable_key].dtype
+            return self.gather(
+                self.window_state.interval_sums(variable_key, intervals, dtype)
+            )
+        return self.aggregator(variable_key).interval_sums(intervals, end)
+
+    def window_means(self, variable_key: str, intervals, end) -> xr.DataArray:
+        """Trailing-window means of a variable ending at position `end`, per interval."""
+        if self._from_window_state(end, intervals):
+            dtype = self.cube["tp" if variable_key == "wb" else variable_key].dtype
+            return self.gather(
+                self.window_state.interval_means(variable_key, intervals, dtype)
+            )
+        return self.aggregator(variable_key).interval_means(intervals, end)
+
+    def reference_position(self, ref_date=None) -> int:
+        """Position of the reference date along `valid_time`; the last date if None."""
+        if ref_date is None:
+            return len(self.times) - 1
+        return self.times.get_loc(pd.Timestamp(ref_date))
+
+    def compute(
+        self,
+        ref_date=None,
+        intervals=INTERVALS,
+        indices=INDEX_NAMES,
+    ) -> xr.Dataset:
+        """Compute drought indices for the summary intervals ending on `ref_date`.
+
+        Args:
+            ref_date: reference date within the cube; defaults to its last date.
+            intervals: summary interval lengths in days.
+            indices: names of the indices to compute, see `INDEX_NAMES`.
+
+        Returns:
+            Dataset with one variable per requested index, stacked along `interval`,
+            with the reference date in the `reference_date` attribute.
+        """
+        end = self.reference_position(ref_date)
+        ref_date = self.times[end]
+        intervals = list(intervals)
+        results = self.results.setdefault(ref_date, {})
+
+        names = []
+        for name in resolve_indices(indices):
+            cached = results.get(name)
+            if cached is not None and set(intervals) <= set(cached["interval"].values):
+                continue
+            logging.info(f"Processing drought index: {INDEX_TITLES[name]}...")
+            names.append(name)
+        self._run(names, end, ref_date.dayofyear, intervals, results)
+
+        out_ds = _merge_indices(
+            self._scatter_indices(
+                [results[name].sel(interval=intervals) for name in indices]
+            )
+        )
+        out_ds.attrs["reference_date"] = ref_date.strftime("%Y-%m-%d")
+        return out_ds
+
+    def compute_series(
+        self,
+        start=None,
+        end=None,
+        intervals=INTERVALS,
+        indices=INDEX_NAMES,
+    ) -> xr.Dataset:
+        """Compute drought indices for every reference date from `start` through `end`.
+
+        All reference dates are evaluated in one vectorized pass: the windows come
+        from the prefix sums at every ending position, and the climatologies and
+        distribution parameters are looked up for each date's day-of-year.
+
+        Args:
+            start: first reference date; defaults to the first date for which the
+                longest interval fits in the cube.
+            end: last reference date; defaults to the last date of the cube.
+            intervals: summary interval lengths in days.
+            indices: names of the indices to compute, see `INDEX_NAMES`.
+
+        Returns:
+            Dataset with one variable per requested index along `reference_date`
+            and `interval`.
+        """
+        intervals = list(intervals)
+        first = max(intervals) - 1 if start is None else self.reference_position(start)
+        last = self.reference_position(end)
+        dates = self.times[first : last + 1]
+        if dates.empty:
+            raise ValueError(f"No reference dates between {start} and {end}")
+
+        ends = xr.DataArray(
+            np.arange(first, last + 1),
+            dims="reference_date",
+            coords={"reference_date": dates},
+        )
+        doys = xr.DataArray(
+            dates.dayofyear,
+            dims="reference_date",
+            coords={"reference_date": dates},
+        )
+
+        names = resolve_indices(indices)
+        for name in names:
+            logging.info(
+                f"Processing drought index series: {INDEX_TITLES[name]} "
+                f"({len(dates)} reference dates)..."
+            )
+        results = {}
+        self._run(names, ends, doys, intervals, results)
+
+        out_ds = _merge_indices(
+            self._scatter_indices([results[name] for name in indices])
+        )
+        out_ds.attrs["first_reference_date"] = dates[0].strftime("%Y-%m-%d")
+        out_ds.attrs["last_reference_date"] = dates[-1].strftime("%Y-%m-%d")
+        return out_ds
+
+    def _run(self, names, end, doy, intervals, results) -> None:
+        """Compute the named indices into `results`, concurrently on `workers` threads."""
+        stages = {
+            name: partial(getattr(self, f"_compute_{name}"), end, doy, intervals)
+            for name in names
+        }
+        _, timings = run_stages(
+            stages, INDEX_DEPENDENCIES, workers=self.workers, results=results
+        )
+        self.timings.extend(timings)
+
+        if self.chunks:
+            # the stages only built graphs; compute them together so shared inputs
+            # (prefix sums, baseline chunks) are evaluated once per spatial chunk
+            started = time.perf_counter()
+            with dask_scheduler(self.workers):
+                computed = dask.compute(*(results[name] for name in names))
+            results.update(zip(names, computed))
+            graphs_built = max((t.started + t.seconds for t in timings), default=0.0)
+            self.timings.append(
+                StageTiming("dask compute", graphs_built, time.perf_counter() - started)
+            )
+
+    def _load(self, da: xr.DataArray) -> xr.DataArray:
+        """Load baseline selections into memory, unless computing lazily in chunks."""
+        return da if self.chunks else da.load()
+
+    def _clim(self, key: str, doy, intervals) -> xr.DataArray:
+        """Precomputed climatology aggregates ending on `doy` for every interval."""
+        clim = self.gather(
+            self._load(
+                self.baseline(key)
+                .sel(dayofyear=doy, interval=intervals)
+                .drop_vars("dayofyear")
+            )
+        )
+        # descriptive attributes of the baseline file do not carry over to the indices
+        clim.attrs = {}
+        return clim
+
+    def _compute_tp(self, end, doy, intervals, results):
+        # convert from m to cm to match climatology
+        tp = self.window_sums("tp", intervals, end) * 100
+        tp = np.round(tp, 1)
+        tp.name = "tp"
+        tp.attrs["units"] = "cm"
+        return tp
+
+    def _compute_pntp(self, end, doy, intervals, results):
+        clim_tp = self._clim("tp_clim", doy, intervals)
+        pntp = xr.where(
+            clim_tp > 0,
+            np.round((results["tp"].sel(interval=intervals) / clim_tp), 1),
+            np.nan,
+        )
+        pntp.name = "pntp"
+        pntp.attrs["units"] = "percent"
+        return pntp
+
+    def _compute_swe(self, end, doy, intervals, results):
+        # convert from m to cm
+        swe = self.window_means("sd", intervals, end) * 100
+        swe.name = "swe"
+        swe.attrs["units"] = "cm"
+        # DataArray.round keeps the attributes, also for dask-backed arrays
+        return swe.round(1)
+
+    def _compute_pnswe(self, end, doy, intervals, results):
+        clim_swe = self._clim("swe_clim", doy, intervals)
+        # don't need to multiply by 100 because swe index is in cm,
+        # so conversion of clim swe to cm would cancel with conversion of result to percentage
+        # e.g. (swe_in_cm / (clim_swe_in_m * 100)) * 100 == swe_in_cm / clim_swe_in_m
+        pnswe = xr.where(
+            clim_swe > 0,
+            np.round(results["swe"].sel(interval=intervals) / clim_swe, 1),
+            np.nan,
+        )
+        # over the water, SWE will always be zero. This comes out as NaN in the results (the only NaNs)
+        pnswe.name = "pnswe"
+        pnswe.attrs["units"] = "percent"
+        return pnswe
+
+    def _standardized(
+        self, key, scipy_dist, variable_key, end, doy, intervals, zero_correction
+    ) -> xr.DataArray:
+        """Rounded SPI or SPEI of a variable's interval means, from the parameters under `key`."""
+        if self.fused:
+            sums, counts = self.window_totals(variable_key, intervals, end)
+            params = self.baseline(key).sel(dayofyear=doy, interval=intervals)
+            index = fused_standardized_index(
+                sums,
+                counts,
+                self.gather(self._load(params)),
+                scipy_dist,
+                zero_correction,
+                PROBABILITY_FLOOR,
+                PROBABILITY_CEILING,
+            )
+            index.attrs.update(units="", calibration_period="1981-2020")
+            return index.drop_vars("dayofyear", errors="ignore")
+
+        values = self.window_means(variable_key, intervals, end)
+        params = self.baseline(key).sel(dayofyear=doy, interval=intervals)
+        index = standardized_index(
+            values,
+            self.gather(self._load(params)),
+            scipy_dist=scipy_dist,
+            apply_zero_precipitation_correction=zero_correction,
+        )
+        return index.round(1)
+
+    def _compute_spi(self, end, doy, intervals, results):
+        spi = self._standardized(
+            "spi_params", SPI_DIST, "tp", end, doy, intervals, zero_correction=True
+        )
+        spi.name = "spi"
+        spi.attrs["units"] = ""
+        return spi
+
+    def _compute_spei(self, end, doy, intervals, results):
+        spei = self._standardized(
+            "spei_params", SPEI_DIST, "wb", end, doy, intervals, zero_correction=False
+        )
+        spei.name = "spei"
+        spei.attrs["units"] = ""
+        return spei
+
+    def _compute_smd(self, end, doy, intervals, results):
+        swvl = self.window_means("swvl", intervals, end)
+        clim_swvl = self._clim("swvl_clim", doy, intervals)
+        smd = xr.where(
+            clim_swvl > 0,
+            np.round(((clim_swvl - swvl) / clim_swvl) * 100, 1),
+            np.nan,
+        )
+        smd.name = "smd"
+        smd.attrs["units"] = "percent"
+        return smd
+
+
+def _merge_indices(arrays: list[xr.DataArray]) -> xr.Dataset:
+    """Merge the index arrays, keeping only their `INDEX_ATTRS`.
+
+    The dataset attributes start out empty, rather than as the attributes the
+    arrays have in common.
+    """
+    leading = [dim for dim in ("reference_date", "interval") if dim in arrays[0].dims]
+    merged = []
+    for da in arrays:
+        da = da.transpose(*leading, ...).copy(deep=False)
+        da.attrs = {name: da.attrs[name] for name in INDEX_ATTRS if name in da.attrs}
+        merged.append(da)
+    out_ds = xr.merge(
+        merged,
+        join="exact",
+        compat="no_conflicts",
+        combine_attrs="drop_conflicts",
+    )
+    out_ds.attrs = {}
+    return out_ds
+
+
+def write_interval_files(
+    indices: xr.Dataset,
+    out_dir: Path,
+    encoding: str = DEFAULT_OUTPUT_ENCODING,
+) -> list[Path]:
+    """Write one `drought_indices_<n>day_<YYYY>_<MM>_<DD>.nc` file per summary interval.
+
+    `encoding` names one of the `output_encoding.OUTPUT_ENCODINGS` schemes.
+    """
+    ref_date = pd.Timestamp(indices.attrs["reference_date"])
+    out_paths = []
+    for i in indices["interval"].values:
+        out_ds = indices.sel(interval=i, drop=True).drop_vars("time", errors="ignore")
+        out_path = Path(out_dir).joinpath(
+            f"drought_indices_{i}day_{ref_date.strftime('%Y_%m_%d')}.nc"
+        )
+        out_ds.to_netcdf(
+            out_path,
+            engine=NETCDF_ENGINE,
+            encoding=output_encoding(out_ds, encoding),
+        )
+        out_paths.append(out_path)
+    return out_paths
+
+
+def write_series_files(
+    indices: xr.Dataset,
+    out_dir: Path,
+    encoding: str = DEFAULT_OUTPUT_ENCODING,
+) -> list[Path]:
+    """Write one `drought_index_series_<n>day_<YYYY>_<MM>_<DD>_<YYYY>_<MM>_<DD>.nc` file per summary interval.
+
+    The names deliberately do not match the `drought_indices_<n>day_*` pattern that
+    the plotting scripts expect to find exactly once per interval. `encoding` names
+    one of the `output_encoding.OUTPUT_ENCODINGS` schemes.
+    """
+    first = pd.Timestamp(indices.attrs["first_reference_date"]).strftime("%Y_%m_%d")
+    last = pd.Timestamp(indices.attrs["last_reference_date"]).strftime("%Y_%m_%d")
+    out_paths = []
+    for i in indices["interval"].values:
+        out_ds = indices.sel(interval=i, drop=True).drop_vars("time", errors="ignore")
+        out_path = Path(out_dir).joinpath(
+            f"drought_index_series_{i}day_{first}_{last}.nc"
+        )
+        out_ds.to_netcdf(
+            out_path,
+            engine=NETCDF_ENGINE,
+            encoding=output_encoding(out_ds, encoding),
+        )
+        out_paths.append(out_path)
+    return out_paths
@@ -0,0 +1,331 @@
+"""Zarr cube of the published drought indices along reference date.
+
+Next to the `drought_indices_<n>day_<YYYY>_<MM>_<DD>.nc` files of each run, the
+indices are collected in one Zarr store at `INDICES_CUBE_PATH`, with one float32
+array per indicator of shape (reference_date, interval, latitude, longitude).
+Each pipeline run appends its reference date, or rewrites it if it is already in
+the cube, so the history of any cell is one read instead of one file per day.
+
+The arrays are chunked in blocks of `CUBE_CHUNKS`: 16 reference dates x all
+intervals x the spatial tiles of the NetCDF outputs. A map of one date reads 16
+blocks and a year of one cell's series 23, so neither access pattern is more
+than a few tens of milliseconds on the `DL_BBOX` grid, and a daily run rewrites
+only the 16 blocks of its dates' chunk per indicator. Chunks of one date favour
+maps but make a year's series hundreds of reads, and long per-cell chunks the
+reverse; `benchmarks/benchmark_indices_cube.py` compares the layouts.
+`open_cube`, `read_map` and `read_series` read without Dask, so only the
+blocks a selection overlaps are decompressed.
+
+Usage (rebuilds the cube from the dated NetCDF files in INDICES_DIR):
+    python indices_cube.py --rebuild
+"""
+
+import argparse
+import logging
+import math
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from config import INDICES_CUBE_PATH, INDICES_DIR, INTERVALS
+from file_helpers import NETCDF_ENGINE, setup_logging
+from output_encoding import decode_tenths
+from point_extraction import INDICES_FILE_PATTERN
+
+CUBE_DIMS = ("reference_date", "interval", "latitude", "longitude")
+# chunk length along each dimension, see the module docstring
+CUBE_CHUNKS = {
+    "reference_date": 16,
+    "interval": len(INTERVALS),
+    "latitude": 64,
+    "longitude": 128,
+}
+# the reference date coordinate is small; one chunk holds decades of dates
+REFERENCE_DATE_CHUNK = 16384
+
+
+def _chunk_shape(sizes: dict, chunks: dict) -> tuple[int, ...]:
+    """Chunks of about `chunks` cells that split the fixed dimensions evenly.
+
+    The reference date grows with every run, so it gets chunks of exactly
+    `chunks["reference_date"]`.
+    """
+    shape = []
+    for dim in CUBE_DIMS:
+        if dim == "reference_date":
+            shape.append(chunks[dim])
+        else:
+            n_chunks = math.ceil(sizes[dim] / chunks.get(dim, 1))
+            shape.append(max(1, math.ceil(sizes[dim] / n_chunks)))
+    return tuple(shape)
+
+
+def _as_cube_slab(indices: xr.Dataset) -> xr.Dataset:
+    """Indices of one or more reference dates, laid out as the cube."""
+    ds = indices.reset_coords(drop=True)
+    if "reference_date" not in ds.dims:
+        ds = ds.expand_dims(
+            reference_date=[pd.Timestamp(indices.attrs["reference_date"])]
+        )
+    # loaded, so that Dask chunks of chunked runs need not align with the cube's
+    ds = ds.transpose(*CUBE_DIMS).astype("float32").load()
+    ds.attrs = {}
+    return ds
+
+
+def _create_cube(slab: xr.Dataset, path: Path, chunks: dict) -> None:
+    # every configured interval has a slot, filled as its indices are written
+    slab = slab.reindex(interval=sorted(set(INTERVALS) | set(slab["interval"].values)))
+    shape = _chunk_shape(slab.sizes, chunks)
+    encoding = {name: {"chunks": shape} for name in slab.data_vars}
+    encoding["reference_date"] = {
+        "units": "days since 1970-01-01",
+        "dtype": "int32",
+        "chunks": (REFERENCE_DATE_CHUNK,),
+    }
+    slab.attrs["description"] = (
+        "Drought indices of every published reference date and summary interval"
+    )
+    slab.to_zarr(path, mode="w-", encoding=encoding, consolidated=False)
+
+
+def _contiguous_runs(positions: np.ndarray) -> list[np.ndarray]:
+    """Indices into sorted `positions`, split where the positions are not consecutive."""
+    breaks = np.flatnonzero(np.diff(positions) != 1) + 1
+    return np.split(np.arange(len(positions)), breaks)
+
+
+def _region(positions: np.ndarray) -> slice:
+    return slice(int(positions[0]), int(positions[-1]) + 1)
+
+
+def write_to_cube(
+    indices: xr.Dataset,
+    path: Path = INDICES_CUBE_PATH,
+    chunks: dict | None = None,
+    skip_earlier: bool = False,
+) -> Path:
+    """Add the indices of one or more reference dates to the cube at `path`.
+
+    Args:
+        indices: output of `IndexEngine.compute` (with a `reference_date`
+            attribute) or `IndexEngine.compute_series` (along `reference_date`),
+            for any subset of the cube's intervals.
+        path: Zarr store, created on first use.
+        chunks: chunk lengths of a new cube; defaults to `CUBE_CHUNKS`.
+        skip_earlier: skip new dates before the last date of the cube with a
+            warning, rather than raising ``ValueError``.
+
+    Dates already in the cube are overwritten for the given intervals only; new
+    dates are appended, with NaN for the intervals not given, and must be later
+    than the last date of the cube, since the cube only grows at its end. Raises
+    ``ValueError`` if the grid, the indicators or the intervals differ from the
+    cube's.
+    """
+    path = Path(path)
+    slab = _as_cube_slab(indices)
+    if not path.exists():
+        _create_cube(slab, path, chunks or CUBE_CHUNKS)
+        logging.info(
+            f"Created indices cube {path} with {slab.sizes['reference_date']} dates"
+        )
+        return path
+
+    with open_cube(path) as cube:
+        cube_dates = cube.indexes["reference_date"]
+        cube_intervals = cube.indexes["interval"]
+        if set(slab.data_vars) != set(cube.data_vars):
+            raise ValueError(
+                f"Indices {sorted(slab.data_vars)} differ from those of the cube "
+                f"{sorted(cube.data_vars)} at {path}"
+            )
+        for dim in ("latitude", "longitude"):
+            if not np.allclose(slab[dim].values, cube[dim].values):
+                raise ValueError(f"The {dim} grid differs from the cube at {path}")
+        unknown = sorted(set(slab["interval"].values) - set(cube_intervals))
+        if unknown:
+            raise ValueError(f"Intervals {unknown} are not in the cube at {path}")
+
+    slab = slab.drop_vars(["latitude", "longitude"])
+    positions = cube_dates.get_indexer(slab.indexes["reference_date"])
+    new = positions < 0
+    earlier = new & (slab.indexes["reference_date"] < cube_dates.max())
+    if earlier.any():
+        message = (
+            f"Cannot insert {int(earlier.sum())} dates before the last date of the "
+            f"cube ({cube_dates.max().date()}) at {path}"
+        )
+        if not skip_earlier:
+            raise ValueError(message)
+        logging.warning(f"{message}; skipping them")
+        slab, positions, new = (
+            slab.isel(reference_date=~earlier),
+            positions[~earlier],
+            new[~earlier],
+        )
+
+    if (~new).any():
+        existing = slab.isel(reference_date=~new)
+        date_positions = positions[~new]
+        interval_positions = cube_intervals.get_indexer(existing.indexes["interval"])
+        existing = existing.isel(interval=np.argsort(interval_positions))
+        interval_positions = np.sort(interval_positions)
+        # regions must be contiguous: one write per run of dates and of intervals
+        for dates in _contiguous_runs(date_positions):
+            for intervals in _contiguous_runs(interval_positions):
+                existing.isel(reference_date=dates, interval=intervals).to_zarr(
+                    path,
+                    consolidated=False,
+                    region={
+                        "reference_date": _region(date_positions[dates]),
+                        "interval": _region(interval_positions[intervals]),
+                    },
+                )
+    if new.any():
+        slab.isel(reference_date=new).reindex(interval=cube_intervals).to_zarr(
+            path, append_dim="reference_date", consolidated=False
+        )
+    logging.info(
+        f"Wrote {int(new.sum())} new and {int((~new).sum())} existing dates "
+        f"to indices cube {path}"
+    )
+    return path
+
+
+def open_cube(path: Path = INDICES_CUBE_PATH) -> xr.Dataset:
+    """Lazily open the cube; selections read only the chunks they overlap."""
+    # Zarr v3 keeps the metadata of each array next to it; a local store needs no
+    # consolidated copy
+    return xr.open_zarr(path, chunks=None, consolidated=False)
+
+
+def read_map(
+    reference_date=None,
+    intervals=None,
+    indices=None,
+    path: Path = INDICES_CUBE_PATH,
+) -> xr.Dataset:
+    """Indices of every cell on one reference date, by default the latest.
+
+    Args:
+        reference_date: date in the cube.
+        intervals: summary intervals; by default all.
+        indices: names of the indicators; by default all.
+        path: Zarr store of the cube.
+    """
+    with open_cube(path) as cube:
+        ds = cube[indices] if indices else cube
+        if reference_date is None:
+            reference_date = cube.indexes["reference_date"].max()
+        ds = ds.sel(reference_date=pd.Timestamp(reference_date))
+        if intervals is not None:
+            ds = ds.sel(interval=list(intervals))
+        return ds.load()
+
+
+def read_series(
+    latitude: float,
+    longitude: float,
+    start=None,
+    end=None,
+    intervals=None,
+    indices=None,
+    path: Path = INDICES_CUBE_PATH,
+) -> xr.Dataset:
+    """Indices of the cell nearest to a point for every reference date from `start` through `end`.
+
+    Args:
+        latitude, longitude: point whose nearest grid cell is read.
+        start, end: first and last reference date; by default the whole cube.
+        intervals: summary intervals; by default all.
+        indices: names of the indicators; by default all.
+        path: Zarr store of the cube.
+    """
+    with open_cube(path) as cube:
+        ds = cube[indices] if indices else cube
+        ds = ds.sel(latitude=latitude, longitude=longitude, method="nearest")
+        ds = ds.sel(reference_date=slice(start, end))
+        if intervals is not None:
+            ds = ds.sel(interval=list(intervals))
+        return ds.load()
+
+
+def dated_indices_files(data_dir: Path = INDICES_DIR) -> dict[pd.Timestamp, list[Path]]:
+    """Reference date -> `drought_indices_<n>day_*.nc` files in `data_dir`, by date."""
+    by_date: dict[pd.Timestamp, list[Path]] = {}
+    for path in Path(data_dir).glob("drought_indices_*day_*.nc"):
+        match = INDICES_FILE_PATTERN.fullmatch(path.name)
+        if match:
+            _, year, month, day = (int(group) for group in match.groups())
+            date = pd.Timestamp(year=year, month=month, day=day)
+            by_date.setdefault(date, []).append(path)
+    return dict(sorted(by_date.items()))
+
+
+def open_dated_indices(paths: list[Path]) -> xr.Dataset:
+    """The indices of one reference date from its interval files, stacked along `interval`."""
+    datasets = []
+    for path in paths:
+        interval = int(INDICES_FILE_PATTERN.fullmatch(path.name).group(1))
+        with xr.open_dataset(path, engine=NETCDF_ENGINE) as ds:
+            datasets.append(decode_tenths(ds.load()).expand_dims(interval=[interval]))
+    return xr.concat(datasets, dim="interval", combine_attrs="drop_conflicts").sortby(
+        "interval"
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        default=INDICES_DIR,
+        help="Directory of the dated drought_indices_<n>day_*.nc files.",
+    )
+    parser.add_argument(
+        "--path", type=Path, default=INDICES_CUBE_PATH, help="Zarr store of the cube."
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Delete an existing cube first; otherwise only later dates can be added.",
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    setup_logging()
+    args = parse_args()
+    by_date = dated_indices_files(args.data_dir)
+    if not by_date:
+        raise FileNotFoundError(
+            f"No drought_indices_<n>day_*.nc files in {args.data_dir}"
+        )
+    if args.rebuild and args.path.exists():
+        logging.info(f"Deleting indices cube {args.path}")
+        shutil.rmtree(args.path)
+    # a chunk of dates per write rewrites each block of the cube only once
+    dates = list(by_date)
+    batch = CUBE_CHUNKS["reference_date"]
+    for start in range(0, len(dates), batch):
+        batch_dates = dates[start : start + batch]
+        logging.info(
+            f"Adding {batch_dates[0].date()} to {batch_dates[-1].date()} to the cube"
+        )
+        indices = xr.concat(
+            [
+                open_dated_indices(by_date[date]).expand_dims(reference_date=[date])
+                for date in batch_dates
+            ],
+            dim="reference_date",
+            join="outer",
+        )
+        write_to_cube(indices, args.path)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,113 @@
+"""Prefix-sum aggregation of daily data over summary intervals.
+
+A cumulative sum along the time axis is built once per variable. The sum or mean
+over any run of consecutive time steps is then the difference of two cumulative
+grids, so aggregating every summary interval costs O(days) rather than
+O(sum of intervals).
+"""
+
+import numpy as np
+import xarray as xr
+
+
+def _prepend_zero(cumulative: xr.DataArray, dim: str) -> xr.DataArray:
+    """Prepend a zero step so that position k holds the total of the first k steps."""
+    zero = xr.zeros_like(cumulative.isel({dim: [0]}))
+    return xr.concat([zero, cumulative], dim=dim)
+
+
+class WindowAggregator:
+    """Windowed sums and means of a variable from cumulative sums along one dimension.
+
+    Missing values are skipped, matching the default ``skipna`` behavior of
+    ``DataArray.sum`` and ``DataArray.mean``: a window with no valid values sums
+    to zero and has a NaN mean.
+
+    Window positions refer to the original time steps. Integer positions return
+    a single grid; ``xarray.DataArray`` positions are evaluated vectorized, with the
+    result taking on the dimensions of the position array.
+    """
+
+    def __init__(self, da: xr.DataArray, dim: str = "valid_time"):
+        self.dim = dim
+        self.size = da.sizes[dim]
+        self.labels = da[dim].values if dim in da.coords else np.arange(self.size)
+        self.dtype = da.dtype
+
+        # coordinates along the aggregated dimension have no meaning for a window
+        da = da.drop_vars([name for name in da.coords if dim in da[name].dims])
+
+        # accumulate in double precision so that differencing large totals stays exact
+        self._cumsum = _prepend_zero(
+            da.fillna(0).astype("float64").cumsum(dim=dim), dim
+        )
+        self._count = _prepend_zero(da.notnull().astype("int32").cumsum(dim=dim), dim)
+
+    def _span(self, cumulative, start, stop):
+        total = cumulative.isel({self.dim: stop}) - cumulative.isel({self.dim: start})
+        # a span whose start does not precede its stop wraps around the end of the
+        # axis, as for a day-of-year climatology window crossing December 31
+        wraps = start >= stop
+        if isinstance(wraps, xr.DataArray):
+            if wraps.any():
+                total = total + cumulative.isel({self.dim: self.size}) * wraps
+        elif wraps:
+            total = total + cumulative.isel({self.dim: self.size})
+        return total
+
+    def span_sum(self, start, stop) -> xr.DataArray:
+        """Sum over positions ``[start, stop)``, wrapping when ``start >= stop``."""
+        return self._span(self._cumsum, start, stop).astype(self.dtype)
+
+    def span_count(self, start, stop) -> xr.DataArray:
+        """Number of valid values over positions ``[start, stop)``."""
+        return self._span(self._count, start, stop)
+
+    def span_mean(self, start, stop) -> xr.DataArray:
+        """Mean over positions ``[start, stop)``, wrapping when ``start >= stop``."""
+        count = self.span_count(start, stop)
+        total = self._span(self._cumsum, start, stop)
+        return (total / count.where(count > 0)).astype(self.dtype)
+
+    def label_span(self, start_label, end_label) -> tuple[int, int]:
+        """Positions covering labels ``start_label`` through ``end_label`` inclusive.
+
+        Equivalent to ``sel({dim: slice(start_label, end_label)})`` on a sorted axis,
+        and to the two-slice concatenation across the end of the axis when
+        ``start_label > end_label``.
+        """
+        start = int(np.searchsorted(self.labels, start_label, side="left"))
+        stop = int(np.searchsorted(self.labels, end_label, side="right"))
+        return start, stop
+
+    def _trailing_positions(self, intervals, end):
+        if isinstance(end, xr.DataArray):
+            stop = end + 1
+            earliest = int(stop.min())
+        else:
+            stop = end % self.size + 1
+            earliest = stop
+        if earliest < max(intervals):
+            raise ValueError(
+                f"A {max(intervals)}-day window requires {max(intervals)} steps "
+                f"ending at the requested position, only {earliest} are available"
+            )
+        lengths = xr.DataArray(
+            list(intervals), dims="interval", coords={"interval": list(intervals)}
+        )
+        return stop - lengths, stop
+
+    def interval_totals(self, intervals, end=-1) -> tuple[xr.DataArray, xr.DataArray]:
+        """Double-precision trailing-window sums and valid-value counts for each interval."""
+        start, stop = self._trailing_positions(intervals, end)
+        return self._span(self._cumsum, start, stop), self.span_count(start, stop)
+
+    def interval_sums(self, intervals, end=-1) -> xr.DataArray:
+        """Trailing-window sums for each interval, stacked along ``interval``."""
+        start, stop = self._trailing_positions(intervals, end)
+        return self.span_sum(start, stop)
+
+    def interval_means(self, intervals, end=-1) -> xr.DataArray:
+        """Trailing-window means for each interval, stacked along ``interval``."""
+        start, stop = self._trailing_positions(intervals, end)
+        return self.span_mean(start, stop)
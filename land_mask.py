@@ -0,0 +1,68 @@
+"""Land mask of the baseline reference grid.
+
+ERA5-Land has no data over the ocean, so the baseline climatologies and
+distribution parameters are NaN there on every day of the year and every
+interval. A cell is land if any baseline variable has a value on the first day of
+the year for any interval. The mask is derived once and cached next to the
+baseline files, and rebuilt whenever one of them is newer than the cache.
+"""
+
+import logging
+import os
+from pathlib import Path
+
+import xarray as xr
+
+from file_helpers import NETCDF_ENGINE
+from grid_helpers import match_grid
+
+LAND_MASK_FILE = "era5_land_land_mask.nc"
+
+
+def _derive_land_mask(paths_and_variables: list[tuple[Path, str]]) -> xr.DataArray:
+    land = None
+    for path, varname in paths_and_variables:
+        with xr.open_dataset(path) as ds:
+            da = ds[varname].isel(dayofyear=0)
+            other_dims = [d for d in da.dims if d not in ("latitude", "longitude")]
+            valid = da.notnull().any(other_dims).load()
+        if land is None:
+            land = valid.drop_vars("dayofyear", errors="ignore")
+        else:
+            land = land | match_grid(valid, land["latitude"], land["longitude"])
+    land.name = "land"
+    land.attrs["description"] = (
+        "True where any baseline reference variable has data (ERA5-Land land cells)"
+    )
+    return land
+
+
+def load_land_mask(clim_dir: Path, baseline_files: dict) -> xr.DataArray:
+    """Boolean land mask on the grid of the baseline files.
+
+    Args:
+        clim_dir: directory holding the baseline reference data.
+        baseline_files: key -> (file name under `clim_dir`, variable), as
+            `index_engine.BASELINE_FILES`.
+    """
+    clim_dir = Path(clim_dir)
+    paths_and_variables = [
+        (clim_dir.joinpath(filename), varname)
+        for filename, varname in baseline_files.values()
+    ]
+    mask_path = clim_dir.joinpath(LAND_MASK_FILE)
+    newest = max(path.stat().st_mtime for path, _ in paths_and_variables)
+    if mask_path.exists() and mask_path.stat().st_mtime >= newest:
+        return xr.load_dataarray(mask_path, engine=NETCDF_ENGINE).astype(bool)
+
+    land = _derive_land_mask(paths_and_variables)
+    try:
+        # worker processes may derive the mask at the same time
+        tmp_path = mask_path.with_suffix(f".nc.{os.getpid()}.tmp")
+        land.astype("int8").to_netcdf(tmp_path, engine=NETCDF_ENGINE)
+        tmp_path.replace(mask_path)
+        logging.info(f"Wrote land mask to {mask_path}")
+    except OSError as exc:
+        # a read-only baseline directory only costs re-deriving the mask next time
+        logging.warning(f"Could not cache the land mask in {clim_dir}: {exc}")
+    return land
@@ -0,0 +1,131 @@
+"""NetCDF encodings for the drought index output files.
+
+Every index is rounded to 0.1 before it is written, so it can be stored as a
+16-bit integer count of tenths with a ``scale_factor`` of 0.1, and NaN as
+``_FillValue``. CF-aware readers (xarray, ncview, panoply, ...) unpack the values
+transparently, but not exactly: 0.1 has no exact binary representation, so -13
+unpacks to -1.3000000000000003 rather than the -1.3 the pipeline computed, and
+falls on the other side of a -1.3 category bound. `decode_tenths` rounds the
+unpacked values back to the float32 tenths the pipeline computed; every reader
+of the output files in this repository applies it. Combined with shuffle + zlib this makes the files a
+fraction of the size of the default float64 encoding, and faster to read.
+
+Available schemes, see `OUTPUT_ENCODINGS`:
+
+    float64      what xarray writes by default: uncompressed, contiguous
+    float32      uncompressed float32, chunked
+    float32_zlib float32, chunked, shuffle + zlib
+    int16_zlib   0.1-scaled int16 with _FillValue, chunked, shuffle + zlib (default)
+
+Chunks are spatial tiles (`OUTPUT_CHUNKS`) so that a whole map is a handful of
+reads and a regional subset only decompresses the tiles it overlaps.
+"""
+
+import logging
+import math
+
+import numpy as np
+import xarray as xr
+
+# scheme name -> (storage dtype, compressed, packed as 0.1-scaled integers)
+OUTPUT_ENCODINGS = {
+    "float64": (None, False, False),
+    "float32": ("float32", False, False),
+    "float32_zlib": ("float32", True, False),
+    "int16_zlib": ("int16", True, True),
+}
+DEFAULT_OUTPUT_ENCODING = "int16_zlib"
+
+# chunk length along each dimension; dimensions not listed get chunks of 1
+OUTPUT_CHUNKS = {
+    "reference_date": 32,
+    "latitude": 64,
+    "longitude": 128,
+}
+
+# float64, so that a reader without `decode_tenths` is off by ~1e-16 rather than ~1e-7
+PACKED_SCALE_FACTOR = np.float64(0.1)
+PACKED_FILL_VALUE = np.int16(np.iinfo(np.int16).min)
+ZLIB_LEVEL = 4
+
+
+def _chunksizes(da: xr.DataArray, chunks: dict) -> tuple[int, ...]:
+    """Chunk shape of about `chunks` cells per dimension that splits `da` evenly.
+
+    HDF5 allocates edge chunks in full, so e.g. 211 latitudes are split into four
+    chunks of 53 rather than three of 64 plus a mostly empty fourth.
+    """
+    shape = []
+    for dim, size in da.sizes.items():
+        n_chunks = math.ceil(size / chunks.get(dim, 1))
+        shape.append(max(1, math.ceil(size / n_chunks)))
+    return tuple(shape)
+
+
+def _fits_packed(da: xr.DataArray) -> bool:
+    """True if every value of `da` is NaN or representable as an int16 count of tenths."""
+    limit = np.iinfo(np.int16).max * float(PACKED_SCALE_FACTOR)
+    values = np.asarray(da.values)
+    return not (np.abs(values[~np.isnan(values)]) > limit).any()
+
+
+def variable_encoding(
+    da: xr.DataArray,
+    scheme: str = DEFAULT_OUTPUT_ENCODING,
+    chunks: dict | None = None,
+) -> dict:
+    """Encoding of one index variable for `Dataset.to_netcdf`."""
+    if scheme not in OUTPUT_ENCODINGS:
+        raise ValueError(
+            f"Unsupported output encoding {scheme!r}; expected one of "
+            f"{list(OUTPUT_ENCODINGS)}"
+        )
+    dtype, compressed, packed = OUTPUT_ENCODINGS[scheme]
+    if dtype is None:
+        return {}
+
+    encoding = {"dtype": dtype}
+    if da.ndim:
+        encoding["chunksizes"] = _chunksizes(da, chunks or OUTPUT_CHUNKS)
+    if compressed:
+        encoding.update(zlib=True, complevel=ZLIB_LEVEL, shuffle=True)
+
+    if packed:
+        # a ratio to a near-zero normal can exceed the int16 range; keep it exact
+        if not _fits_packed(da):
+            logging.warning(
+                f"{da.name} exceeds the packed int16 range, writing it as float32"
+            )
+            encoding["dtype"] = "float32"
+        else:
+            encoding.update(
+                scale_factor=PACKED_SCALE_FACTOR,
+                add_offset=np.float64(0),
+                _FillValue=PACKED_FILL_VALUE,
+            )
+    return encoding
+
+
+def output_encoding(
+    ds: xr.Dataset,
+    scheme: str = DEFAULT_OUTPUT_ENCODING,
+    chunks: dict | None = None,
+) -> dict:
+    """Encoding of every data variable of `ds` for `Dataset.to_netcdf`."""
+    return {name: variable_encoding(ds[name], scheme, chunks) for name in ds.data_vars}
+
+
+def decode_tenths(ds: xr.Dataset) -> xr.Dataset:
+    """`ds` with its packed variables rounded back to the float32 tenths that were written.
+
+    Packed variables are those read from integers with a ``scale_factor``; the
+    others are returned as they are. The values are then identical to those the
+    pipeline computed in memory, so they bin alike at category bounds.
+    """
+    packed = [
+        name
+        for name in ds.data_vars
+        if "scale_factor" in ds[name].encoding
+        and np.issubdtype(ds[name].encoding.get("dtype", np.float32), np.integer)
+    ]
+    return ds.assign({name: ds[name].astype("float32").round(1) for name in packed})
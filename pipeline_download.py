@@ -5,7 +5,9 @@ import shutil
 
 from config import RECENT_DATA_ROOT
 from download_helpers import (
+    CdsClient,
     analysis_date_not_in_january,
+    cds_client,
     download_recurring_era5_land_pipeline,
     get_all_previous_year_dates,
     get_current_month_dates,
@@ -13,6 +15,7 @@ from download_helpers import (
 )
 from era5_land_variable_registry import SUPPORTED_VARS
 from file_helpers import setup_logging
+from run_metrics import RunReport
 
 
 def wipe_pipeline_directory():
@@ -23,29 +26,40 @@ def wipe_pipeline_directory():
         pass
 
 
-def run_all_downloads(variable_key: str):
-    """Download all time chunks for one variable.
+def run_all_downloads(variable_key: str, report: RunReport, client: CdsClient):
+    """Download all time chunks for one variable, each as a stage of `report`.
 
     Args:
         variable_key (str): key in VARIABLE_REGISTRY (e.g. tp, swe, swvl1).
+        report (RunReport): run report recording the download of each chunk.
+        client (CdsClient): CDS API client, see `download_helpers.cds_client`.
     """
+    time_chunks = {
+        "current_month": get_current_month_dates,
+        "previous_year": get_all_previous_year_dates,
+    }
+    if analysis_date_not_in_january():
+        time_chunks["current_year"] = get_rest_of_current_year_dates
 
-    download_recurring_era5_land_pipeline(
-        variable_key, "current_month", *get_current_month_dates()
-    )
+    for time_chunk_tag, get_dates in time_chunks.items():
+        with report.stage(f"download {variable_key} {time_chunk_tag}"):
+            download_recurring_era5_land_pipeline(
+                variable_key, time_chunk_tag, *get_dates(), client=client
+            )
 
-    download_recurring_era5_land_pipeline(
-        variable_key, "previous_year", *get_all_previous_year_dates()
-    )
 
-    if analysis_date_not_in_january():
-        download_recurring_era5_land_pipeline(
-            variable_key, "current_year", *get_rest_of_current_year_dates()
-        )
+def download_all(client: CdsClient):
+    """Download every supported variable, recording the run in a run report.
+
+    Args:
+        client (CdsClient): CDS API client, see `download_helpers.cds_client`.
+    """
+    with RunReport("pipeline_download") as report:
+        for variable_key in SUPPORTED_VARS:
+            run_all_downloads(variable_key, report, client)
 
 
 if __name__ == "__main__":
     setup_logging()
-    for variable_key in SUPPORTED_VARS:
-        run_all_downloads(variable_key)
+    download_all(cds_client())
     logging.info("Pipeline download script completed.")
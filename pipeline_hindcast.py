@@ -0,0 +1,207 @@
+"""Compute the drought indices for every day of the 1981-2020 calibration record.
+
+The combined daily baseline files are streamed in blocks of one calendar year by a
+band of latitude rows. Each block is loaded with enough preceding days for the
+longest summary interval, run through the same IndexEngine as pipeline_run.py, and
+written as its own NetCDF file, so memory is bounded by the block size no matter
+how long the record is. Blocks are independent and run in a process pool.
+
+Output layout, under HINDCAST_DIR:
+
+    <YYYY>/drought_indices_hindcast_<YYYY>_rows_<first>_<last>.nc
+
+with dims reference_date x interval x latitude x longitude. Use `open_hindcast` to
+read the store back as a single lazily-loaded dataset.
+"""
+
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+import xarray as xr
+
+from config import (
+    CLIM_DIR,
+    HINDCAST_DIR,
+    INTERVALS,
+    SOIL_MOISTURE_WEIGHT_LAYER1,
+    SOIL_MOISTURE_WEIGHT_LAYER2,
+    daily_combined_file_for_var,
+)
+from file_helpers import NETCDF_ENGINE, setup_logging
+from index_engine import INDEX_NAMES, IndexEngine
+from output_encoding import decode_tenths, output_encoding
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--years",
+        type=int,
+        nargs="+",
+        default=None,
+        help="Calendar years to compute. Defaults to every year of the record.",
+    )
+    parser.add_argument(
+        "--block-rows",
+        type=int,
+        default=16,
+        help="Latitude rows per spatial block; bounds the memory of each worker.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("SLURM_CPUS_PER_TASK") or 1),
+        help="Number of worker processes.",
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="Recompute blocks whose output file already exists.",
+    )
+    return parser.parse_args()
+
+
+def open_daily_record() -> xr.Dataset:
+    """Lazily open the combined daily files as one cube of `tp`, `pev`, `sd` and `swvl`."""
+    tp = xr.open_dataset(daily_combined_file_for_var("tp"), engine=NETCDF_ENGINE)
+    pev = xr.open_dataset(daily_combined_file_for_var("pev"), engine=NETCDF_ENGINE)
+    swe = xr.open_dataset(daily_combined_file_for_var("swe"), engine=NETCDF_ENGINE)
+    swvl1 = xr.open_dataset(daily_combined_file_for_var("swvl1"), engine=NETCDF_ENGINE)
+    swvl2 = xr.open_dataset(daily_combined_file_for_var("swvl2"), engine=NETCDF_ENGINE)
+
+    swvl1_a, swvl2_a = xr.align(swvl1["swvl1"], swvl2["swvl2"], join="inner")
+    swvl = (
+        swvl1_a * SOIL_MOISTURE_WEIGHT_LAYER1 + swvl2_a * SOIL_MOISTURE_WEIGHT_LAYER2
+    ).astype("float32")
+    swvl.name = "swvl"
+
+    arrays = xr.align(tp["tp"], pev["pev"], swe["sd"], swvl, join="inner")
+    return xr.merge(
+        arrays,
+        join="exact",
+        compat="no_conflicts",
+        combine_attrs="drop_conflicts",
+    )
+
+
+def block_path(year: int, rows: slice) -> Path:
+    return HINDCAST_DIR.joinpath(
+        str(year),
+        f"drought_indices_hindcast_{year}_rows_{rows.start:04d}_{rows.stop - 1:04d}.nc",
+    )
+
+
+def compute_block(year: int, rows: slice, overwrite: bool = False) -> Path | None:
+    """Compute and write every index for every day of `year` over latitude rows `rows`.
+
+    Returns the written path, or None if the year has no computable reference date.
+    """
+    out_path = block_path(year, rows)
+    if out_path.exists() and not overwrite:
+        logging.info(f"Skipping existing block {out_path}")
+        return out_path
+
+    record = open_daily_record()
+    times = pd.DatetimeIndex(record["valid_time"].values)
+    lead_days = max(INTERVALS) - 1
+
+    # the first reference date of the record has a full longest interval behind it
+    first_date = max(pd.Timestamp(year=year, month=1, day=1), times[lead_days])
+    last_date = min(pd.Timestamp(year=year, month=12, day=31), times[-1])
+    if first_date > last_date:
+        record.close()
+        return None
+
+    window_start = times[times.get_loc(first_date) - lead_days]
+    cube = (
+        record.sel(valid_time=slice(window_start, last_date)).isel(latitude=rows).load()
+    )
+    record.close()
+
+    with IndexEngine(cube, clim_dir=CLIM_DIR) as engine:
+        indices = engine.compute_series(start=first_date, end=last_date)
+
+    indices = indices.drop_vars("time", errors="ignore")
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_suffix(".nc.tmp")
+    indices.to_netcdf(tmp_path, engine=NETCDF_ENGINE, encoding=output_encoding(indices))
+    tmp_path.replace(out_path)
+    logging.info(f"Wrote {out_path}")
+    return out_path
+
+
+def open_hindcast(years=None) -> xr.Dataset:
+    """Lazily open the hindcast store (optionally only some years) as one dataset."""
+    if years is None:
+        paths = sorted(HINDCAST_DIR.glob("*/drought_indices_hindcast_*.nc"))
+    else:
+        paths = sorted(
+            path
+            for year in years
+            for path in HINDCAST_DIR.joinpath(str(year)).glob(
+                "drought_indices_hindcast_*.nc"
+            )
+        )
+    if not paths:
+        raise FileNotFoundError(f"No hindcast files found under {HINDCAST_DIR}")
+    ds = xr.open_mfdataset(
+        paths,
+        combine="by_coords",
+        engine=NETCDF_ENGINE,
+        data_vars="minimal",
+        coords="minimal",
+        compat="override",
+    )[list(INDEX_NAMES)]
+    ds = decode_tenths(ds)
+    # per-file date range attributes are those of the first file only
+    dates = pd.DatetimeIndex(ds["reference_date"].values)
+    ds.attrs["first_reference_date"] = dates[0].strftime("%Y-%m-%d")
+    ds.attrs["last_reference_date"] = dates[-1].strftime("%Y-%m-%d")
+    return ds
+
+
+def main() -> int:
+    """Run the hindcast over all requested (year, latitude block) pairs."""
+    args = parse_args()
+    setup_logging()
+
+    with open_daily_record() as record:
+        times = pd.DatetimeIndex(record["valid_time"].values)
+        n_rows = record.sizes["latitude"]
+    years = args.years or sorted(set(times.year))
+    blocks = [
+        slice(row, min(row + args.block_rows, n_rows))
+        for row in range(0, n_rows, args.block_rows)
+    ]
+    tasks = [(year, rows) for year in years for rows in blocks]
+    logging.info(
+        f"Hindcasting {len(years)} years x {len(blocks)} latitude blocks "
+        f"with {args.workers} workers into {HINDCAST_DIR}"
+    )
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(compute_block, year, rows, args.overwrite): (year, rows)
+            for year, rows in tasks
+        }
+        for n_done, future in enumerate(as_completed(futures), start=1):
+            year, rows = futures[future]
+            # re-raise worker errors with the failing block in the traceback
+            future.result()
+            logging.info(
+                f"Completed {year} rows {rows.start}-{rows.stop - 1} "
+                f"({n_done}/{len(tasks)})"
+            )
+
+    logging.info("Hindcast completed.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
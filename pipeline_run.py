@@ -1,25 +1,152 @@
 """Compute the drought indices from the recent data and the other precomputed inputs."""
 
+import argparse
 import logging
+import os
+from dataclasses import asdict
+from pathlib import Path
 
-import numpy as np
 import pandas as pd
 import xarray as xr
-from xclim.indices.stats import dist_method
 
+from chunked_execution import spatial_chunks, time_block_days
 from config import (
-    CLIM_DIR,
     INDICES_DIR,
     INTERVALS,
+    RECENT_ARCHIVE_RETENTION_DAYS,
     RECENT_DATA_ROOT,
     SOIL_MOISTURE_WEIGHT_LAYER1,
     SOIL_MOISTURE_WEIGHT_LAYER2,
-    SPEI_DIST,
-    SPI_DIST,
-    WATER_BUDGET_OFFSET_M,
 )
+from data_viz.region_subset import REGIONS
 from era5_land_variable_registry import VARIABLE_REGISTRY
 from file_helpers import NETCDF_ENGINE, ds_combination, setup_logging
+from fused_kernels import numba_available
+from grid_helpers import bbox_region
+from index_engine import IndexEngine, write_interval_files, write_series_files
+from indices_cube import write_to_cube
+from output_encoding import DEFAULT_OUTPUT_ENCODING, OUTPUT_ENCODINGS
+from recent_archive import (
+    archive_day_path,
+    open_archive_days,
+    read_manifest,
+    recent_archive_dates,
+    update_recent_archive,
+)
+from run_metrics import RunReport
+from running_windows import RunningWindowState
+from spatial_tiles import compute_tiled
+from usdm_coverage import write_usdm_coverage
+from zonal_statistics import write_zonal_statistics
+
+# outputs of sub-domain runs, in one directory per region or box
+SUBDOMAINS_DIR = INDICES_DIR.joinpath("subdomains")
+# the recent archive keeps this many days before the longest interval of the last
+# reference date, and so bounds the reference dates of a daily series
+MAX_SERIES_DAYS = RECENT_ARCHIVE_RETENTION_DAYS - max(INTERVALS)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--series-days",
+        type=int,
+        default=None,
+        help=(
+            "Also compute every index for each of the trailing N reference dates "
+            "and write one drought_index_series_<n>day_*.nc file per interval. "
+            f"At most {MAX_SERIES_DAYS}, the days the recent archive keeps beyond "
+            "the longest interval (RECENT_ARCHIVE_MARGIN_DAYS)."
+        ),
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("SLURM_CPUS_PER_TASK") or 1),
+        help=(
+            "Number of indices computed concurrently, or of tile worker processes "
+            "with --tile-size."
+        ),
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help=(
+            "Recompute the summary interval windows from the full recent archive "
+            "instead of advancing the running window state of an earlier run."
+        ),
+    )
+    parser.add_argument(
+        "--output-encoding",
+        choices=list(OUTPUT_ENCODINGS),
+        default=DEFAULT_OUTPUT_ENCODING,
+        help="Storage encoding of the output files, see output_encoding.py.",
+    )
+    parser.add_argument(
+        "--fused",
+        action="store_true",
+        help=(
+            "Compute SPI and SPEI with the fused Numba kernels of fused_kernels.py; "
+            "needs the `fused` extra (uv sync --extra fused)."
+        ),
+    )
+    execution = parser.add_mutually_exclusive_group()
+    execution.add_argument(
+        "--memory-limit",
+        default=None,
+        help=(
+            "Compute out of core in spatial chunks sized to keep the index "
+            "computation within this much memory, e.g. 8GB; see chunked_execution.py."
+        ),
+    )
+    execution.add_argument(
+        "--tile-size",
+        type=int,
+        nargs=2,
+        metavar=("LATITUDES", "LONGITUDES"),
+        default=None,
+        help=(
+            "Split the grid into tiles of at most this many cells and compute them "
+            "in --workers processes; see spatial_tiles.py."
+        ),
+    )
+    subdomain = parser.add_mutually_exclusive_group()
+    subdomain.add_argument(
+        "--region",
+        choices=list(REGIONS),
+        default=None,
+        help=(
+            "Compute only the cells of this data_viz/region_subset.py region from "
+            f"the recent archive, writing to {SUBDOMAINS_DIR.name}/<region>."
+        ),
+    )
+    subdomain.add_argument(
+        "--bbox",
+        type=float,
+        nargs=4,
+        metavar=("LAT_MIN", "LAT_MAX", "LON_MIN", "LON_MAX"),
+        default=None,
+        help=(
+            "Compute only the cells centered in this box (longitudes -180 to 180) "
+            f"from the recent archive, writing to {SUBDOMAINS_DIR.name}/bbox_<...>."
+        ),
+    )
+    args = parser.parse_args()
+    if args.series_days is not None and not 1 <= args.series_days <= MAX_SERIES_DAYS:
+        parser.error(
+            f"--series-days must be between 1 and {MAX_SERIES_DAYS}, the days the "
+            "recent archive keeps beyond the longest interval; raise "
+            "RECENT_ARCHIVE_MARGIN_DAYS for longer series"
+        )
+    if args.tile_size and (args.region or args.bbox):
+        parser.error("--tile-size cannot be combined with --region or --bbox")
+    if args.fused and not numba_available():
+        parser.error(
+            "--fused needs Numba, which is not installed; install the `fused` "
+            "extra, e.g. `uv sync --extra fused`"
+        )
+    return args
 
 
 def combine_swvl():
@@ -129,408 +256,284 @@ def assemble_recent_downloads(variable_key):
     return recent_data_ds
 
 
-def subset_clim_interval(clim_ds: xr.Dataset, start_doy: float, end_doy: float):
-    if start_doy <= end_doy:
-        sub_ds = clim_ds.sel(time=slice(start_doy, end_doy))
-    else:
-        sub_ds = xr.concat(
-            [
-                clim_ds.sel(time=slice(start_doy, 366)),
-                clim_ds.sel(time=slice(1, end_doy)),
-            ],
-            dim="time",
-        )
-    return sub_ds
-
-
-def _standardized_index(
-    values: xr.DataArray,
-    params: xr.DataArray,
-    interval: int,
-    scipy_dist: str,
-    apply_zero_precipitation_correction: bool = False,
-):
-    """Compute a standardized index from pre-fit statistical distribution parameters."""
-    recent_doy = values.valid_time.dt.dayofyear[-1]
-    params = (
-        params.sel(dayofyear=[recent_doy], interval=interval)
-        .drop_vars("interval")
-        .load()
-    )
-    params.attrs["scipy_dist"] = scipy_dist
-
-    values_i = values.sel(
-        valid_time=slice(values.valid_time[-interval], values.valid_time[-1])
-    ).mean(dim="valid_time", keep_attrs=True)
-
-    if apply_zero_precipitation_correction:
-        # For SPI, where the input variable is precipitation.
-        # Many valid observations could be exactly 0
-        # And positive precipitation amounts are continuous and likely right-skewed
-        #
-        # A gamma distribution is only defined for positive values, so we should not
-        # pass exact-zero precipitation values into the gamma CDF. Instead, evaluate
-        # the fitted distribution only where the interval precipitation is > 0.
-        positive_values_only = values_i.where(values_i > 0)
-
-        probability_from_positive_distribution = dist_method(
-            "cdf",
-            params,
-            positive_values_only,
-        )
-
-        # Track where the original interval value was exactly zero.
-        #
-        # This is SPI-specific bookkeeping. A zero precipitation amount is a valid
-        # climate observation, not missing data, but it cannot be evaluated directly
-        # by a gamma distribution. We therefore treat zero values separately from
-        # positive values.
-        #
-        # Keep missing input values as NaN so that true missing data still propagates
-        # through the calculation.
-        observed_zero_precipitation = xr.where(
-            values_i.notnull(),
-            (values_i == 0).astype("float32"),
-            np.nan,
-        )
-
-        # Combine the zero-precipitation handling with the positive-value CDF.
-        #
-        # For positive precipitation values:
-        #   observed_zero_precipitation = 0
-        #   probability = probability_from_positive_distribution
-        #
-        # For zero precipitation values:
-        #   observed_zero_precipitation = 1
-        #   probability is handled by the zero-value branch
-        #
-        # This branch should NOT be used for SPEI, because SPEI is based on water
-        # balance rather than precipitation. Water balance can legitimately be
-        # negative, so applying `values_i > 0` would incorrectly mask valid dry
-        # conditions and create artificial no-data values.
-        probability = (
-            observed_zero_precipitation
-            + (1 - observed_zero_precipitation) * probability_from_positive_distribution
-        )
-    else:
-        # This branch is intended for non-zero-inflated standardized indices,
-        # especially SPEI.
-        #
-        # SPEI is based on climatic water balance, not precipitation:
-        #
-        #     water_balance = precipitation - PET
-        #
-        # In this pipeline, because `pev` is usually negative, that is computed as:
-        #
-        #     water_balance = tp + pev
-        #
-        # Unlike precipitation, water balance can legitimately be negative.
-        # Negative values are not missing data; they represent dry water-balance
-        # conditions where evaporative demand exceeds precipitation supply.
-        #
-        # Therefore, do NOT apply `values_i.where(values_i > 0)` here.
-        # That positive-value mask is appropriate for gamma-based SPI, but it
-        # would incorrectly remove valid negative SPEI inputs and create
-        # artificial terrestrial no-data values.
-        probability = dist_method(
-            "cdf",
-            params,
-            values_i,
-        )
-
-    # Convert cumulative probabilities to standardized normal scores.
-    #
-    # The final SPI/SPEI value is produced by applying the inverse CDF, or PPF,
-    # of the standard normal distribution to the fitted-distribution probability.
-    #
-    # However, norm.ppf(0) is -inf and norm.ppf(1) is +inf. Exact 0 or 1
-    # probabilities can occur because of numerical precision, extreme fitted
-    # tails, or values outside the effective range of the fitted distribution.
-    #
-    # Clipping keeps the standardized index finite while only affecting the most
-    # extreme tail values.
-    probability_floor = np.float32(1e-6)
-    probability_ceiling = np.float32(1.0 - probability_floor)
-
-    bounded_probability = probability.clip(
-        min=probability_floor,
-        max=probability_ceiling,
-    )
-
-    # Parameters for the standard normal distribution.
-    #
-    # The fitted drought-index distribution gives us a cumulative probability.
-    # We then map that probability onto a standard normal distribution with:
-    #
-    #     mean = 0
-    #     standard deviation = 1
-    #
-    # This is what turns the fitted probability into a unitless standardized
-    # drought index value.
-    standard_normal_parameters = xr.DataArray(
-        [0, 1],
-        dims=["dparams"],
-        coords=dict(dparams=(["loc", "scale"])),
-        attrs=dict(scipy_dist="norm"),
-    )
-
-    # Transform probability to a standardized index value.
-    #
-    # Negative values indicate drier-than-normal conditions.
-    # Positive values indicate wetter-than-normal conditions.
-    #
-    # For SPI, the input probability came from the precipitation distribution.
-    # For SPEI, the input probability came from the water-balance distribution.
-    standardized_index = dist_method(
-        "ppf",
-        standard_normal_parameters,
-        bounded_probability,
-    )
-
-    # The standardized index is unitless by construction.
-    standardized_index.attrs["units"] = ""
-    standardized_index.attrs["calibration_period"] = "1981-2020"
-
-    # The parameter-selection step preserves singleton coordinates such as
-    # `dayofyear`. Once the computation is complete, these are no longer useful
-    # output dimensions/coordinates for the final map, so remove/squeeze them.
-    standardized_index = standardized_index.drop_vars(
-        "dayofyear",
-        errors="ignore",
-    ).squeeze()
+def write_outputs(
+    indices: xr.Dataset,
+    write_files,
+    encoding: str,
+    report: RunReport,
+    out_dir: Path = INDICES_DIR,
+) -> None:
+    """Write the files of each interval of `indices` as a separate stage."""
+    for i in indices["interval"].values:
+        with report.stage(f"{write_files.__name__} {i}day") as details:
+            out_paths = write_files(indices.sel(interval=[i]), out_dir, encoding)
+            details["outputs"] = [path.name for path in out_paths]
 
-    return standardized_index
 
+def engine_series(engine: IndexEngine, first_date, report: RunReport):
+    """Yield the daily series from `first_date` of each interval in turn.
 
-def process_total_precip():
-    indices["tp"] = {}
+    One interval at a time bounds the size of the date x grid arrays.
+    """
     for i in INTERVALS:
-        indices["tp"][i] = (
-            ds["tp"]
-            .sel(
-                valid_time=slice(times[-(i)], times[-1])
-                # convert from m to cm to match climatology
-            )
-            .sum(dim="valid_time")
-            * 100
+        with report.stage(f"compute series {i}day") as details:
+            n_timings = len(engine.timings)
+            series = engine.compute_series(start=first_date, intervals=[i])
+            details["index_stages"] = [
+                asdict(timing) for timing in engine.timings[n_timings:]
+            ]
+        yield series
+
+
+def publish_outputs(
+    indices: xr.Dataset,
+    series,
+    args: argparse.Namespace,
+    report: RunReport,
+    out_dir: Path = INDICES_DIR,
+    full_grid: bool = True,
+) -> None:
+    """Write the series files and the full-grid products, each as a separate stage.
+
+    `series` holds (or yields, so that each is written as soon as it is computed)
+    the daily series datasets of one or more intervals. For the `full_grid`, the
+    series and then `indices` are added to the indices cube, and the zonal
+    statistics and USDM coverage of `indices` are written. Dates before the last
+    date of the cube are skipped with a warning rather than failing the run with
+    its outputs partly published.
+    """
+    for batch in series:
+        write_outputs(batch, write_series_files, args.output_encoding, report, out_dir)
+        if full_grid:
+            intervals = " ".join(f"{i}day" for i in batch["interval"].values)
+            with report.stage(f"write_to_cube series {intervals}"):
+                write_to_cube(batch, skip_earlier=True)
+    if not full_grid:
+        return
+
+    # after the series, whose earlier dates could not follow the reference date
+    with report.stage("write_to_cube"):
+        write_to_cube(indices, skip_earlier=True)
+    with report.stage("write_zonal_statistics") as details:
+        out_paths = write_zonal_statistics(indices, INDICES_DIR)
+        details["outputs"] = [path.name for path in out_paths]
+    with report.stage("write_usdm_coverage") as details:
+        details["outputs"] = [write_usdm_coverage(indices, INDICES_DIR).name]
+
+
+def subdomain_box(
+    args: argparse.Namespace,
+) -> tuple[str, tuple[float, float, float, float]] | None:
+    """Name and (lat_min, lat_max, lon_min, lon_max) of the requested sub-domain, if any."""
+    if args.region:
+        region = REGIONS[args.region]
+        return region.name, (
+            region.lat_min,
+            region.lat_max,
+            region.lon_min,
+            region.lon_max,
         )
-        indices["tp"][i] = np.round(indices["tp"][i], 1)
-        indices["tp"][i].attrs["units"] = "cm"
-
-
-def process_total_precip_pon():
-    indices["pntp"] = {}
-    with xr.open_dataset(
-        CLIM_DIR.joinpath("era5_land_tp_climo_1981_2020.nc")
-    ) as tp_clim_ds:
-        for i in INTERVALS:
-            start_doy = pd.Timestamp(times[-i]).dayofyear
-            end_doy = pd.Timestamp(times[-1]).dayofyear
-            clim_tp = subset_clim_interval(tp_clim_ds, start_doy, end_doy).sum(
-                dim="time"
-            )
-            indices["pntp"][i] = xr.where(
-                clim_tp["tp"] > 0,
-                np.round((indices["tp"][i] / clim_tp["tp"]), 1),
-                np.nan,
-            )
-            indices["pntp"][i].name = "pntp"
-            indices["pntp"][i].attrs["units"] = "percent"
+    if args.bbox:
+        return "bbox_" + "_".join(f"{value:g}" for value in args.bbox), tuple(args.bbox)
+    return None
 
 
-def process_swe():
+def archive_recent_downloads(
+    args: argparse.Namespace, report: RunReport
+) -> tuple[pd.Timestamp, tuple[int, int]]:
+    """Add the assembled recent downloads to the recent archive.
 
-    indices["swe"] = {}
+    Returns the reference date, the last day of the downloads, and the
+    (latitude, longitude) shape of the grid.
+    """
+    logging.info("Combnining recent soil moisture data")
+    with report.stage("combine_swvl"):
+        combine_swvl()
 
-    for i in INTERVALS:
-        indices["swe"][i] = (
-            ds["sd"]
-            .sel(valid_time=slice(times[-(i)], times[-1]))
-            .mean(dim="valid_time")
-            * 100
-        )  # convert from m to cm
-        indices["swe"][i].name = "swe"
-        indices["swe"][i].attrs["units"] = "cm"
-        indices["swe"][i] = np.round(indices["swe"][i], 1)
-
-
-def process_swe_pon():
-
-    indices["pnswe"] = {}
-    with xr.open_dataset(
-        CLIM_DIR.joinpath("era5_land_swe_climo_1981_2020.nc")
-    ) as swe_clim_ds:
-        swe_clim_ds = swe_clim_ds.assign_coords(
-            # just convert time dim to DOY days for consistency with tp
-            time=np.arange(swe_clim_ds.time.shape[0]) + 1,
+    logging.info("Assembling recent ERA5-Land data...")
+    datasets = []
+    for varname in ["swe", "swvl", "tp", "pev"]:
+        with report.stage(f"assemble_recent_downloads {varname}"):
+            datasets.append(assemble_recent_downloads(varname))
+
+    with report.stage("align and merge"):
+        datasets = xr.align(*datasets, join="inner")
+        ds = xr.merge(
+            datasets,
+            join="exact",
+            compat="no_conflicts",
+            combine_attrs="drop_conflicts",
         )
-
-        for i in INTERVALS:
-            start_doy = pd.Timestamp(times[-i]).dayofyear
-            end_doy = pd.Timestamp(times[-1]).dayofyear
-            clim_swe = subset_clim_interval(swe_clim_ds, start_doy, end_doy).mean(
-                dim="time"
-            )
-            # don't need to multiply by 100 because swe index is in cm,
-            # so conversion of clim swe to cm would cancel with conversion of result to percentage
-            # e.g. (swe_in_cm / (clim_swe_in_m * 100)) * 100 == swe_in_cm / clim_swe_in_m
-            indices["pnswe"][i] = xr.where(
-                clim_swe["sd"] > 0,
-                np.round(indices["swe"][i] / clim_swe["sd"], 1),
-                np.nan,
+    ref_date = pd.to_datetime(ds.valid_time[-1].values)
+    report.info["reference_date"] = ref_date.date().isoformat()
+    logging.info(f"End time for combined dataset is {ref_date}.")
+
+    logging.info("Updating the rolling archive of recent daily data...")
+    with report.stage("update_recent_archive"):
+        # in chunked mode the downloads are loaded in blocks of days within the limit
+        block_days = (
+            time_block_days(
+                ds.sizes["latitude"], ds.sizes["longitude"], args.memory_limit
             )
+            if args.memory_limit
+            else None
+        )
+        update_recent_archive(ds, block_days=block_days)
+    return ref_date, (ds.sizes["latitude"], ds.sizes["longitude"])
+
+
+def run_pipeline(args: argparse.Namespace, report: RunReport) -> None:
+    """Compute and write the drought indices, recording each stage in `report`.
+
+    With `--region` or `--bbox`, only the cells of that sub-domain are read from
+    the recent archive and the baseline files and computed. The downloads, the
+    archive, the running window state and the full-grid products (indices cube,
+    zonal statistics, USDM coverage) are left to the full runs.
+    """
+    subdomain = subdomain_box(args)
+    region = None
+    out_dir = INDICES_DIR
+    if subdomain is None:
+        ref_date, grid_shape = archive_recent_downloads(args, report)
+    else:
+        name, box = subdomain
+        ref_date = recent_archive_dates(1)[-1]
+        report.info["reference_date"] = ref_date.date().isoformat()
+        with xr.open_dataset(archive_day_path(ref_date), engine=NETCDF_ENGINE) as day:
+            region = bbox_region(day["latitude"].values, day["longitude"].values, *box)
+        grid_shape = tuple(s.stop - s.start for s in region.values())
+        report.info["subdomain"] = {
+            "name": name,
+            "bbox": list(box),
+            **{dim: [s.start, s.stop] for dim, s in region.items()},
+        }
+        out_dir = SUBDOMAINS_DIR.joinpath(name)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        logging.info(
+            f"Computing {grid_shape[0]} x {grid_shape[1]} cells of {name} for "
+            f"{ref_date.date()} from the recent archive, writing to {out_dir}"
+        )
+    manifest = read_manifest()
+
+    series_days = args.series_days or 1
+    window_state = None
+    if not (args.rebuild or args.series_days):
+        window_state = RunningWindowState.load_latest(ref_date)
+        if window_state and region:
+            window_state = window_state.subset(region)
+    chunks = None
+    days_to_read = (
+        window_state.advance_dates(ref_date, manifest) if window_state else None
+    )
 
-            # over the water, SWE will always be zero. This comes out as NaN in the results (the only NaNs)
-            indices["pnswe"][i].name = "pnswe"
-            indices["pnswe"][i].attrs["units"] = "percent"
-
-
-def process_spi():
-    indices["spi"] = {}
-    with xr.open_dataset(CLIM_DIR.joinpath(f"spi_{SPI_DIST}_parameters.nc")) as spi_ds:
-        for i in INTERVALS:
-            indices["spi"][i] = _standardized_index(
-                ds["tp"],
-                spi_ds["params"],
-                i,
-                scipy_dist=SPI_DIST,
-                apply_zero_precipitation_correction=True,
+    if days_to_read is not None:
+        # routine daily run: only the days entering and leaving each window are read
+        dates = days_to_read
+        logging.info(
+            f"Advancing running window state from "
+            f"{window_state.reference_date.date()} to {ref_date.date()} "
+            f"with {len(dates)} days from the recent archive."
+        )
+        with report.stage("advance running window state"):
+            ds = open_archive_days(dates, region=region)
+            window_state = window_state.advance(ds, ref_date, manifest)
+    else:
+        window_state = None
+        # the longest interval ending on the earliest reference date, plus one day
+        n_days = max(INTERVALS) + series_days
+        if args.memory_limit:
+            chunks = spatial_chunks(
+                n_days,
+                *grid_shape,
+                args.memory_limit,
+                args.workers,
             )
-            indices["spi"][i].name = "spi"
-            indices["spi"][i] = np.round(indices["spi"][i], 1)
-            indices["spi"][i].attrs["units"] = ""
-
-
-def process_spei():
-    indices["spei"] = {}
-    with xr.open_dataset(
-        CLIM_DIR.joinpath(f"spei_{SPEI_DIST}_parameters.nc")
-    ) as spei_ds:
-        wb = (ds["tp"] + ds["pev"]) + WATER_BUDGET_OFFSET_M
-
-        for i in INTERVALS:
-            indices["spei"][i] = _standardized_index(
-                wb,
-                spei_ds["params"],
-                i,
-                scipy_dist=SPEI_DIST,
-                apply_zero_precipitation_correction=False,
+            logging.info(f"Computing in spatial chunks of {chunks}")
+        dates = recent_archive_dates(n_days, end=ref_date)
+        if not args.tile_size:
+            # in tiled mode, each tile worker reads its own cells
+            with report.stage("open recent archive"):
+                ds = open_archive_days(dates, chunks=chunks, region=region)
+        logging.info(
+            f"Reading {n_days} days from {dates[0].date()} "
+            f"to {dates[-1].date()} from the recent archive."
+        )
+    report.info["window_state"] = "advanced" if window_state else "rebuilt"
+
+    if args.tile_size:
+        with report.stage("compute indices"):
+            indices, rebuilt_state = compute_tiled(
+                dates,
+                ref_date,
+                args.tile_size,
+                workers=args.workers,
+                manifest=manifest,
+                window_state=window_state,
+                fused=args.fused,
             )
-            indices["spei"][i].name = "spei"
-            indices["spei"][i] = np.round(indices["spei"][i], 1)
-            indices["spei"][i].attrs["units"] = ""
-
-
-def process_smd():
-
-    indices["smd"] = {}
-
-    with xr.open_dataset(
-        CLIM_DIR.joinpath("era5_land_swvl_climo_1981_2020.nc")
-    ) as swvl_clim_ds:
-        for i in INTERVALS:
-            swvl = (
-                ds["swvl"]
-                .sel(valid_time=slice(times[-(i)], times[-1]))
-                .mean(dim="valid_time")
+        write_outputs(indices, write_interval_files, args.output_encoding, report)
+        window_state = window_state or rebuilt_state
+        with report.stage("save running window state"):
+            logging.info(f"Saved running window state to {window_state.save()}")
+
+        series = []
+        if args.series_days:
+            first_date = dates[-series_days]
+            logging.info(f"Computing daily index series from {first_date}...")
+            # every interval in one pass, so each tile reads its cells of the
+            # archive once
+            with report.stage("compute series"):
+                series, _ = compute_tiled(
+                    dates,
+                    ref_date,
+                    args.tile_size,
+                    workers=args.workers,
+                    series_start=first_date,
+                    fused=args.fused,
+                )
+            series = [series]
+        publish_outputs(indices, series, args, report)
+    else:
+        with IndexEngine(
+            ds,
+            workers=args.workers,
+            window_state=window_state,
+            chunks=chunks,
+            fused=args.fused,
+        ) as engine:
+            with report.stage("compute indices") as details:
+                indices = engine.compute(ref_date)
+                details["index_stages"] = [asdict(timing) for timing in engine.timings]
+            logging.info(
+                "Combining individual drought indicators and summary intervals"
             )
-
-            start_doy = pd.Timestamp(times[-i]).dayofyear
-            end_doy = pd.Timestamp(times[-1]).dayofyear
-            clim_swvl = subset_clim_interval(swvl_clim_ds, start_doy, end_doy).mean(
-                dim="time"
+            # write a single file for each interval
+            write_outputs(
+                indices, write_interval_files, args.output_encoding, report, out_dir
             )
 
-            indices["smd"][i] = xr.where(
-                clim_swvl["swvl"] > 0,
-                np.round(((clim_swvl["swvl"] - swvl) / clim_swvl["swvl"]) * 100, 1),
-                np.nan,
-            )
-            indices["smd"][i].name = "smd"
-            indices["smd"][i].attrs["units"] = "percent"
+            # a sub-domain's state must not replace the full grid's
+            if region is None:
+                with report.stage("save running window state"):
+                    if window_state is None:
+                        window_state = RunningWindowState.from_engine(
+                            engine, ref_date, manifest
+                        )
+                    logging.info(f"Saved running window state to {window_state.save()}")
+
+            series = []
+            if args.series_days:
+                first_date = dates[-series_days]
+                logging.info(f"Computing daily index series from {first_date}...")
+                series = engine_series(engine, first_date, report)
+            publish_outputs(indices, series, args, report, out_dir, region is None)
 
 
 if __name__ == "__main__":
+    args = parse_args()
     setup_logging()
     logging.info("Processing drought indices...")
-
-    logging.info("Combnining recent soil moisture data")
-    combine_swvl()
-
-    logging.info("Assembling recent ERA5-Land data...")
-    datasets = [
-        assemble_recent_downloads(varname)
-        for varname in [
-            "swe",
-            "swvl",
-            "tp",
-            "pev",
-        ]
-    ]
-
-    datasets = xr.align(*datasets, join="inner")
-    ds = xr.merge(
-        datasets,
-        join="exact",
-        compat="no_conflicts",
-        combine_attrs="drop_conflicts",
-    )
-    end_time = ds.valid_time[-1]
-    logging.info(f"End time for combined dataset is {end_time}.")
-    ref_date = pd.to_datetime(end_time.values)
-    start_time = ds.valid_time[-366]
-
-    logging.info(f"Start time for combined dataset is {start_time}.")
-    ds.to_netcdf(
-        RECENT_DATA_ROOT.joinpath(
-            f"combined_daily_era5_land_drought_vars_{ref_date.strftime('%Y%m%d')}.nc",
-        ),
-        engine=NETCDF_ENGINE,
-    )
-
-    # below globals(!) are inherited by all the functions that compute indices:
-    #    the `ds` of the combined recent data, sliced to just include the previous year
-    #    `times` the times we want to look at
-    #    `indicies` an initialized results dict in which to store the data
-    ds = ds.sel(valid_time=slice(start_time, end_time))
-    times = ds.valid_time.values
-    indices = {}
-
-    logging.info("Processing drought index: total precipitation...")
-    process_total_precip()
-    logging.info("Processing drought index: total precipitation % of normal...")
-    process_total_precip_pon()
-    logging.info("Processing drought index: SWE...")
-    process_swe()
-    logging.info("Processing drought index: SWE % of normal...")
-    process_swe_pon()
-    logging.info("Processing drought index: SPI...")
-    process_spi()
-    logging.info("Processing drought index: SPEI...")
-    process_spei()
-    logging.info("Processing drought index: SMD...")
-    process_smd()
-    logging.info("Combining individual drought indicators and summary intervals")
-
-    # write a single file for each interval
-    for i in INTERVALS:
-        arrays = [
-            indices[varname][i].drop_vars("time", errors="ignore")
-            for varname in indices
-        ]
-
-        out_ds = xr.merge(
-            arrays,
-            join="exact",
-            compat="no_conflicts",
-            combine_attrs="drop_conflicts",
-        )
-
-        out_ds.attrs["reference_date"] = ref_date.strftime("%Y-%m-%d")
-        out_ds.to_netcdf(
-            INDICES_DIR.joinpath(
-                f"drought_indices_{i}day_{ref_date.strftime('%Y_%m_%d')}.nc"
-            )
-        )
-
+    with RunReport("pipeline_run") as report:
+        report.info["arguments"] = vars(args)
+        run_pipeline(args, report)
     logging.info("Pipeline completed.")
@@ -0,0 +1,368 @@
+"""Extract the drought indices at points, such as communities, from the output files.
+
+Each point is matched once to its nearest grid cell, by great-circle distance, and
+the match is cached in memory and on disk under a fingerprint of the grid, so later
+extractions for the same points skip the search. By default points are matched to
+the nearest land cell (where `smd` has data, as in the maps), so that coastal
+communities whose own cell is ocean still get values; points off the grid are not
+matched. Every indicator of every interval is then gathered for all points at once
+from the `drought_indices_<n>day_<YYYY>_<MM>_<DD>.nc` files of one reference date,
+into a table with one row per point and interval.
+
+Usage (prints the latest indices at the communities of the maps as CSV):
+    python point_extraction.py
+    python point_extraction.py --points towns.csv --date 2025-03-10 --format json --out towns.json
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+from scipy.spatial import cKDTree
+
+from config import INDICES_DIR, INTERVALS, REPO_ROOT
+from file_helpers import NETCDF_ENGINE, setup_logging
+from output_encoding import decode_tenths
+
+COMMUNITIES_JSON = REPO_ROOT.joinpath("data_viz", "communities_ak_filtered.json")
+POINT_CELLS_CACHE_DIR = INDICES_DIR.joinpath("point_cells")
+INDICES_FILE_PATTERN = re.compile(
+    r"drought_indices_(\d+)day_(\d{4})_(\d{2})_(\d{2})\.nc"
+)
+# variable whose valid cells are land, as in data_viz/plot_common.py
+LAND_VARIABLE = "smd"
+EARTH_RADIUS_KM = 6371.0
+
+# indices files whose gathered values are kept in memory, a week of reference dates
+MAX_GATHERED_FILES = 7 * len(INTERVALS)
+
+# (grid fingerprint, points fingerprint) -> cells, for repeated extractions in a process
+_POINT_CELLS: dict[tuple[str, str], "PointCells"] = {}
+# (file, modification time, points fingerprint, land only) -> grid, cells and values
+_GATHERED: dict[tuple, tuple] = {}
+
+
+@dataclass(frozen=True)
+class PointCells:
+    """Grid cell matched to each point; -1 positions mark unmatched points."""
+
+    latitude_index: np.ndarray
+    longitude_index: np.ndarray
+    distance_km: np.ndarray
+
+    @property
+    def matched(self) -> np.ndarray:
+        return self.latitude_index >= 0
+
+
+def load_points(path: Path = COMMUNITIES_JSON) -> pd.DataFrame:
+    """Points with `name`, `lat` and `lon` columns, from a JSON list of records or a CSV file."""
+    path = Path(path)
+    if path.suffix == ".json":
+        with path.open(encoding="utf-8") as handle:
+            points = pd.DataFrame.from_records(json.load(handle))
+    else:
+        points = pd.read_csv(path)
+    missing = {"name", "lat", "lon"} - set(points.columns)
+    if missing:
+        raise ValueError(f"Points in {path} lack the columns {sorted(missing)}")
+    return points
+
+
+def indices_files(
+    data_dir: Path = INDICES_DIR, reference_date=None
+) -> tuple[pd.Timestamp, dict[int, Path]]:
+    """Reference date and interval -> file of the indices of `reference_date`, by default the latest."""
+    by_date: dict[pd.Timestamp, dict[int, Path]] = {}
+    for path in Path(data_dir).glob("drought_indices_*day_*.nc"):
+        match = INDICES_FILE_PATTERN.fullmatch(path.name)
+        if match:
+            days, year, month, day = (int(group) for group in match.groups())
+            date = pd.Timestamp(year=year, month=month, day=day)
+            by_date.setdefault(date, {})[days] = path
+    if not by_date:
+        raise FileNotFoundError(f"No drought_indices_<n>day_*.nc files in {data_dir}")
+    date = max(by_date) if reference_date is None else pd.Timestamp(reference_date)
+    if date not in by_date:
+        raise FileNotFoundError(
+            f"No drought indices for {date.date()} in {data_dir}; "
+            f"available: {', '.join(str(d.date()) for d in sorted(by_date))}"
+        )
+    return date, dict(sorted(by_date[date].items()))
+
+
+def array_fingerprint(*arrays: np.ndarray) -> str:
+    """Short hash of the dtypes, shapes and values of `arrays`."""
+    digest = hashlib.sha256()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.dtype}{array.shape}".encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def grid_fingerprint(
+    latitude: np.ndarray, longitude: np.ndarray, land: np.ndarray | None = None
+) -> str:
+    """Short hash identifying a grid and, if given, its land mask."""
+    arrays = [np.asarray(latitude, "float64"), np.asarray(longitude, "float64")]
+    if land is not None:
+        arrays.append(np.packbits(np.asarray(land, bool)))
+    return array_fingerprint(*arrays)
+
+
+def _unit_vectors(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack(
+        [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1
+    )
+
+
+def nearest_cells(
+    points: pd.DataFrame,
+    latitude: np.ndarray,
+    longitude: np.ndarray,
+    land: np.ndarray | None = None,
+) -> PointCells:
+    """Nearest cell of a latitude/longitude grid to each point, by great-circle distance.
+
+    With a (latitude, longitude) `land` mask, only land cells are candidates. Points
+    more than half a cell outside the grid are not matched.
+    """
+    lat_grid, lon_grid = np.meshgrid(latitude, longitude, indexing="ij")
+    candidates = np.flatnonzero(land) if land is not None else np.arange(lat_grid.size)
+    if candidates.size == 0:
+        raise ValueError("The grid has no land cells to match points to")
+    tree = cKDTree(
+        _unit_vectors(lat_grid.ravel()[candidates], lon_grid.ravel()[candidates])
+    )
+    lat, lon = points["lat"].to_numpy(float), points["lon"].to_numpy(float)
+    chord, nearest = tree.query(_unit_vectors(lat, lon))
+    lat_index, lon_index = np.unravel_index(candidates[nearest], lat_grid.shape)
+
+    half_lat = np.abs(np.diff(latitude)).max(initial=0) / 2
+    half_lon = np.abs(np.diff(longitude)).max(initial=0) / 2
+    inside = (
+        (lat >= latitude.min() - half_lat)
+        & (lat <= latitude.max() + half_lat)
+        & (lon >= longitude.min() - half_lon)
+        & (lon <= longitude.max() + half_lon)
+    )
+    return PointCells(
+        latitude_index=np.where(inside, lat_index, -1),
+        longitude_index=np.where(inside, lon_index, -1),
+        distance_km=np.where(
+            inside, 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2, 1)), np.nan
+        ),
+    )
+
+
+def point_cells(
+    points: pd.DataFrame,
+    latitude: np.ndarray,
+    longitude: np.ndarray,
+    land: np.ndarray | None = None,
+    cache_dir: Path | None = POINT_CELLS_CACHE_DIR,
+) -> PointCells:
+    """`nearest_cells`, cached per grid and point coordinates in memory and in `cache_dir`."""
+    key = (
+        grid_fingerprint(latitude, longitude, land),
+        array_fingerprint(points[["lat", "lon"]].to_numpy(float)),
+    )
+    if key in _POINT_CELLS:
+        return _POINT_CELLS[key]
+
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = Path(cache_dir).joinpath(f"point_cells_{key[0]}_{key[1]}.npz")
+    if cache_path is not None and cache_path.exists():
+        with np.load(cache_path) as cached:
+            cells = PointCells(**{name: cached[name] for name in cached.files})
+    else:
+        cells = nearest_cells(points, latitude, longitude, land)
+        if cache_path is not None:
+            try:
+                cache_path.parent.mkdir(exist_ok=True, parents=True)
+                # concurrent extractions may write the same cache file
+                tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp.npz")
+                np.savez(tmp_path, **vars(cells))
+                tmp_path.replace(cache_path)
+            except OSError as exc:
+                logging.warning(
+                    f"Could not cache the point cells in {cache_dir}: {exc}"
+                )
+    _POINT_CELLS[key] = cells
+    return cells
+
+
+def _gather_file(
+    path: Path,
+    points: pd.DataFrame,
+    land_only: bool,
+    cache_dir: Path | None,
+) -> tuple[np.ndarray, np.ndarray, PointCells, pd.DataFrame]:
+    """Grid, matched cells and every indicator of one indices file at the points."""
+    with xr.open_dataset(path, engine=NETCDF_ENGINE) as ds:
+        latitude, longitude = ds["latitude"].values, ds["longitude"].values
+        land = None
+        if land_only and LAND_VARIABLE in ds:
+            land = ds[LAND_VARIABLE].notnull().values
+        cells = point_cells(points, latitude, longitude, land, cache_dir)
+        matched = cells.matched
+        # one vectorized gather of all points per file
+        gathered = ds.isel(
+            latitude=xr.DataArray(cells.latitude_index[matched], dims="point"),
+            longitude=xr.DataArray(cells.longitude_index[matched], dims="point"),
+        ).load()
+    gathered = decode_tenths(gathered)
+    columns = {}
+    for name, da in gathered.data_vars.items():
+        values = np.full(len(points), np.nan, dtype=np.result_type(da.dtype, "float32"))
+        values[matched] = da.values
+        columns[name] = values
+    return latitude, longitude, cells, pd.DataFrame(columns, index=points.index)
+
+
+def extract_points(
+    points: pd.DataFrame,
+    data_dir: Path = INDICES_DIR,
+    reference_date=None,
+    intervals=None,
+    land_only: bool = True,
+    cache_dir: Path | None = POINT_CELLS_CACHE_DIR,
+) -> pd.DataFrame:
+    """Every indicator of every interval at each point, one row per point and interval.
+
+    The values gathered from each file are kept in memory until the file changes,
+    so repeated extractions for the same points in one process read nothing.
+
+    Args:
+        points: table with `name`, `lat` and `lon` columns, e.g. from `load_points`;
+            all its columns are kept.
+        data_dir: directory of the `drought_indices_<n>day_*.nc` files.
+        reference_date: date of the indices; by default the latest in `data_dir`.
+        intervals: summary intervals to extract; by default all in `data_dir`.
+        land_only: match points to the nearest land cell rather than any cell.
+        cache_dir: directory caching the matched cells; None caches in memory only.
+    """
+    date, paths = indices_files(data_dir, reference_date)
+    missing = sorted(set(intervals or []) - set(paths))
+    if missing:
+        raise FileNotFoundError(
+            f"No drought indices for {date.date()} and intervals {missing} in {data_dir}"
+        )
+    paths = {i: path for i, path in paths.items() if not intervals or i in intervals}
+
+    points_key = array_fingerprint(points.to_numpy(str))
+    tables = []
+    grid = None
+    for interval, path in paths.items():
+        key = (str(path), path.stat().st_mtime_ns, points_key, land_only)
+        if key not in _GATHERED:
+            if len(_GATHERED) >= MAX_GATHERED_FILES:
+                # drop the least recently gathered file
+                del _GATHERED[next(iter(_GATHERED))]
+            _GATHERED[key] = _gather_file(path, points, land_only, cache_dir)
+        latitude, longitude, cells, table = _GATHERED[key]
+        if grid is None:
+            grid = latitude, longitude, cells
+        elif not (
+            np.array_equal(latitude, grid[0]) and np.array_equal(longitude, grid[1])
+        ):
+            raise ValueError(f"{path.name} is not on the grid of the other intervals")
+        tables.append(table.assign(interval=interval)[["interval", *table.columns]])
+
+    latitude, longitude, cells = grid
+    cell_columns = pd.DataFrame(
+        {
+            "reference_date": str(date.date()),
+            "cell_latitude": np.where(
+                cells.matched, latitude[cells.latitude_index], np.nan
+            ),
+            "cell_longitude": np.where(
+                cells.matched, longitude[cells.longitude_index], np.nan
+            ),
+            "distance_km": cells.distance_km.round(2),
+        },
+        index=points.index,
+    )
+    result = pd.concat(
+        [pd.concat([points, cell_columns, table], axis=1) for table in tables]
+    )
+    # one block of rows per point, in the order of the points and intervals
+    order = np.argsort(np.tile(np.arange(len(points)), len(tables)), kind="stable")
+    return result.iloc[order].reset_index(drop=True)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--points",
+        type=Path,
+        default=COMMUNITIES_JSON,
+        help="JSON list of records or CSV file of points with name, lat and lon.",
+    )
+    parser.add_argument(
+        "--date",
+        help="Reference date (YYYY-MM-DD) of the indices; defaults to the latest.",
+    )
+    parser.add_argument(
+        "--intervals",
+        type=int,
+        nargs="+",
+        choices=INTERVALS,
+        help="Summary intervals to extract; defaults to all.",
+    )
+    parser.add_argument(
+        "--all-cells",
+        action="store_true",
+        help="Match points to the nearest grid cell, even if it is ocean.",
+    )
+    parser.add_argument("--format", choices=["csv", "json"], default="csv")
+    parser.add_argument(
+        "--out", type=Path, help="Output file; defaults to standard output."
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    setup_logging()
+    args = parse_args()
+    started = time.perf_counter()
+    points = load_points(args.points)
+    table = extract_points(
+        points,
+        reference_date=args.date,
+        intervals=args.intervals,
+        land_only=not args.all_cells,
+    )
+    out = args.out or sys.stdout
+    if args.format == "csv":
+        table.to_csv(out, index=False)
+    else:
+        # float32 values have about 7 significant digits
+        table.to_json(
+            out, orient="records", indent=1, force_ascii=False, double_precision=7
+        )
+    unmatched = table.loc[table["cell_latitude"].isna(), "name"].unique()
+    if len(unmatched):
+        logging.warning(f"{len(unmatched)} points are off the grid: {list(unmatched)}")
+    logging.info(
+        f"Extracted {len(table)} rows for {len(points)} points in "
+        f"{time.perf_counter() - started:.3f} s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
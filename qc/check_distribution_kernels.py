@@ -0,0 +1,113 @@
+"""Check the native distribution kernels against xclim's generic scipy evaluation.
+
+For a sample of days of year, every summary interval and both standardized
+indices, draw values across each fitted distribution, then compute the
+standardized index twice:
+
+    reference: xclim dist_method("cdf") -> clip -> dist_method("ppf") for norm
+    native:    distribution_kernels.cdf  -> clip -> distribution_kernels.norm_ppf
+
+The check fails if any unrounded index differs by more than the tolerance.
+"""
+
+import argparse
+
+import numpy as np
+import xarray as xr
+from xclim.indices.stats import dist_method
+
+from config import CLIM_DIR, SPEI_DIST, SPI_DIST
+from distribution_kernels import cdf, norm_ppf
+
+PROBABILITY_FLOOR = 1e-6
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--doys",
+        type=int,
+        nargs="+",
+        default=[1, 60, 182, 366],
+        help="Days of year whose parameters are checked.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1e-3,
+        help="Maximum allowed absolute difference of the unrounded index.",
+    )
+    return parser.parse_args()
+
+
+def reference_index(params: xr.DataArray, values: xr.DataArray) -> xr.DataArray:
+    probability = dist_method("cdf", params, values)
+    probability = probability.clip(PROBABILITY_FLOOR, 1 - PROBABILITY_FLOOR)
+    standard_normal_parameters = xr.DataArray(
+        [0, 1],
+        dims=["dparams"],
+        coords=dict(dparams=(["loc", "scale"])),
+        attrs=dict(scipy_dist="norm"),
+    )
+    return dist_method("ppf", standard_normal_parameters, probability)
+
+
+def native_index(
+    params: xr.DataArray, values: xr.DataArray, scipy_dist: str
+) -> xr.DataArray:
+    probability = cdf(params, values, scipy_dist)
+    probability = probability.clip(PROBABILITY_FLOOR, 1 - PROBABILITY_FLOOR)
+    return norm_ppf(probability)
+
+
+def check_index(index: str, scipy_dist: str, doys: list[int], tolerance: float) -> bool:
+    path = CLIM_DIR.joinpath(f"{index}_{scipy_dist}_parameters.nc")
+    print(f"\n{index} ({scipy_dist}): {path}")
+    print("-" * (len(index) + len(scipy_dist) + 4))
+
+    rng = np.random.default_rng(0)
+    passed = True
+    with xr.open_dataset(path) as params_ds:
+        for doy in doys:
+            params = params_ds["params"].sel(dayofyear=doy).load()
+            params.attrs["scipy_dist"] = scipy_dist
+
+            # spread quantiles across the distribution, including both clipped tails
+            quantiles = xr.DataArray(
+                rng.uniform(1e-8, 1 - 1e-8, params.isel(dparams=0).shape),
+                dims=params.isel(dparams=0).dims,
+            )
+            values = dist_method("ppf", params, quantiles).astype("float32")
+
+            reference = reference_index(params, values)
+            native = native_index(params, values, scipy_dist)
+
+            nan_mismatch = int((reference.isnull() != native.isnull()).sum())
+            diff = abs(reference - native)
+            max_diff = float(diff.max(skipna=True))
+            rounded_diff = int(
+                (abs(np.round(reference, 1) - np.round(native, 1)) > 0.05).sum()
+            )
+            valid = int(reference.notnull().sum())
+
+            ok = nan_mismatch == 0 and max_diff <= tolerance
+            passed &= ok
+            print(
+                f"doy={doy:3d}  max |diff|={max_diff:.2e}  "
+                f"NaN mismatches={nan_mismatch}  "
+                f"differ after rounding={rounded_diff}/{valid}  "
+                f"{'ok' if ok else 'FAIL'}"
+            )
+    return passed
+
+
+def main() -> int:
+    args = parse_args()
+    passed = check_index("spi", SPI_DIST, args.doys, args.tolerance)
+    passed &= check_index("spei", SPEI_DIST, args.doys, args.tolerance)
+    print(f"\n{'PASS' if passed else 'FAIL'} (tolerance {args.tolerance})")
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,473 @@
+"""Local HTTP service answering drought index queries from data held in memory.
+
+The service loads the recent archive once into one `IndexEngine`, whose prefix
+sums give the summary windows of every reference date in the archive, and keeps
+the baseline files open, memory-mapped where their layout allows
+(`IndexEngine(mmap_baseline=True)`). A query then only costs the evaluation of
+the requested indices on a new reference date, and nothing on a repeated one:
+
+    computed indices   the indices of the last `--cached-dates` reference dates
+                       queried stay in the engine
+    responses          the last `--cache-size` encoded responses are kept, keyed
+                       by endpoint and normalized query
+
+Endpoints (GET, JSON responses, NaN as null):
+
+    /dates     reference dates that can be queried
+    /point     ?lat=60.79&lon=-161.76, values at the nearest land cell
+    /region    ?name=southeast_alaska (a data_viz/region_subset.py region) or
+               ?bbox=LAT_MIN,LAT_MAX,LON_MIN,LON_MAX, grids of the cells in it
+    /grid      grids of the full domain
+    /metrics   requests, cache hits and latency percentiles per endpoint
+
+/point, /region and /grid take `date` (YYYY-MM-DD, default the latest),
+`interval` (comma-separated days, default all) and `index` (comma-separated
+names, default all).
+
+Usage:
+    python query_service.py --port 8765
+    curl 'http://127.0.0.1:8765/point?lat=60.79&lon=-161.76&index=spi&interval=90'
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from config import CLIM_DIR, INTERVALS, RECENT_ARCHIVE_DIR
+from data_viz.region_subset import REGIONS
+from file_helpers import setup_logging
+from grid_helpers import bbox_region
+from index_engine import INDEX_NAMES, IndexEngine
+from point_extraction import point_cells
+from recent_archive import open_archive_days, recent_archive_dates
+
+DEFAULT_PORT = 8765
+CACHED_DATES = 8
+RESPONSE_CACHE_SIZE = 256
+# latencies of the last requests of each endpoint that the percentiles cover
+LATENCY_WINDOW = 1000
+# significant digits of the float32 indices, so that 0.1 is not 0.10000000149
+FLOAT32_DIGITS = 7
+# of the float64 grid coordinates, which carry noise of the ERA5-Land grid
+COORDINATE_DECIMALS = 6
+ENDPOINTS = ("dates", "point", "region", "grid", "metrics")
+
+
+class QueryError(ValueError):
+    """A query the service cannot answer, reported to the client as a 400."""
+
+
+def _json_values(array: np.ndarray):
+    """Values as nested lists at `FLOAT32_DIGITS` significant digits, NaN as None."""
+    values = np.asarray(array, dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        digits = FLOAT32_DIGITS - 1 - np.floor(np.log10(np.abs(values)))
+    scale = 10.0 ** np.where(np.isfinite(digits), digits, 0)
+    values = np.round(values * scale) / scale
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+def _json_coordinates(array: np.ndarray) -> list[float]:
+    return np.round(np.asarray(array, dtype="float64"), COORDINATE_DECIMALS).tolist()
+
+
+def _first(query: dict[str, list[str]], name: str) -> str | None:
+    values = query.get(name)
+    return values[-1] if values else None
+
+
+def _float(query: dict[str, list[str]], name: str) -> float:
+    value = _first(query, name)
+    if value is None:
+        raise QueryError(f"Missing query parameter {name}")
+    try:
+        return float(value)
+    except ValueError:
+        raise QueryError(f"{name} must be a number, got {value!r}") from None
+
+
+class QueryService:
+    """Drought indices of any reference date of the recent archive, held in memory.
+
+    Args:
+        n_days: trailing archived days to load; all of them by default.
+        archive_dir: recent archive directory.
+        clim_dir: directory holding the baseline reference data.
+        workers: number of indices computed concurrently.
+        cached_dates: reference dates whose computed indices are kept.
+        cache_size: encoded responses kept.
+    """
+
+    def __init__(
+        self,
+        n_days: int | None = None,
+        archive_dir: Path = RECENT_ARCHIVE_DIR,
+        clim_dir: Path = CLIM_DIR,
+        workers: int = 1,
+        cached_dates: int = CACHED_DATES,
+        cache_size: int = RESPONSE_CACHE_SIZE,
+    ):
+        started = time.perf_counter()
+        dates = recent_archive_dates(n_days, archive_dir=archive_dir)
+        if len(dates) < max(INTERVALS):
+            raise ValueError(
+                f"The {max(INTERVALS)}-day interval needs at least {max(INTERVALS)} "
+                f"archived days, only {len(dates)} were loaded"
+            )
+        self.engine = IndexEngine(
+            open_archive_days(dates, archive_dir),
+            clim_dir,
+            workers=workers,
+            mmap_baseline=True,
+        )
+        # the longest interval must end within the archive
+        self.reference_dates = dates[max(INTERVALS) - 1 :]
+        self.latitude = self.engine.latitude.values
+        self.longitude = self.engine.longitude.values
+        self.land = None
+        if self.engine.cells is not None:
+            self.land = np.zeros((len(self.latitude), len(self.longitude)), bool)
+            self.land[
+                self.engine.cells["latitude"].values,
+                self.engine.cells["longitude"].values,
+            ] = True
+        self.cached_dates = cached_dates
+        self.cache_size = cache_size
+        # reference dates in the engine's results, least recently queried first
+        self._dates: OrderedDict[pd.Timestamp, None] = OrderedDict()
+        self._responses: OrderedDict[tuple, bytes] = OrderedDict()
+        self._engine_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._metrics = {
+            name: {"requests": 0, "cache_hits": 0, "errors": 0}
+            for name in (*ENDPOINTS, "compute")
+        }
+        self._latencies = {name: deque(maxlen=LATENCY_WINDOW) for name in self._metrics}
+        self.load_s = time.perf_counter() - started
+        logging.info(
+            f"Loaded {len(dates)} archived days from {dates[0].date()} to "
+            f"{dates[-1].date()} in {self.load_s:.2f} s; reference dates "
+            f"{self.reference_dates[0].date()} to {self.reference_dates[-1].date()}"
+        )
+
+    def close(self) -> None:
+        self.engine.close()
+
+    def warm_up(self) -> None:
+        """Compute every index of the latest reference date, building the prefix sums."""
+        started = time.perf_counter()
+        self.indices(self.reference_dates[-1], list(INDEX_NAMES))
+        logging.info(f"Warmed up in {time.perf_counter() - started:.2f} s")
+
+    def reference_date(self, value: str | None) -> pd.Timestamp:
+        if value is None:
+            return self.reference_dates[-1]
+        try:
+            ref_date = pd.Timestamp(value)
+        except ValueError:
+            raise QueryError(f"date must be YYYY-MM-DD, got {value!r}") from None
+        if ref_date not in self.reference_dates:
+            raise QueryError(
+                f"No indices for {value}; reference dates are "
+                f"{self.reference_dates[0].date()} to {self.reference_dates[-1].date()}"
+            )
+        return ref_date
+
+    def indices(self, ref_date: pd.Timestamp, names: list[str]) -> xr.Dataset:
+        """Every interval of the named indices on `ref_date`, on the full grid.
+
+        All intervals are computed at once, so later queries of other intervals
+        reuse them; the results of the least recently queried dates beyond
+        `cached_dates` are dropped.
+        """
+        with self._engine_lock:
+            started = time.perf_counter()
+            indices = self.engine.compute(ref_date, INTERVALS, names)
+            # a long-lived engine would otherwise keep every timing
+            computed = bool(self.engine.timings)
+            self.engine.timings.clear()
+            self._dates[ref_date] = None
+            self._dates.move_to_end(ref_date)
+            while len(self._dates) > self.cached_dates:
+                dropped, _ = self._dates.popitem(last=False)
+                self.engine.results.pop(dropped, None)
+        if computed:
+            self.record("compute", time.perf_counter() - started)
+        return indices
+
+    def _selection(self, query: dict[str, list[str]]):
+        """Reference date, intervals and index names of a query."""
+        ref_date = self.reference_date(_first(query, "date"))
+        intervals = list(INTERVALS)
+        if _first(query, "interval"):
+            try:
+                intervals = [int(i) for i in _first(query, "interval").split(",")]
+            except ValueError:
+                raise QueryError("interval must be comma-separated days") from None
+            unknown = sorted(set(intervals) - set(INTERVALS))
+            if unknown:
+                raise QueryError(f"Unknown intervals {unknown}; expected {INTERVALS}")
+        names = list(INDEX_NAMES)
+        if _first(query, "index"):
+            names = _first(query, "index").split(",")
+            unknown = sorted(set(names) - set(INDEX_NAMES))
+            if unknown:
+                raise QueryError(
+                    f"Unknown indices {unknown}; expected {list(INDEX_NAMES)}"
+                )
+        return ref_date, intervals, names
+
+    def _region(self, query: dict[str, list[str]]) -> tuple[str, dict[str, slice]]:
+        name, bbox = _first(query, "name"), _first(query, "bbox")
+        if bool(name) == bool(bbox):
+            raise QueryError("Give one of the query parameters name and bbox")
+        if name:
+            if name not in REGIONS:
+                raise QueryError(f"Unknown region {name!r}; expected {list(REGIONS)}")
+            region = REGIONS[name]
+            box = (region.lat_min, region.lat_max, region.lon_min, region.lon_max)
+        else:
+            try:
+                box = tuple(float(value) for value in bbox.split(","))
+            except ValueError:
+                box = ()
+            if len(box) != 4:
+                raise QueryError("bbox must be LAT_MIN,LAT_MAX,LON_MIN,LON_MAX")
+            name = "bbox_" + "_".join(f"{value:g}" for value in box)
+        try:
+            return name, bbox_region(self.latitude, self.longitude, *box)
+        except ValueError as exc:
+            raise QueryError(str(exc)) from None
+
+    def _cache_key(self, endpoint: str, query: dict[str, list[str]]) -> tuple:
+        """Endpoint and query with defaults resolved, so equal queries share a key."""
+        if endpoint in ("dates", "metrics"):
+            return (endpoint,)
+        ref_date, intervals, names = self._selection(query)
+        key = (endpoint, ref_date, tuple(intervals), tuple(names))
+        if endpoint == "point":
+            return (*key, _float(query, "lat"), _float(query, "lon"))
+        if endpoint == "region":
+            name, region = self._region(query)
+            return (*key, name, *((s.start, s.stop) for s in region.values()))
+        return key
+
+    def _grids(self, indices: xr.Dataset, intervals, names) -> dict:
+        return {
+            name: {
+                str(i): _json_values(indices[name].sel(interval=i).values)
+                for i in intervals
+            }
+            for name in names
+        }
+
+    def answer(self, endpoint: str, query: dict[str, list[str]]) -> dict:
+        """JSON payload of a query of one of `ENDPOINTS`."""
+        if endpoint == "dates":
+            return {
+                "reference_dates": [
+                    date.strftime("%Y-%m-%d") for date in self.reference_dates
+                ]
+            }
+        if endpoint == "metrics":
+            return self.metrics()
+        ref_date, intervals, names = self._selection(query)
+        payload = {"reference_date": ref_date.strftime("%Y-%m-%d")}
+        if endpoint == "point":
+            point = pd.DataFrame(
+                {"lat": [_float(query, "lat")], "lon": [_float(query, "lon")]}
+            )
+            cells = point_cells(
+                point, self.latitude, self.longitude, self.land, cache_dir=None
+            )
+            if not cells.matched[0]:
+                raise QueryError("The point is more than half a cell off the grid")
+            lat_index = int(cells.latitude_index[0])
+            lon_index = int(cells.longitude_index[0])
+            values = self.indices(ref_date, names).isel(
+                latitude=lat_index, longitude=lon_index
+            )
+            payload.update(
+                lat=float(point["lat"][0]),
+                lon=float(point["lon"][0]),
+                cell={
+                    "latitude": round(
+                        float(self.latitude[lat_index]), COORDINATE_DECIMALS
+                    ),
+                    "longitude": round(
+                        float(self.longitude[lon_index]), COORDINATE_DECIMALS
+                    ),
+                    "distance_km": round(float(cells.distance_km[0]), 3),
+                },
+                indices={
+                    name: dict(
+                        zip(
+                            map(str, intervals),
+                            _json_values(values[name].sel(interval=intervals).values),
+                        )
+                    )
+                    for name in names
+                },
+            )
+            return payload
+
+        region = {}
+        if endpoint == "region":
+            payload["region"], region = self._region(query)
+        indices = self.indices(ref_date, names).isel(region)
+        payload.update(
+            latitude=_json_coordinates(indices["latitude"].values),
+            longitude=_json_coordinates(indices["longitude"].values),
+            indices=self._grids(indices, intervals, names),
+        )
+        return payload
+
+    def respond(self, endpoint: str, query: dict[str, list[str]]) -> bytes:
+        """Encoded answer to a query, from the response cache when possible."""
+        key = self._cache_key(endpoint, query)
+        cacheable = endpoint != "metrics"
+        with self._cache_lock:
+            body = self._responses.get(key) if cacheable else None
+            if body is not None:
+                self._responses.move_to_end(key)
+                self._metrics[endpoint]["cache_hits"] += 1
+                return body
+        body = json.dumps(self.answer(endpoint, query), allow_nan=False).encode()
+        if cacheable:
+            with self._cache_lock:
+                self._responses[key] = body
+                while len(self._responses) > self.cache_size:
+                    self._responses.popitem(last=False)
+        return body
+
+    def record(self, name: str, seconds: float, error: bool = False) -> None:
+        with self._cache_lock:
+            self._metrics[name]["requests"] += 1
+            self._metrics[name]["errors"] += error
+            self._latencies[name].append(seconds)
+
+    def metrics(self) -> dict:
+        """Counts and latency percentiles (ms) of each endpoint and of the computations."""
+        with self._cache_lock:
+            endpoints = {}
+            for name, counts in self._metrics.items():
+                latencies = np.array(self._latencies[name]) * 1000
+                endpoints[name] = dict(counts)
+                if latencies.size:
+                    endpoints[name].update(
+                        p50_ms=round(float(np.percentile(latencies, 50)), 3),
+                        p95_ms=round(float(np.percentile(latencies, 95)), 3),
+                        max_ms=round(float(latencies.max()), 3),
+                    )
+            cached_responses = len(self._responses)
+        return {
+            "load_s": round(self.load_s, 3),
+            "cached_dates": [date.strftime("%Y-%m-%d") for date in self._dates],
+            "cached_responses": cached_responses,
+            "endpoints": endpoints,
+        }
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """Routes GET requests to the `QueryService` of the server."""
+
+    def do_GET(self):
+        started = time.perf_counter()
+        url = urlsplit(self.path)
+        endpoint = url.path.strip("/")
+        service: QueryService = self.server.service
+        status = 200
+        try:
+            if endpoint not in ENDPOINTS:
+                status = 404
+                body = json.dumps({"error": f"Unknown endpoint /{endpoint}"}).encode()
+            else:
+                body = service.respond(endpoint, parse_qs(url.query))
+        except QueryError as exc:
+            status = 400
+            body = json.dumps({"error": str(exc)}).encode()
+        except Exception as exc:
+            logging.exception(f"Failed to answer {self.path}")
+            status = 500
+            body = json.dumps({"error": f"{type(exc).__name__}: {exc}"}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        seconds = time.perf_counter() - started
+        if endpoint in ENDPOINTS:
+            service.record(endpoint, seconds, error=status != 200)
+        logging.info(f"GET {self.path} {status} in {seconds * 1000:.1f} ms")
+
+    def log_message(self, format, *args):
+        # requests are logged with their latency by do_GET
+        pass
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--days",
+        type=int,
+        default=None,
+        help=(
+            "Trailing archived days to load, at least the longest interval; "
+            "defaults to the whole recent archive."
+        ),
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Indices computed concurrently."
+    )
+    parser.add_argument(
+        "--cached-dates",
+        type=int,
+        default=CACHED_DATES,
+        help="Reference dates whose computed indices are kept in memory.",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=RESPONSE_CACHE_SIZE,
+        help="Number of encoded responses kept in memory.",
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    setup_logging()
+    args = parse_args()
+    service = QueryService(
+        args.days,
+        workers=args.workers,
+        cached_dates=args.cached_dates,
+        cache_size=args.cache_size,
+    )
+    service.warm_up()
+    server = ThreadingHTTPServer((args.host, args.port), QueryHandler)
+    server.service = service
+    logging.info(f"Serving drought index queries on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
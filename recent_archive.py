@@ -0,0 +1,292 @@
+"""Append-only rolling archive of the recent daily ERA5-Land drought variables.
+
+The archive holds one small NetCDF file per day with the aligned `tp`, `pev`, `sd`
+and `swvl` fields, plus a JSON manifest of a content digest for every day. Each
+pipeline run passes the freshly assembled downloads to `update_recent_archive`,
+which only writes the days that are new or whose values were revised upstream,
+and deletes days older than the retention window. `open_recent_archive` then
+reads the trailing days needed for the index computation.
+
+Layout, under RECENT_ARCHIVE_DIR:
+
+    era5_land_drought_vars_<YYYY>_<MM>_<DD>.nc
+    manifest.json      {"grid": <digest>, "days": {"<YYYY-MM-DD>": <digest>, ...}}
+"""
+
+import hashlib
+import json
+import logging
+from functools import partial
+from pathlib import Path
+
+import dask.array
+import h5py
+import numpy as np
+import pandas as pd
+import xarray as xr
+from dask.array.core import normalize_chunks
+
+from config import RECENT_ARCHIVE_DIR, RECENT_ARCHIVE_RETENTION_DAYS
+from file_helpers import NETCDF_ENGINE
+
+ARCHIVE_VARIABLES = ("tp", "pev", "sd", "swvl")
+MANIFEST_NAME = "manifest.json"
+
+
+def archive_day_path(date, archive_dir: Path = RECENT_ARCHIVE_DIR) -> Path:
+    return Path(archive_dir).joinpath(
+        f"era5_land_drought_vars_{pd.Timestamp(date).strftime('%Y_%m_%d')}.nc"
+    )
+
+
+def _digest(*arrays) -> str:
+    hasher = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        hasher.update(np.ascontiguousarray(array).tobytes())
+    return hasher.hexdigest()
+
+
+def _grid_digest(ds: xr.Dataset) -> str:
+    return _digest(ds["latitude"].values, ds["longitude"].values)
+
+
+def read_manifest(archive_dir: Path = RECENT_ARCHIVE_DIR) -> dict:
+    path = Path(archive_dir).joinpath(MANIFEST_NAME)
+    if not path.exists():
+        return {"grid": None, "days": {}}
+    return json.loads(path.read_text())
+
+
+def _write_manifest(manifest: dict, archive_dir: Path) -> None:
+    path = Path(archive_dir).joinpath(MANIFEST_NAME)
+    tmp_path = path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+    tmp_path.replace(path)
+
+
+def _remove_day(key: str, manifest: dict, archive_dir: Path) -> None:
+    archive_day_path(key, archive_dir).unlink(missing_ok=True)
+    manifest["days"].pop(key, None)
+
+
+def _without_attrs(ds: xr.Dataset) -> xr.Dataset:
+    """`ds` without its dataset and data variable attributes.
+
+    The GRIB and NetCDF metadata of the downloads describe the raw variables, not
+    the indices computed from them, and the engine needs none of it. The
+    coordinates keep their attributes.
+    """
+    ds = ds.drop_attrs(deep=False)
+    return ds.assign({name: ds[name].drop_attrs(deep=False) for name in ds.data_vars})
+
+
+def update_recent_archive(
+    ds: xr.Dataset,
+    archive_dir: Path = RECENT_ARCHIVE_DIR,
+    retention_days: int = RECENT_ARCHIVE_RETENTION_DAYS,
+    block_days: int | None = None,
+) -> dict[str, int]:
+    """Write the new and revised days of `ds` to the archive and prune old days.
+
+    Args:
+        ds: aligned daily `tp`, `pev`, `sd` and `swvl` along `valid_time`. It may
+            be lazily opened.
+        archive_dir: archive directory.
+        retention_days: number of days kept, counted back from the last archived day.
+        block_days: number of days of `ds` loaded at once (default: all of them),
+            e.g. from `chunked_execution.time_block_days`.
+
+    Returns:
+        Number of days added, revised, unchanged and removed.
+    """
+    archive_dir = Path(archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest(archive_dir)
+    counts = {"added": 0, "revised": 0, "unchanged": 0, "removed": 0}
+
+    grid = _grid_digest(ds)
+    if manifest["grid"] not in (None, grid):
+        # days on different grids cannot be concatenated; start over
+        logging.warning(f"Grid of the recent data changed, clearing {archive_dir}")
+        for key in list(manifest["days"]):
+            _remove_day(key, manifest, archive_dir)
+            counts["removed"] += 1
+    manifest["grid"] = grid
+
+    ds = _without_attrs(ds[list(ARCHIVE_VARIABLES)].drop_vars("time", errors="ignore"))
+    dates = pd.DatetimeIndex(ds["valid_time"].values)
+    last_date = max([dates[-1], *(pd.Timestamp(key) for key in manifest["days"])])
+    cutoff = last_date - pd.Timedelta(days=retention_days - 1)
+
+    first = int(dates.searchsorted(cutoff))
+    block_days = block_days or len(dates)
+    for start in range(first, len(dates), block_days):
+        block = ds.isel(valid_time=slice(start, start + block_days)).load()
+        for position, date in enumerate(dates[start : start + block_days]):
+            _archive_day(block, position, date, manifest, archive_dir, counts)
+
+    for key in [key for key in manifest["days"] if pd.Timestamp(key) < cutoff]:
+        _remove_day(key, manifest, archive_dir)
+        counts["removed"] += 1
+
+    _write_manifest(manifest, archive_dir)
+    logging.info(
+        f"Updated recent archive {archive_dir}: "
+        + ", ".join(f"{count} {kind}" for kind, count in counts.items())
+    )
+    return counts
+
+
+def _archive_day(
+    block: xr.Dataset,
+    position: int,
+    date: pd.Timestamp,
+    manifest: dict,
+    archive_dir: Path,
+    counts: dict[str, int],
+) -> None:
+    """Write day `position` of the loaded `block` unless it is archived unchanged."""
+    key = date.strftime("%Y-%m-%d")
+    day = block.isel(valid_time=slice(position, position + 1))
+    digest = _digest(*(day[name].values for name in ARCHIVE_VARIABLES))
+    path = archive_day_path(date, archive_dir)
+    if manifest["days"].get(key) == digest and path.exists():
+        counts["unchanged"] += 1
+        return
+
+    counts["revised" if key in manifest["days"] else "added"] += 1
+    tmp_path = path.with_suffix(".nc.tmp")
+    day.to_netcdf(
+        tmp_path,
+        engine=NETCDF_ENGINE,
+        encoding={
+            name: {"dtype": "float32", "zlib": True, "complevel": 1}
+            for name in ARCHIVE_VARIABLES
+        },
+    )
+    tmp_path.replace(path)
+    manifest["days"][key] = digest
+
+
+def open_recent_archive(
+    n_days: int | None = None,
+    end=None,
+    archive_dir: Path = RECENT_ARCHIVE_DIR,
+    chunks: dict[str, int] | None = None,
+) -> xr.Dataset:
+    """Load the trailing `n_days` archived days ending on `end` (default: the last day).
+
+    With latitude/longitude `chunks` the days are opened lazily, see
+    `open_archive_days`. Raises ``ValueError`` if the archive does not hold every
+    one of those days.
+    """
+    dates = recent_archive_dates(n_days, end, archive_dir)
+    return open_archive_days(dates, archive_dir, chunks)
+
+
+def recent_archive_dates(
+    n_days: int | None = None,
+    end=None,
+    archive_dir: Path = RECENT_ARCHIVE_DIR,
+) -> pd.DatetimeIndex:
+    """The trailing `n_days` days ending on `end` (default: the last archived day).
+
+    Raises ``ValueError`` if the archive does not hold every one of those days.
+    """
+    manifest = read_manifest(archive_dir)
+    if not manifest["days"]:
+        raise FileNotFoundError(f"The recent archive {archive_dir} is empty")
+    archived = pd.DatetimeIndex(sorted(manifest["days"]))
+    end = archived[-1] if end is None else pd.Timestamp(end)
+    if n_days is None:
+        n_days = len(archived[archived <= end])
+    dates = pd.date_range(end=end, periods=n_days, freq="D")
+
+    missing = dates.difference(archived)
+    if not missing.empty:
+        raise ValueError(
+            f"The recent archive is missing {len(missing)} of the {n_days} days "
+            f"ending {end.date()}, e.g. {missing[0].date()}; "
+            f"it holds {archived[0].date()} to {archived[-1].date()}"
+        )
+
+    return dates
+
+
+def _read_days(paths, name, dtype, origin, block_info=None) -> np.ndarray:
+    """Read one spatial block of variable `name` for every day file in `paths`.
+
+    `origin` is the (latitude, longitude) position of the opened region in the files.
+    """
+    _, (lat0, lat1), (lon0, lon1) = block_info[None]["array-location"]
+    lat0, lat1 = lat0 + origin[0], lat1 + origin[0]
+    lon0, lon1 = lon0 + origin[1], lon1 + origin[1]
+    block = np.empty((len(paths), lat1 - lat0, lon1 - lon0), dtype=dtype)
+    for position, path in enumerate(paths):
+        with h5py.File(path, "r") as day_file:
+            day_file[name].read_direct(
+                block,
+                source_sel=np.s_[0:1, lat0:lat1, lon0:lon1],
+                dest_sel=np.s_[position : position + 1],
+            )
+    return block
+
+
+def open_archive_days(
+    dates,
+    archive_dir: Path = RECENT_ARCHIVE_DIR,
+    chunks: dict[str, int] | None = None,
+    region: dict[str, slice] | None = None,
+) -> xr.Dataset:
+    """Load the given archived days, in date order, along `valid_time`.
+
+    All day files share one layout, so the coordinates are taken from one of them
+    and the fields of every day are read straight into preallocated arrays with
+    h5py, which is much faster than combining hundreds of separately opened
+    datasets. With latitude/longitude `chunks`, the fields are
+    instead returned as lazy dask arrays spanning every day, read block by block.
+    `region` restricts the read to positional `latitude`/`longitude` slices.
+    """
+    dates = pd.DatetimeIndex(dates).unique().sort_values()
+    paths = [archive_day_path(date, archive_dir) for date in dates]
+    # days archived before the attributes were dropped on writing may still hold them
+    template = _without_attrs(xr.load_dataset(paths[-1], engine=NETCDF_ENGINE))
+    for name in ARCHIVE_VARIABLES:
+        if template[name].dims != ("valid_time", "latitude", "longitude"):
+            raise ValueError(f"Unexpected dimensions {template[name].dims} of {name}")
+    region = {
+        dim: (region or {}).get(dim, slice(None)) for dim in ("latitude", "longitude")
+    }
+    lat = slice(*region["latitude"].indices(template.sizes["latitude"])[:2])
+    lon = slice(*region["longitude"].indices(template.sizes["longitude"])[:2])
+    ds = template.isel(latitude=lat, longitude=lon).reindex(valid_time=dates)
+
+    if chunks:
+        block_chunks = normalize_chunks(
+            (len(dates), chunks["latitude"], chunks["longitude"]),
+            shape=ds["tp"].shape,
+        )
+        for name in ARCHIVE_VARIABLES:
+            dtype = ds[name].dtype
+            ds[name] = (
+                ds[name].dims,
+                dask.array.map_blocks(
+                    partial(_read_days, paths, name, dtype, (lat.start, lon.start)),
+                    chunks=block_chunks,
+                    dtype=dtype,
+                    meta=np.array((), dtype=dtype),
+                ),
+                ds[name].attrs,
+            )
+        return ds
+
+    arrays = {name: ds[name].values for name in ARCHIVE_VARIABLES}
+    for position, path in enumerate(paths):
+        with h5py.File(path, "r") as day_file:
+            for name, array in arrays.items():
+                day_file[name].read_direct(
+                    array,
+                    source_sel=np.s_[0:1, lat, lon],
+                    dest_sel=np.s_[position : position + 1],
+                )
+    return ds
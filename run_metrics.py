@@ -0,0 +1,144 @@
+"""Per-stage runtime metrics of a pipeline run, written as a JSON run report.
+
+Every stage records its wall-clock time, the CPU time of the process (including
+worker threads, and worker processes that finished during the stage), the peak
+resident memory of the process while it ran, and the bytes the process read and
+wrote. Bytes are counted at the system call level (`rchar`/`wchar` of
+/proc/self/io), so they include reads served from the page cache and network
+transfers. Peak memory is per stage where Linux allows resetting it; otherwise it
+is the peak since the process started. Metrics that are unavailable on the
+platform are reported as null.
+"""
+
+import json
+import logging
+import os
+import resource
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from config import INDICES_DIR
+
+
+def _io_counters() -> tuple[int, int] | None:
+    """Bytes read and written by this process so far, or None without /proc."""
+    try:
+        counters = dict(
+            line.split(": ") for line in Path("/proc/self/io").read_text().splitlines()
+        )
+        return int(counters["rchar"]), int(counters["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the peak resident set size of this process, where Linux allows it."""
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # without /proc, the peak since the process started, in kB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _cpu_seconds() -> float:
+    """CPU time of this process and of its terminated child processes."""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class RunReport:
+    """Named stages of one run of a pipeline script and their runtime metrics.
+
+    Stages are timed with `stage`, one after the other; stages must not be nested,
+    since each one resets the peak memory of the process. Used as a context
+    manager, the report is written to `out_dir` when the run ends, whether or not
+    it failed.
+    """
+
+    def __init__(self, script: str, out_dir: Path = INDICES_DIR):
+        self.script = script
+        self.out_dir = Path(out_dir)
+        self.status = "running"
+        self.info: dict = {}
+        self.stages: list[dict] = []
+        self.started_at = datetime.now()
+        self._started = time.perf_counter()
+
+    def __enter__(self) -> "RunReport":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.status = "failed" if exc_type else "completed"
+        self.write()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Record the metrics of the enclosed block as stage `name`.
+
+        Yields a dict whose items are added to the stage's entry in the report.
+        """
+        details: dict = {}
+        peak_is_per_stage = _reset_peak_rss()
+        io_before = _io_counters()
+        wall = time.perf_counter()
+        cpu = _cpu_seconds()
+        status = "failed"
+        try:
+            yield details
+            status = "completed"
+        finally:
+            wall_s = time.perf_counter() - wall
+            io_after = _io_counters()
+            metrics = {
+                "stage": name,
+                "status": status,
+                "started_s": wall - self._started,
+                "wall_s": wall_s,
+                "cpu_s": _cpu_seconds() - cpu,
+                "peak_rss_mb": _peak_rss_mb(),
+                "peak_rss_is_per_stage": peak_is_per_stage,
+                "bytes_read": None,
+                "bytes_written": None,
+            }
+            if io_before and io_after:
+                metrics["bytes_read"] = io_after[0] - io_before[0]
+                metrics["bytes_written"] = io_after[1] - io_before[1]
+            self.stages.append({**metrics, **details})
+            logging.info(
+                f"Stage {name} {status} in {wall_s:.2f} s "
+                f"({metrics['cpu_s']:.2f} s CPU, peak RSS {metrics['peak_rss_mb']:.0f} MB)"
+            )
+
+    def to_dict(self) -> dict:
+        return {
+            "script": self.script,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "wall_s": time.perf_counter() - self._started,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            **self.info,
+            "stages": self.stages,
+        }
+
+    def write(self) -> Path:
+        """Write `run_report_<script>_<YYYYMMDD>T<HHMMSS>.json` to `out_dir`."""
+        out_path = self.out_dir.joinpath(
+            f"run_report_{self.script}_{self.started_at.strftime('%Y%m%dT%H%M%S')}.json"
+        )
+        out_path.write_text(json.dumps(self.to_dict(), indent=1, default=str))
+        logging.info(f"Wrote run report to {out_path}")
+        return out_path
@@ -0,0 +1,261 @@
+"""Trailing-window sums carried from one daily pipeline run to the next.
+
+From one reference date to the next, every summary interval gains one day and
+loses one day. Instead of rebuilding the prefix sums over the whole recent cube,
+`RunningWindowState` keeps the double-precision sum and valid-value count of each
+window variable for each interval ending on its reference date, and advances them
+by adding the new days and subtracting the days that fall out of each window.
+A routine daily run then reads and aggregates only a handful of days.
+
+The state is saved next to the recent archive, one file per reference date:
+
+    running_window_state_<YYYY>_<MM>_<DD>.nc
+
+It records the archive digest of every day inside its windows. The state is
+discarded in favor of a full rebuild if any of those days has been revised, if a
+day needed to advance it is missing, if the grid changed, or if it is older than
+`MAX_ADVANCE_DAYS` or newer than the requested reference date.
+"""
+
+import json
+import logging
+from pathlib import Path
+
+import pandas as pd
+import xarray as xr
+
+from config import INTERVALS, RECENT_ARCHIVE_DIR, WATER_BUDGET_OFFSET_M
+from file_helpers import NETCDF_ENGINE
+
+# cube variables aggregated over the summary intervals; `wb` is the water budget
+WINDOW_VARIABLES = ("tp", "sd", "swvl", "wb")
+
+# beyond this many days since the saved state, a full rebuild reads fewer days
+MAX_ADVANCE_DAYS = 30
+
+STATE_PREFIX = "running_window_state_"
+
+
+def window_variable(cube: xr.Dataset, variable_key: str) -> xr.DataArray:
+    """Daily values of one window variable, including the derived water budget `wb`."""
+    if variable_key == "wb":
+        return (cube["tp"] + cube["pev"]) + WATER_BUDGET_OFFSET_M
+    return cube[variable_key]
+
+
+def _day_totals(da: xr.DataArray, start, stop) -> tuple[xr.DataArray, xr.DataArray]:
+    """Double-precision sum and valid-value count over the days `start` through `stop`."""
+    days = da.sel(valid_time=slice(start, stop))
+    days = days.drop_vars(
+        [name for name in days.coords if "valid_time" in days[name].dims]
+    )
+    return (
+        days.fillna(0).astype("float64").sum("valid_time"),
+        days.notnull().astype("int32").sum("valid_time"),
+    )
+
+
+def state_path(reference_date, state_dir: Path = RECENT_ARCHIVE_DIR) -> Path:
+    return Path(state_dir).joinpath(
+        f"{STATE_PREFIX}{pd.Timestamp(reference_date).strftime('%Y_%m_%d')}.nc"
+    )
+
+
+class RunningWindowState:
+    """Window sums and counts of each variable for the intervals ending on a reference date.
+
+    Args:
+        totals: `<variable>_sum` (float64) and `<variable>_count` (int32) for every
+            variable of `WINDOW_VARIABLES`, stacked along `interval`.
+        reference_date: last day of every window.
+        grid: digest of the archive grid the sums were computed on.
+        day_digests: archive digest of every day of the longest window.
+    """
+
+    def __init__(
+        self,
+        totals: xr.Dataset,
+        reference_date,
+        grid: str,
+        day_digests: dict[str, str],
+    ):
+        self.totals = totals
+        self.reference_date = pd.Timestamp(reference_date)
+        self.grid = grid
+        self.day_digests = day_digests
+
+    @property
+    def intervals(self) -> list[int]:
+        return [int(i) for i in self.totals["interval"].values]
+
+    @classmethod
+    def from_engine(cls, engine, reference_date, manifest: dict, intervals=INTERVALS):
+        """Build the state from the prefix-sum aggregators of an `IndexEngine`."""
+        reference_date = pd.Timestamp(reference_date)
+        end = engine.reference_position(reference_date)
+        arrays = {}
+        for key in WINDOW_VARIABLES:
+            sums, counts = engine.aggregator(key).interval_totals(list(intervals), end)
+            # cells outside the engine's land mask have no valid days
+            arrays[f"{key}_sum"] = engine.scatter(sums, 0.0)
+            arrays[f"{key}_count"] = engine.scatter(counts, 0).astype("int32")
+        return cls(
+            xr.Dataset(arrays).transpose("interval", ...),
+            reference_date,
+            manifest["grid"],
+            cls._window_digests(reference_date, max(intervals), manifest),
+        )
+
+    @staticmethod
+    def _window_digests(reference_date, n_days: int, manifest: dict) -> dict[str, str]:
+        dates = pd.date_range(end=reference_date, periods=n_days, freq="D")
+        keys = [date.strftime("%Y-%m-%d") for date in dates]
+        return {key: manifest["days"][key] for key in keys}
+
+    def subset(self, region: dict[str, slice]) -> "RunningWindowState":
+        """The state of the cells of positional `latitude`/`longitude` slices."""
+        return RunningWindowState(
+            self.totals.isel(region),
+            self.reference_date,
+            self.grid,
+            self.day_digests,
+        )
+
+    def covers(self, reference_date, intervals) -> bool:
+        """True if the state holds every interval of `intervals` ending on `reference_date`."""
+        return pd.Timestamp(reference_date) == self.reference_date and set(
+            intervals
+        ) <= set(self.intervals)
+
+    def interval_sums(self, variable_key: str, intervals, dtype) -> xr.DataArray:
+        """Window sums for each interval, stacked along ``interval``, as `dtype`."""
+        sums = self.totals[f"{variable_key}_sum"].sel(interval=list(intervals))
+        sums.name = None
+        return sums.astype(dtype)
+
+    def interval_means(self, variable_key: str, intervals, dtype) -> xr.DataArray:
+        """Window means for each interval (NaN without valid days), as `dtype`."""
+        sums = self.totals[f"{variable_key}_sum"].sel(interval=list(intervals))
+        counts = self.totals[f"{variable_key}_count"].sel(interval=list(intervals))
+        means = sums / counts.where(counts > 0)
+        means.name = None
+        return means.astype(dtype)
+
+    def advance_dates(self, reference_date, manifest: dict) -> pd.DatetimeIndex | None:
+        """Days to read to advance to `reference_date`, or None if a rebuild is needed."""
+        reference_date = pd.Timestamp(reference_date)
+        n_days = (reference_date - self.reference_date).days
+        reason = None
+        if manifest["grid"] != self.grid:
+            reason = "the grid changed"
+        elif n_days < 0 or n_days > MAX_ADVANCE_DAYS:
+            reason = f"it is {n_days} days from the reference date"
+        elif any(
+            manifest["days"].get(key) != digest
+            for key, digest in self.day_digests.items()
+        ):
+            reason = "input days inside its windows were revised or removed"
+        else:
+            new_days = pd.date_range(
+                self.reference_date + pd.Timedelta(days=1), reference_date, freq="D"
+            )
+            missing = [
+                date
+                for date in new_days
+                if date.strftime("%Y-%m-%d") not in manifest["days"]
+            ]
+            if missing:
+                reason = f"{len(missing)} new days are missing from the archive"
+        if reason:
+            logging.info(
+                f"Running window state of {self.reference_date.date()} cannot be "
+                f"advanced to {reference_date.date()}: {reason}"
+            )
+            return None
+
+        leaving = [
+            pd.date_range(
+                self.reference_date - pd.Timedelta(days=n - 1),
+                reference_date - pd.Timedelta(days=n),
+                freq="D",
+            )
+            for n in self.intervals
+        ]
+        return (
+            pd.DatetimeIndex([reference_date])
+            .append([new_days, *leaving])
+            .unique()
+            .sort_values()
+        )
+
+    def advance(self, days: xr.Dataset, reference_date, manifest: dict):
+        """Return the state for `reference_date`, from the days given by `advance_dates`."""
+        reference_date = pd.Timestamp(reference_date)
+        one_day = pd.Timedelta(days=1)
+        arrays = {}
+        for key in WINDOW_VARIABLES:
+            daily = window_variable(days, key)
+            added_sum, added_count = _day_totals(
+                daily, self.reference_date + one_day, reference_date
+            )
+            leaving = [
+                _day_totals(
+                    daily,
+                    self.reference_date - pd.Timedelta(days=n) + one_day,
+                    reference_date - pd.Timedelta(days=n),
+                )
+                for n in self.intervals
+            ]
+            interval = pd.Index(self.intervals, name="interval")
+            leaving_sum = xr.concat([total for total, _ in leaving], dim=interval)
+            leaving_count = xr.concat([count for _, count in leaving], dim=interval)
+
+            arrays[f"{key}_sum"] = self.totals[f"{key}_sum"] + added_sum - leaving_sum
+            arrays[f"{key}_count"] = (
+                self.totals[f"{key}_count"] + added_count - leaving_count
+            ).astype("int32")
+
+        return RunningWindowState(
+            xr.Dataset(arrays).transpose("interval", ...),
+            reference_date,
+            manifest["grid"],
+            self._window_digests(reference_date, max(self.intervals), manifest),
+        )
+
+    def save(self, state_dir: Path = RECENT_ARCHIVE_DIR) -> Path:
+        """Write the state and delete the states of earlier reference dates."""
+        out_path = state_path(self.reference_date, state_dir)
+        ds = self.totals.copy()
+        ds.attrs = {
+            "reference_date": self.reference_date.strftime("%Y-%m-%d"),
+            "grid": self.grid,
+            "day_digests": json.dumps(self.day_digests),
+        }
+        tmp_path = out_path.with_suffix(".nc.tmp")
+        ds.to_netcdf(tmp_path, engine=NETCDF_ENGINE)
+        tmp_path.replace(out_path)
+
+        for path in Path(state_dir).glob(f"{STATE_PREFIX}*.nc"):
+            if path.name < out_path.name:
+                path.unlink()
+        return out_path
+
+    @classmethod
+    def load_latest(cls, reference_date, state_dir: Path = RECENT_ARCHIVE_DIR):
+        """The saved state with the latest reference date not after `reference_date`, or None."""
+        candidates = sorted(
+            path
+            for path in Path(state_dir).glob(f"{STATE_PREFIX}*.nc")
+            if path.name <= state_path(reference_date, state_dir).name
+        )
+        if not candidates:
+            return None
+        ds = xr.load_dataset(candidates[-1], engine=NETCDF_ENGINE)
+        attrs = ds.attrs
+        ds.attrs = {}
+        return cls(
+            ds,
+            attrs["reference_date"],
+            attrs["grid"],
+            json.loads(attrs["day_digests"]),
+        )
@@ -0,0 +1,170 @@
+"""Spatial tiling of the index computation over a process pool.
+
+The latitude/longitude grid is split into rectangular tiles. Every tile runs the
+full index pipeline in its own worker process: it reads only its cells of the
+recent archive, opens the baseline files on its cells through `IndexEngine`, and
+returns its indices (and, on a full rebuild, its running window sums). The tiles
+are then stitched back into full-grid datasets, so the output files are identical
+to an untiled run while each worker only ever holds one tile.
+"""
+
+import logging
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import xarray as xr
+
+from config import CLIM_DIR, INTERVALS, RECENT_ARCHIVE_DIR
+from index_engine import IndexEngine
+from recent_archive import open_archive_days
+from running_windows import RunningWindowState
+
+
+def grid_tiles(
+    n_latitude: int, n_longitude: int, tile_size: tuple[int, int]
+) -> list[list[dict[str, slice]]]:
+    """Positional latitude/longitude slices of each tile, as rows of tiles.
+
+    The grid is split evenly, so tiles are at most `tile_size` cells and differ in
+    size by at most one cell along each dimension.
+    """
+    bounds = []
+    for size, target in zip((n_latitude, n_longitude), tile_size):
+        n_tiles = math.ceil(size / max(target, 1))
+        edges = [round(k * size / n_tiles) for k in range(n_tiles + 1)]
+        bounds.append([slice(a, b) for a, b in zip(edges[:-1], edges[1:])])
+    return [
+        [{"latitude": lat, "longitude": lon} for lon in bounds[1]] for lat in bounds[0]
+    ]
+
+
+def _compute_tile(
+    region: dict[str, slice],
+    dates: pd.DatetimeIndex,
+    ref_date: pd.Timestamp,
+    intervals: list[int],
+    window_state: RunningWindowState | None,
+    manifest: dict | None,
+    series_start,
+    archive_dir: Path,
+    clim_dir: Path,
+    fused: bool,
+) -> tuple[xr.Dataset, RunningWindowState | None]:
+    """Indices of one tile, plus its running window state if none was given.
+
+    `window_state` is already restricted to the tile.
+    """
+    cube = open_archive_days(dates, archive_dir, region=region)
+    with IndexEngine(cube, clim_dir, window_state=window_state, fused=fused) as engine:
+        if series_start is not None:
+            return engine.compute_series(start=series_start, intervals=intervals), None
+        indices = engine.compute(ref_date, intervals)
+        if window_state is None:
+            window_state = RunningWindowState.from_engine(
+                engine, ref_date, manifest, intervals
+            )
+        return indices, window_state
+
+
+def _tile_state(
+    window_state: RunningWindowState | None, region: dict[str, slice]
+) -> RunningWindowState | None:
+    """The cells of `region` of a running window state, so workers receive only those."""
+    if window_state is None:
+        return None
+    return window_state.subset(region)
+
+
+def _stitch(tiles: list[list[xr.Dataset]]) -> xr.Dataset:
+    return xr.combine_nested(
+        tiles,
+        concat_dim=["latitude", "longitude"],
+        data_vars="all",
+        coords="minimal",
+        compat="override",
+        join="exact",
+        combine_attrs="override",
+    )
+
+
+def compute_tiled(
+    dates,
+    ref_date,
+    tile_size: tuple[int, int],
+    workers: int = 1,
+    manifest: dict | None = None,
+    window_state: RunningWindowState | None = None,
+    series_start=None,
+    intervals=INTERVALS,
+    archive_dir: Path = RECENT_ARCHIVE_DIR,
+    clim_dir: Path = CLIM_DIR,
+    fused: bool = False,
+) -> tuple[xr.Dataset, RunningWindowState | None]:
+    """Compute the indices tile by tile in `workers` processes and stitch the tiles.
+
+    Args:
+        dates: archived days making up the recent cube of every tile.
+        ref_date: reference date of the indices.
+        tile_size: maximum (latitude, longitude) size of a tile.
+        workers: number of worker processes.
+        manifest: recent archive manifest, see `recent_archive.read_manifest`;
+            needed to build the running window state.
+        window_state: running window state for `ref_date`, sliced for each tile;
+            None computes the windows from `dates`.
+        series_start: compute the daily series from this reference date through
+            `ref_date` instead, see `IndexEngine.compute_series`.
+        intervals: summary interval lengths in days.
+        fused: compute SPI and SPEI with the fused kernels, see `IndexEngine`.
+
+    Returns:
+        The stitched indices, and the stitched running window state for
+        `ref_date` when it was computed from `dates` (None otherwise).
+    """
+    dates = pd.DatetimeIndex(dates)
+    ref_date = pd.Timestamp(ref_date)
+    template = open_archive_days(dates[-1:], archive_dir)
+    tiles = grid_tiles(
+        template.sizes["latitude"], template.sizes["longitude"], tile_size
+    )
+    n_tiles = sum(len(row) for row in tiles)
+    logging.info(
+        f"Computing {n_tiles} tiles of up to {tile_size[0]} x {tile_size[1]} cells "
+        f"in {workers} processes"
+    )
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            [
+                executor.submit(
+                    _compute_tile,
+                    region,
+                    dates,
+                    ref_date,
+                    list(intervals),
+                    _tile_state(window_state, region),
+                    manifest,
+                    series_start,
+                    archive_dir,
+                    clim_dir,
+                    fused,
+                )
+                for region in row
+            ]
+            for row in tiles
+        ]
+        # re-raise worker errors with the failing tile in the traceback
+        results = [[future.result() for future in row] for row in futures]
+    logging.info(f"Computed {n_tiles} tiles in {time.perf_counter() - started:.2f} s")
+
+    indices = _stitch([[tile for tile, _ in row] for row in results])
+    tile_state = results[0][0][1]
+    if window_state is not None or tile_state is None:
+        return indices, None
+    totals = _stitch([[state.totals for _, state in row] for row in results])
+    return indices, RunningWindowState(
+        totals, ref_date, tile_state.grid, tile_state.day_digests
+    )
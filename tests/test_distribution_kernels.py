@@ -0,0 +1,113 @@
+"""The native CDF and normal PPF kernels against scipy on synthetic parameters."""
+
+import numpy as np
+import pytest
+import xarray as xr
+from scipy import stats
+
+from distribution_kernels import cdf, fisk_cdf, gamma_cdf, norm_ppf
+from index_engine import PROBABILITY_CEILING, PROBABILITY_FLOOR
+
+# quantiles from deep in the lower tail, past the probability clipping, to the upper
+QUANTILES = np.array(
+    [1e-12, 1e-9, PROBABILITY_FLOOR, 1e-3, 0.1, 0.5, 0.9, 0.999, 1 - 1e-9]
+)
+N_CELLS = 200
+
+
+def synthetic_params(scipy_dist: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Float32 (shape, loc, scale) of `N_CELLS` cells, as fitted for SPI or SPEI."""
+    rng = np.random.default_rng(0)
+    if scipy_dist == "gamma":
+        # interval mean precipitation in m/day; zero location
+        shape = rng.uniform(0.3, 5.0, N_CELLS)
+        loc = np.zeros(N_CELLS)
+        scale = rng.uniform(0.0002, 0.005, N_CELLS)
+    else:
+        # interval mean water balance in m/day, often negative
+        shape = rng.uniform(2.0, 20.0, N_CELLS)
+        loc = rng.uniform(-0.05, -0.002, N_CELLS)
+        scale = rng.uniform(0.002, 0.05, N_CELLS)
+    return tuple(p.astype("float32")[:, None] for p in (shape, loc, scale))
+
+
+@pytest.mark.parametrize(
+    "scipy_dist, kernel", [("gamma", gamma_cdf), ("fisk", fisk_cdf)]
+)
+def test_cdf_matches_scipy(scipy_dist, kernel):
+    shape, loc, scale = synthetic_params(scipy_dist)
+    dist = getattr(stats, scipy_dist)
+    values = dist.ppf(QUANTILES, shape, loc, scale).astype("float32")
+    # at and below the location: zero precipitation for gamma, the lower bound of
+    # the water balance for fisk
+    values = np.concatenate([values, loc, loc - scale], axis=1)
+
+    expected = dist.cdf(values.astype("float64"), shape, loc, scale)
+    probability = kernel(values, shape, loc, scale)
+
+    assert probability.dtype == np.float64
+    np.testing.assert_allclose(probability, expected, rtol=1e-9, atol=1e-15)
+    assert (probability[:, -2:] == 0).all()
+    # both tails are resolved in double precision, beyond the probability clipping
+    assert (probability[:, 0] > 0).all()
+    assert (probability[:, len(QUANTILES) - 1] > PROBABILITY_CEILING).all()
+
+
+@pytest.mark.parametrize(
+    "scipy_dist, kernel", [("gamma", gamma_cdf), ("fisk", fisk_cdf)]
+)
+def test_cdf_invalid_params(scipy_dist, kernel):
+    """Cells without a valid fit, e.g. never any precipitation, are NaN as in scipy."""
+    shape = np.array([0.0, -1.0, 2.0, np.nan], dtype="float32")
+    scale = np.array([0.001, 0.001, 0.0, 0.001], dtype="float32")
+    with np.errstate(divide="ignore"):
+        probability = kernel(np.float32(0.001), shape, np.float32(0), scale)
+        expected = getattr(stats, scipy_dist).cdf(0.001, shape, 0, scale)
+    assert np.isnan(probability).all()
+    assert np.isnan(expected).all()
+
+
+@pytest.mark.parametrize("scipy_dist", ["gamma", "fisk"])
+def test_cdf_of_fitted_params(scipy_dist):
+    """`cdf` selects the parameters along `dparams` as written by xclim."""
+    shape, loc, scale = synthetic_params(scipy_dist)
+    shape_name = "a" if scipy_dist == "gamma" else "c"
+    params = xr.DataArray(
+        np.stack([shape[:, 0], loc[:, 0], scale[:, 0]]),
+        dims=("dparams", "cell"),
+        coords={"dparams": [shape_name, "loc", "scale"]},
+    )
+    dist = getattr(stats, scipy_dist)
+    values = xr.DataArray(
+        dist.ppf(0.3, shape[:, 0], loc[:, 0], scale[:, 0]).astype("float32"),
+        dims="cell",
+    )
+    values[:10] = np.nan
+
+    probability = cdf(params, values, scipy_dist)
+
+    expected = dist.cdf(values.values.astype("float64"), *params.values)
+    np.testing.assert_allclose(probability.values, expected, rtol=1e-9)
+    assert probability[:10].isnull().all()
+
+
+def test_norm_ppf_matches_scipy():
+    probability = xr.DataArray(
+        np.concatenate(
+            [
+                [PROBABILITY_FLOOR, 1e-4, 0.0228, 0.5, 0.9772, PROBABILITY_CEILING],
+                np.linspace(0.01, 0.99, 99),
+            ]
+        ),
+        dims="cell",
+    )
+    index = norm_ppf(probability)
+
+    assert index.dtype == np.float32
+    expected = stats.norm.ppf(probability.values)
+    np.testing.assert_allclose(index.values, expected, rtol=1e-6, atol=1e-6)
+    # the clipped tails give the most extreme indices, about -4.75 and 4.75
+    assert np.isfinite(index).all()
+    assert index.min() == index[0] < -4.7
+    assert index.max() == index[5] > 4.7
+    assert np.isnan(norm_ppf(xr.DataArray([np.nan]))).all()
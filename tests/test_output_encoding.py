@@ -0,0 +1,66 @@
+"""Round trip of the indices through the packed output files."""
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from data_viz.plot_scales import SPI_SPEI_USDM_BOUNDS
+from index_engine import write_interval_files
+from indices_cube import dated_indices_files, open_dated_indices
+from usdm_coverage import usdm_coverage
+from zonal_statistics import regions_layer, zone_weights
+
+INTERVALS = [30, 60]
+
+
+def synthetic_indices() -> xr.Dataset:
+    """SPI, SPEI and SMD tenths over Interior Alaska, many of them on a category bound."""
+    rng = np.random.default_rng(0)
+    latitude = np.round(np.arange(66.0, 63.0, -0.1), 1)
+    longitude = np.round(np.arange(-150.0, -145.0, 0.1), 1)
+    shape = (len(INTERVALS), len(latitude), len(longitude))
+    bounds = np.asarray(SPI_SPEI_USDM_BOUNDS[1:-1])
+    data_vars = {}
+    for name in ("spi", "spei"):
+        values = np.where(
+            rng.random(shape) < 0.5,
+            rng.choice(bounds, shape),
+            rng.integers(-30, 31, shape) / 10,
+        )
+        values[rng.random(shape) < 0.05] = np.nan
+        # as the engine computes them: rounded float32
+        data_vars[name] = (
+            ("interval", "latitude", "longitude"),
+            np.round(values.astype("float32"), 1),
+            {"units": ""},
+        )
+    data_vars["smd"] = (
+        ("interval", "latitude", "longitude"),
+        np.round(rng.uniform(-50, 50, shape).astype("float32"), 1),
+        {"units": "percent"},
+    )
+    return xr.Dataset(
+        data_vars,
+        coords={"interval": INTERVALS, "latitude": latitude, "longitude": longitude},
+        attrs={"reference_date": "2025-03-10"},
+    )
+
+
+def test_packed_round_trip_usdm_coverage(tmp_path):
+    indices = synthetic_indices()
+    write_interval_files(indices, tmp_path, "int16_zlib")
+    (paths,) = dated_indices_files(tmp_path).values()
+    written = open_dated_indices(paths)
+
+    for name in indices.data_vars:
+        assert written[name].dtype == np.float32
+        np.testing.assert_array_equal(written[name].values, indices[name].values)
+
+    weights = zone_weights(
+        regions_layer(), indices["latitude"].values, indices["longitude"].values, None
+    )
+    before = usdm_coverage(indices, weights)
+    after = usdm_coverage(written, weights)
+    pd.testing.assert_frame_equal(before, after)
+    # the bounds are populated, so a misbinned value would show
+    assert (before.filter(like="D").to_numpy() > 0).any()
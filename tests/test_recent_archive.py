@@ -0,0 +1,109 @@
+"""Round trip of the downloads through the recent archive and the index engine."""
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from benchmarks.synthetic_era5_land import (
+    daily_fields,
+    ocean_mask,
+    synthetic_grid,
+    write_baseline_data,
+)
+from index_engine import INDEX_NAMES, IndexEngine
+from recent_archive import (
+    archive_day_path,
+    open_archive_days,
+    read_manifest,
+    update_recent_archive,
+)
+
+# attributes of the merged GRIB and NetCDF downloads, as `assemble_recent_downloads`
+# and `combine_swvl` leave them
+DOWNLOAD_ATTRS = {
+    "tp": {"GRIB_paramId": 228, "GRIB_units": "m", "long_name": "Total precipitation"},
+    "pev": {"GRIB_paramId": 228251, "GRIB_units": "m", "units": "m"},
+    "sd": {"long_name": "Daily (UTC) mean snow water equivalent"},
+    "swvl": {"source": "Weighted combination of swvl1 and swvl2 UTC daily means."},
+}
+
+
+# the shortest window keeps the archive small; the attributes do not depend on it
+N_DAYS = 30
+
+
+def synthetic_downloads(tmp_path, n_days: int = N_DAYS) -> xr.Dataset:
+    """Downloads of a small grid with their attributes, and its baseline files."""
+    rng = np.random.default_rng(0)
+    latitude, longitude = synthetic_grid(4, 5)
+    ocean = ocean_mask((4, 5), 0.2, rng)
+    write_baseline_data(tmp_path.joinpath("clim"), latitude, longitude, ocean, rng, 0)
+    dates = pd.date_range(end="2025-03-10", periods=n_days, freq="D")
+    fields = daily_fields(dates, ocean, rng)
+    fields["swvl"] = fields.pop("swvl1")
+    ds = xr.Dataset(
+        {
+            name: (("valid_time", "latitude", "longitude"), fields[name], attrs)
+            for name, attrs in DOWNLOAD_ATTRS.items()
+        },
+        coords={"valid_time": dates, "latitude": latitude, "longitude": longitude},
+        attrs={"GRIB_edition": 1, "Conventions": "CF-1.7"},
+    )
+    ds["latitude"].attrs["units"] = "degrees_north"
+    return ds
+
+
+def test_archive_round_trip_attrs(tmp_path):
+    downloads = synthetic_downloads(tmp_path)
+    archive_dir = tmp_path.joinpath("archive")
+    update_recent_archive(downloads, archive_dir)
+
+    day = xr.open_dataset(
+        archive_day_path(downloads["valid_time"][-1].values, archive_dir)
+    )
+    assert day.attrs == {}
+    assert all(day[name].attrs == {} for name in DOWNLOAD_ATTRS)
+    assert day["latitude"].attrs["units"] == "degrees_north"
+    day.close()
+
+    cube = open_archive_days(downloads["valid_time"].values, archive_dir)
+    with IndexEngine(cube, clim_dir=tmp_path.joinpath("clim")) as engine:
+        indices = engine.compute(intervals=[N_DAYS])
+
+    assert indices.attrs == {"reference_date": "2025-03-10"}
+    assert list(indices.data_vars) == list(INDEX_NAMES)
+    for name in INDEX_NAMES:
+        assert set(indices[name].attrs) <= {"units", "calibration_period"}
+        assert "units" in indices[name].attrs
+    assert indices["pntp"].attrs["units"] == "percent"
+    assert indices["smd"].attrs["units"] == "percent"
+
+
+def test_output_attrs_of_archived_download_attrs(tmp_path):
+    """Days archived with the download attributes do not pass them to the indices."""
+    downloads = synthetic_downloads(tmp_path)
+    archive_dir = tmp_path.joinpath("archive")
+    update_recent_archive(downloads, archive_dir)
+    path = archive_day_path(downloads["valid_time"][-1].values, archive_dir)
+    downloads.isel(valid_time=[-1]).to_netcdf(path)
+
+    cube = open_archive_days(downloads["valid_time"].values, archive_dir)
+    assert cube.attrs == {}
+    assert all(cube[name].attrs == {} for name in DOWNLOAD_ATTRS)
+    with IndexEngine(cube, clim_dir=tmp_path.joinpath("clim")) as engine:
+        indices = engine.compute(intervals=[N_DAYS])
+    assert indices.attrs == {"reference_date": "2025-03-10"}
+    assert not any("GRIB_units" in indices[name].attrs for name in INDEX_NAMES)
+
+
+def test_archive_in_blocks_of_days(tmp_path):
+    """Archiving the downloads a few days at a time writes the same days."""
+    downloads = synthetic_downloads(tmp_path)
+    update_recent_archive(downloads, tmp_path.joinpath("whole"))
+    counts = update_recent_archive(
+        downloads.chunk(valid_time=1), tmp_path.joinpath("blocks"), block_days=7
+    )
+    assert counts["added"] == N_DAYS
+    assert read_manifest(tmp_path.joinpath("blocks")) == read_manifest(
+        tmp_path.joinpath("whole")
+    )
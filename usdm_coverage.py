@@ -0,0 +1,176 @@
+"""Share of the land area in each USDM drought category, by SPI and SPEI.
+
+Every interval of SPI and SPEI is binned into the categories of the maps,
+`data_viz/plot_scales.SPI_SPEI_USDM_BOUNDS` (D4 through D0, Normal and Moist),
+in left-closed bins: a value on a bound is in the category above it, so -2.0 is D3
+and -0.5 is Normal. The values beyond the outer bounds fall in D4 and Moist.
+
+For the whole domain and each `data_viz/region_subset.REGIONS` box, the table
+gives the percent of the land area with data in each category, weighted by cell
+area (the cosine of latitude, and for the regions the fraction of the cell inside
+the box, from the cached weights of `zonal_statistics`), and `coverage`, the
+percent of the land area (where `smd` has data) with an index value. All fields
+are binned with one `np.digitize` and summed per region with one `np.bincount`.
+
+Each run writes `usdm_coverage_<YYYY>_<MM>_<DD>.csv` and adds its rows to
+`usdm_coverage_history.csv` in INDICES_DIR, replacing those of a rerun date.
+
+Usage (coverage of the latest indices in INDICES_DIR):
+    python usdm_coverage.py
+    python usdm_coverage.py --date 2025-03-10
+"""
+
+import argparse
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from config import INDICES_DIR
+from data_viz.plot_scales import SPI_SPEI_USDM_BOUNDS, SPI_SPEI_USDM_CATEGORIES
+from file_helpers import setup_logging
+from indices_cube import open_dated_indices
+from point_extraction import LAND_VARIABLE, indices_files
+from zonal_statistics import ZoneWeights, regions_layer, zone_weights
+
+USDM_INDICES = ("spi", "spei")
+DOMAIN_REGION = "domain"
+USDM_HISTORY_FILE = "usdm_coverage_history.csv"
+
+
+def land_mask(indices: xr.Dataset) -> np.ndarray:
+    """Flat mask of the cells where `smd` has data in any interval (all cells without `smd`)."""
+    if LAND_VARIABLE not in indices:
+        return np.ones(indices.sizes["latitude"] * indices.sizes["longitude"], bool)
+    land = indices[LAND_VARIABLE].notnull()
+    if "interval" in land.dims:
+        land = land.any("interval")
+    return land.transpose("latitude", "longitude").values.ravel()
+
+
+def region_weights(indices: xr.Dataset, weights: ZoneWeights | None = None):
+    """Region names and the (region, cell, weight) entries of the domain and `weights`.
+
+    The domain weighs every land cell by the cosine of its latitude; `weights`
+    (the `regions` layer by default) are restricted to land.
+    """
+    latitude, longitude = indices["latitude"].values, indices["longitude"].values
+    if weights is None:
+        weights = zone_weights(regions_layer(), latitude, longitude)
+    land = land_mask(indices)
+    area = np.repeat(np.cos(np.deg2rad(latitude)), len(longitude))
+    domain_cells = np.flatnonzero(land)
+    matrix = weights.matrix
+    zone_rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    on_land = land[matrix.indices]
+    rows = np.concatenate([np.zeros(len(domain_cells), int), 1 + zone_rows[on_land]])
+    cells = np.concatenate([domain_cells, matrix.indices[on_land]])
+    entry_weights = np.concatenate([area[domain_cells], matrix.data[on_land]])
+    return [DOMAIN_REGION, *weights.zones], rows, cells, entry_weights
+
+
+def usdm_coverage(
+    indices: xr.Dataset, weights: ZoneWeights | None = None
+) -> pd.DataFrame:
+    """Percent of the land area in each USDM category, per region, index and interval.
+
+    Args:
+        indices: indices of one reference date along `interval`, as from
+            `IndexEngine.compute`.
+        weights: zone weights of the regions on the grid of `indices`; defaults
+            to the `regions` layer.
+
+    Returns:
+        Table with one row per region (the domain first), index and interval, the
+        percent of the area with data in each of `SPI_SPEI_USDM_CATEGORIES`, and
+        `coverage`, the percent of the land area with data.
+    """
+    names = [name for name in USDM_INDICES if name in indices]
+    ds = indices[names].reset_coords(drop=True)
+    ds = ds.transpose("interval", "latitude", "longitude")
+    intervals = ds["interval"].values
+    # cells x fields, one column per index and interval
+    values = np.concatenate(
+        [ds[name].values.reshape(len(intervals), -1).T for name in names], axis=1
+    )
+    regions, rows, cells, entry_weights = region_weights(indices, weights)
+
+    n_categories = len(SPI_SPEI_USDM_CATEGORIES)
+    # left-closed bins of the inner bounds, in the values' precision so that a
+    # float32 -1.6 is not below the bound -1.6; no data is the last code
+    bounds = np.asarray(SPI_SPEI_USDM_BOUNDS[1:-1], dtype=values.dtype)
+    codes = np.digitize(values, bounds)
+    codes[np.isnan(values)] = n_categories
+    n_fields = values.shape[1]
+    keys = (np.arange(n_fields) * len(regions) + rows[:, None]) * (
+        n_categories + 1
+    ) + codes[cells]
+    areas = np.bincount(
+        keys.ravel(),
+        weights=np.repeat(entry_weights, n_fields),
+        minlength=n_fields * len(regions) * (n_categories + 1),
+    ).reshape(n_fields, len(regions), n_categories + 1)
+    # rows by region, then index and interval
+    areas = areas.transpose(1, 0, 2).reshape(-1, n_categories + 1)
+
+    with_data = areas[:, :n_categories].sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        percent = 100 * areas[:, :n_categories] / with_data
+        coverage = 100 * with_data[:, 0] / areas.sum(axis=1)
+    table = pd.DataFrame(percent, columns=list(SPI_SPEI_USDM_CATEGORIES))
+    table.insert(0, "interval", np.tile(intervals, len(regions) * len(names)))
+    table.insert(0, "index", np.tile(np.repeat(names, len(intervals)), len(regions)))
+    table.insert(0, "region", np.repeat(regions, n_fields))
+    table["coverage"] = coverage
+    return table
+
+
+def append_history(table: pd.DataFrame, history_path: Path) -> None:
+    """Add `table` to the history CSV, replacing rows of its reference dates."""
+    history_path = Path(history_path)
+    if history_path.exists():
+        history = pd.read_csv(history_path, dtype={"reference_date": str})
+        history = history[~history["reference_date"].isin(table["reference_date"])]
+        table = pd.concat([history, table], ignore_index=True)
+    table = table.sort_values("reference_date", kind="stable", ignore_index=True)
+    tmp_path = history_path.with_name(f".{history_path.name}.tmp")
+    table.to_csv(tmp_path, index=False, float_format="%.2f")
+    os.replace(tmp_path, history_path)
+
+
+def write_usdm_coverage(indices: xr.Dataset, out_dir: Path = INDICES_DIR) -> Path:
+    """Write `usdm_coverage_<YYYY>_<MM>_<DD>.csv` and add it to the history file."""
+    ref_date = pd.Timestamp(indices.attrs["reference_date"])
+    table = usdm_coverage(indices)
+    table.insert(0, "reference_date", ref_date.strftime("%Y-%m-%d"))
+    out_path = Path(out_dir).joinpath(
+        f"usdm_coverage_{ref_date.strftime('%Y_%m_%d')}.csv"
+    )
+    table.to_csv(out_path, index=False, float_format="%.2f")
+    append_history(table, Path(out_dir).joinpath(USDM_HISTORY_FILE))
+    return out_path
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--date",
+        help="Reference date (YYYY-MM-DD) of the indices; defaults to the latest.",
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    setup_logging()
+    args = parse_args()
+    _, paths = indices_files(INDICES_DIR, args.date)
+    indices = open_dated_indices(list(paths.values()))
+    logging.info(f"Wrote {write_usdm_coverage(indices, INDICES_DIR)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
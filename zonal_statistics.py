@@ -0,0 +1,401 @@
+"""Zonal statistics of the drought indices over polygon layers.
+
+A zone layer is a GeoJSON FeatureCollection of Polygon and MultiPolygon features
+in longitude/latitude (the grid's -180 to 180 convention), one layer per
+`*.geojson` file in `ZONES_DIR`, with the zone name in each feature's `name`
+property; features of the same name form one zone. The `regions` layer of the
+`data_viz/region_subset.REGIONS` boxes is always available.
+
+Each layer is rasterized once per grid into a sparse (zone x cell) matrix of area
+weights: the cosine of the cell's latitude, proportional to its area on the
+regular latitude/longitude grid, times the fraction of the cell inside the zone,
+estimated from `SUBSAMPLES` x `SUBSAMPLES` points per cell. The matrix is cached
+in memory and as an .npz file under a fingerprint of the grid and the layer, so
+later runs skip the rasterization.
+
+The area-weighted mean of every indicator and interval over all zones is then one
+sparse product with the stacked fields, and the minimum, percentiles and maximum
+come from the weighted distribution of each zone's cells. Cells without data (the
+ocean, and e.g. SPI where it is undefined) are left out, and `coverage` is the
+fraction of a zone's weight that has data.
+
+Usage (statistics of the latest indices in INDICES_DIR over every layer):
+    python zonal_statistics.py
+    python zonal_statistics.py --date 2025-03-10 --layers regions boroughs
+"""
+
+import argparse
+import json
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+from matplotlib.path import Path as PolygonPath
+from scipy import sparse
+
+from config import INDICES_DIR, ZONES_DIR
+from data_viz.region_subset import REGIONS
+from file_helpers import setup_logging
+from indices_cube import open_dated_indices
+from point_extraction import array_fingerprint, grid_fingerprint, indices_files
+
+ZONE_WEIGHTS_CACHE_DIR = INDICES_DIR.joinpath("zone_weights")
+REGIONS_LAYER = "regions"
+ZONE_NAME_PROPERTY = "name"
+# sample points per cell side for the fraction of a cell inside a zone
+SUBSAMPLES = 4
+ZONAL_PERCENTILES = (10, 50, 90)
+
+# (grid fingerprint, layer fingerprint) -> weights, for repeated runs in a process
+_ZONE_WEIGHTS: dict[tuple[str, str], "ZoneWeights"] = {}
+
+
+@dataclass(frozen=True)
+class ZoneLayer:
+    """Named zones, each a list of polygons given as rings of (longitude, latitude).
+
+    The first ring of a polygon is its exterior, any others are holes.
+    """
+
+    name: str
+    zones: dict[str, list[list[np.ndarray]]]
+
+    def fingerprint(self) -> str:
+        rings = [
+            ring for polygons in self.zones.values() for p in polygons for ring in p
+        ]
+        return array_fingerprint(
+            np.array(list(self.zones), dtype=str),
+            np.array([len(ring) for ring in rings]),
+            *rings,
+        )
+
+
+@dataclass(frozen=True)
+class ZoneWeights:
+    """Sparse (zone x cell) area weights of a layer on a grid, cells in row-major order."""
+
+    zones: list[str]
+    matrix: sparse.csr_matrix
+
+
+def regions_layer() -> ZoneLayer:
+    """The `data_viz/region_subset.REGIONS` boxes as a zone layer."""
+    zones = {}
+    for name, region in REGIONS.items():
+        ring = np.array(
+            [
+                (lon, lat)
+                for lat, lon in region.corners_latlon + region.corners_latlon[:1]
+            ]
+        )
+        zones[name] = [[ring]]
+    return ZoneLayer(REGIONS_LAYER, zones)
+
+
+def read_geojson_layer(path: Path) -> ZoneLayer:
+    """Zone layer of the Polygon and MultiPolygon features of a GeoJSON file."""
+    path = Path(path)
+    with path.open(encoding="utf-8") as handle:
+        collection = json.load(handle)
+    zones: dict[str, list[list[np.ndarray]]] = {}
+    for number, feature in enumerate(collection["features"]):
+        geometry = feature.get("geometry") or {}
+        if geometry.get("type") == "Polygon":
+            polygons = [geometry["coordinates"]]
+        elif geometry.get("type") == "MultiPolygon":
+            polygons = geometry["coordinates"]
+        else:
+            logging.warning(
+                f"Skipping feature {number} of {path.name} without polygon geometry"
+            )
+            continue
+        properties = feature.get("properties") or {}
+        name = str(properties.get(ZONE_NAME_PROPERTY, feature.get("id", number)))
+        zones.setdefault(name, []).extend(
+            [np.asarray(ring, dtype=float)[:, :2] for ring in polygon]
+            for polygon in polygons
+        )
+    if not zones:
+        raise ValueError(f"{path} has no Polygon or MultiPolygon features")
+    return ZoneLayer(path.stem, zones)
+
+
+def load_zone_layers(zones_dir: Path = ZONES_DIR) -> dict[str, ZoneLayer]:
+    """The `regions` layer and one layer per `*.geojson` file in `zones_dir`."""
+    layers = {REGIONS_LAYER: regions_layer()}
+    if Path(zones_dir).is_dir():
+        for path in sorted(Path(zones_dir).glob("*.geojson")):
+            layers[path.stem] = read_geojson_layer(path)
+    return layers
+
+
+def _zone_fractions(
+    polygons: list[list[np.ndarray]], latitude: np.ndarray, longitude: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Flat indices of the cells a zone overlaps and the fraction of each inside it."""
+    d_lat = np.abs(np.diff(latitude)).max()
+    d_lon = np.abs(np.diff(longitude)).max()
+    points = np.concatenate([ring for polygon in polygons for ring in polygon])
+    (lon_min, lat_min), (lon_max, lat_max) = points.min(0), points.max(0)
+    rows = np.flatnonzero(
+        (latitude + d_lat / 2 >= lat_min) & (latitude - d_lat / 2 <= lat_max)
+    )
+    cols = np.flatnonzero(
+        (longitude + d_lon / 2 >= lon_min) & (longitude - d_lon / 2 <= lon_max)
+    )
+    if rows.size == 0 or cols.size == 0:
+        return np.array([], dtype=int), np.array([])
+
+    offsets = (np.arange(SUBSAMPLES) + 0.5) / SUBSAMPLES - 0.5
+    sample_lat = (latitude[rows, None] + offsets * d_lat).ravel()
+    sample_lon = (longitude[cols, None] + offsets * d_lon).ravel()
+    lon_grid, lat_grid = np.meshgrid(sample_lon, sample_lat)
+    samples = np.column_stack([lon_grid.ravel(), lat_grid.ravel()])
+
+    inside = np.zeros(len(samples), dtype=bool)
+    for exterior, *holes in polygons:
+        in_polygon = PolygonPath(exterior).contains_points(samples)
+        for hole in holes:
+            in_polygon &= ~PolygonPath(hole).contains_points(samples)
+        inside |= in_polygon
+    fractions = inside.reshape(len(rows), SUBSAMPLES, len(cols), SUBSAMPLES).mean(
+        axis=(1, 3)
+    )
+    cells = np.ravel_multi_index(np.ix_(rows, cols), (len(latitude), len(longitude)))
+    overlapped = fractions > 0
+    return cells[overlapped], fractions[overlapped]
+
+
+def rasterize_layer(
+    layer: ZoneLayer, latitude: np.ndarray, longitude: np.ndarray
+) -> ZoneWeights:
+    """Area weights of every zone of `layer` on a latitude/longitude grid."""
+    area = np.repeat(np.cos(np.radians(latitude)), len(longitude))
+    rows, cols, weights = [], [], []
+    for row, polygons in enumerate(layer.zones.values()):
+        cells, fractions = _zone_fractions(polygons, latitude, longitude)
+        rows.append(np.full(len(cells), row))
+        cols.append(cells)
+        weights.append(area[cells] * fractions)
+    matrix = sparse.csr_matrix(
+        (np.concatenate(weights), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(len(layer.zones), len(latitude) * len(longitude)),
+    )
+    return ZoneWeights(list(layer.zones), matrix)
+
+
+def zone_weights(
+    layer: ZoneLayer,
+    latitude: np.ndarray,
+    longitude: np.ndarray,
+    cache_dir: Path | None = ZONE_WEIGHTS_CACHE_DIR,
+) -> ZoneWeights:
+    """`rasterize_layer`, cached per grid and layer in memory and in `cache_dir`."""
+    key = (
+        grid_fingerprint(latitude, longitude),
+        array_fingerprint(np.array([SUBSAMPLES]), np.array([layer.fingerprint()])),
+    )
+    if key in _ZONE_WEIGHTS:
+        return _ZONE_WEIGHTS[key]
+
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = Path(cache_dir).joinpath(
+            f"zone_weights_{layer.name}_{key[0]}_{key[1]}.npz"
+        )
+    if cache_path is not None and cache_path.exists():
+        with np.load(cache_path) as cached:
+            matrix = sparse.csr_matrix(
+                (cached["data"], cached["indices"], cached["indptr"]),
+                shape=tuple(cached["shape"]),
+            )
+            weights = ZoneWeights(cached["zones"].tolist(), matrix)
+    else:
+        weights = rasterize_layer(layer, latitude, longitude)
+        logging.info(
+            f"Rasterized {len(weights.zones)} zones of layer {layer.name} onto "
+            f"{weights.matrix.nnz} cells"
+        )
+        if cache_path is not None:
+            try:
+                cache_path.parent.mkdir(exist_ok=True, parents=True)
+                # concurrent runs may write the same cache file
+                tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp.npz")
+                np.savez(
+                    tmp_path,
+                    data=weights.matrix.data,
+                    indices=weights.matrix.indices,
+                    indptr=weights.matrix.indptr,
+                    shape=np.array(weights.matrix.shape),
+                    zones=np.array(weights.zones, dtype=str),
+                )
+                tmp_path.replace(cache_path)
+            except OSError as exc:
+                logging.warning(
+                    f"Could not cache the zone weights in {cache_dir}: {exc}"
+                )
+    empty = [
+        zone
+        for zone, total in zip(weights.zones, weights.matrix.sum(1).A1)
+        if not total
+    ]
+    if empty:
+        logging.warning(f"Zones of layer {layer.name} off the grid: {empty}")
+    _ZONE_WEIGHTS[key] = weights
+    return weights
+
+
+def _weighted_quantiles(
+    weights: sparse.csr_matrix, values: np.ndarray, quantiles: np.ndarray
+) -> np.ndarray:
+    """Weighted quantiles of `values` (one per cell) in each zone, zones x quantiles.
+
+    The quantile q of a zone is its smallest value whose cumulative weight reaches
+    the fraction q of the zone's weight with data; 0 and 1 give the minimum and
+    maximum. Zones without data are NaN.
+    """
+    n_zones = weights.shape[0]
+    zone = np.repeat(np.arange(n_zones), np.diff(weights.indptr))
+    cell_values = values[weights.indices]
+    keep = ~np.isnan(cell_values)
+    zone, cell_values, cell_weights = zone[keep], cell_values[keep], weights.data[keep]
+    order = np.lexsort((cell_values, zone))
+    zone, cell_values, cell_weights = (
+        zone[order],
+        cell_values[order],
+        cell_weights[order],
+    )
+
+    totals = np.bincount(zone, cell_weights, minlength=n_zones)
+    cumulative = np.cumsum(cell_weights)
+    before_zone = np.concatenate([[0], np.cumsum(totals)[:-1]])
+    fraction = (cumulative - before_zone[zone]) / totals[zone]
+    # keys increase through each zone from 2 z to 2 z + 1, so zones do not overlap
+    keys = 2 * zone + fraction
+    targets = 2 * np.arange(n_zones)[:, None] + quantiles[None, :] - 1e-9
+    positions = np.minimum(np.searchsorted(keys, targets), max(len(keys) - 1, 0))
+    result = cell_values[positions] if len(keys) else np.full(targets.shape, np.nan)
+    result[totals == 0] = np.nan
+    return result
+
+
+def zonal_statistics(
+    indices: xr.Dataset,
+    weights: ZoneWeights,
+    percentiles=ZONAL_PERCENTILES,
+) -> pd.DataFrame:
+    """Area-weighted statistics of every indicator and interval of `indices` per zone.
+
+    Args:
+        indices: indices of one reference date along `interval`, as from
+            `IndexEngine.compute`, on the grid of `weights`.
+        weights: zone weights from `zone_weights`.
+        percentiles: weighted percentiles to report, besides the minimum and
+            maximum.
+
+    Returns:
+        Table with one row per zone, indicator and interval, and the columns
+        `mean`, `min`, `p<percentile>`..., `max` and `coverage`.
+    """
+    ds = indices.reset_coords(drop=True).transpose("interval", "latitude", "longitude")
+    fields = [(name, i) for name in ds.data_vars for i in ds["interval"].values]
+    # cells x fields, one column per indicator and interval, reading each indicator once
+    values = np.concatenate(
+        [
+            ds[name].values.reshape(ds.sizes["interval"], -1).T.astype("float64")
+            for name in ds.data_vars
+        ],
+        axis=1,
+    )
+    valid = ~np.isnan(values)
+
+    matrix = weights.matrix
+    # one sparse product for the weighted sums of all fields, one for their weights
+    weighted_sums = matrix @ np.where(valid, values, 0.0)
+    valid_weights = matrix @ valid.astype("float64")
+    zone_totals = matrix.sum(axis=1).A1[:, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = weighted_sums / valid_weights
+        coverage = valid_weights / zone_totals
+
+    quantiles = np.array([0, *percentiles, 100]) / 100
+    columns = ["min", *(f"p{p:g}" for p in percentiles), "max"]
+    tables = []
+    for k, (name, interval) in enumerate(fields):
+        table = pd.DataFrame(
+            _weighted_quantiles(matrix, values[:, k], quantiles), columns=columns
+        )
+        table.insert(0, "mean", means[:, k])
+        table.insert(0, "interval", interval)
+        table.insert(0, "indicator", name)
+        table.insert(0, "zone", weights.zones)
+        table["coverage"] = coverage[:, k]
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True).sort_values(
+        ["zone", "indicator", "interval"], kind="stable", ignore_index=True
+    )
+
+
+def write_zonal_statistics(
+    indices: xr.Dataset,
+    out_dir: Path = INDICES_DIR,
+    layers: dict[str, ZoneLayer] | None = None,
+) -> list[Path]:
+    """Write `zonal_statistics_<layer>_<YYYY>_<MM>_<DD>.csv` for every zone layer.
+
+    `layers` defaults to `load_zone_layers()`.
+    """
+    ref_date = pd.Timestamp(indices.attrs["reference_date"])
+    latitude, longitude = indices["latitude"].values, indices["longitude"].values
+    out_paths = []
+    for name, layer in (layers or load_zone_layers()).items():
+        table = zonal_statistics(indices, zone_weights(layer, latitude, longitude))
+        table.insert(0, "reference_date", ref_date.strftime("%Y-%m-%d"))
+        table.insert(0, "layer", name)
+        out_path = Path(out_dir).joinpath(
+            f"zonal_statistics_{name}_{ref_date.strftime('%Y_%m_%d')}.csv"
+        )
+        table.to_csv(out_path, index=False, float_format="%.4g")
+        out_paths.append(out_path)
+    return out_paths
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--date",
+        help="Reference date (YYYY-MM-DD) of the indices; defaults to the latest.",
+    )
+    parser.add_argument(
+        "--layers",
+        nargs="+",
+        help=f"Zone layers to use; defaults to {REGIONS_LAYER} and all in ZONES_DIR.",
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    setup_logging()
+    args = parse_args()
+    layers = load_zone_layers()
+    if args.layers:
+        unknown = sorted(set(args.layers) - set(layers))
+        if unknown:
+            raise ValueError(
+                f"Unknown zone layers {unknown}; available: {sorted(layers)}"
+            )
+        layers = {name: layers[name] for name in args.layers}
+    _, paths = indices_files(INDICES_DIR, args.date)
+    indices = open_dated_indices(list(paths.values()))
+    for path in write_zonal_statistics(indices, INDICES_DIR, layers):
+        logging.info(f"Wrote {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())